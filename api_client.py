@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Senville API Client Helpers
+
+Plain-urllib REST API requests and latency statistics shared by the
+measurement tools (benchmark.py, fault_report.py), so they need nothing
+beyond the standard library.
+"""
+
+import json
+import math
+import urllib.request
+import urllib.error
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, math.ceil(pct * len(ordered) / 100) - 1)  # pct / 100 * n can round up past a whole rank
+    return ordered[index]
+
+def api_request(method, url, payload=None, timeout=30):
+    """Make one API request: (http_status, parsed_body)"""
+    data = None
+    headers = {}
+    if payload is not None:
+        data = json.dumps(payload).encode()
+        headers['Content-Type'] = 'application/json'
+    request = urllib.request.Request(url, data=data, headers=headers, method=method)
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        try:
+            return e.code, json.loads(e.read())
+        except ValueError:
+            return e.code, {}
@@ -13,30 +13,270 @@ Access the web interface at: http://localhost:5000
 import os
 import sys
 import json
+import collections
+import concurrent.futures
+import contextlib
+import hmac
+import itertools
+import queue
+import select
+import socket
 import subprocess
+import threading
 import time
-from flask import Flask, jsonify, request, send_from_directory
+from datetime import datetime, time as dt_time
+from flask import Flask, Response, g, jsonify, request, send_from_directory
 from flask_cors import CORS
-from midea_beautiful import appliance_state
 from midea_beautiful.exceptions import MideaError, MideaNetworkError
+import broker_client
+from shared_state import StatePublisher, StateSnapshot, pending_changes
+from schedule_store import ScheduleStore
+from run_journal import RunJournal
 
 app = Flask(__name__, static_folder='web')
 CORS(app)
 
-SCHEDULE_FILE = os.path.join(os.path.dirname(__file__), 'schedules.json')
+DEVICES_FILE = os.path.join(os.path.dirname(__file__), 'devices.json')
+PROFILE_DIR = os.path.join(os.path.dirname(__file__), 'profiles')
 
-# Cache for device connection
-_device_cache = {'device': None, 'timestamp': 0, 'ttl': 30}
+# Device sessions
+SESSION_KEEPALIVE = 20         # Idle seconds before a keepalive status query
+SESSION_MAX_REHANDSHAKES = 2   # Failed re-handshakes before rediscovering the unit
 
-def get_cached_device():
-    """Get device with caching to reduce connection overhead"""
-    now = time.time()
+# Circuit breaker
+BREAKER_FAILURE_THRESHOLD = 3  # Consecutive failed device jobs before the breaker opens
+BREAKER_RESET_TIMEOUT = 30     # Seconds open before one probe request is let through
 
-    # Return cached device if still valid
-    if _device_cache['device'] and (now - _device_cache['timestamp']) < _device_cache['ttl']:
-        return _device_cache['device']
+# Device job priorities (lower runs first)
+PRIORITY_WRITE = 0
+PRIORITY_READ = 1
+
+# Status polling intervals (seconds)
+POLL_FAST_INTERVAL = 2     # Minimum time between polls
+POLL_BASE_INTERVAL = 10    # Normal interval when the state is changing
+POLL_MAX_INTERVAL = 60     # Upper bound when nothing changes
+POLL_RECONCILE_DELAY = 5   # One read to confirm the written-through state after a write
+
+# Status snapshots older than this are served as stale (seconds)
+STATUS_MAX_AGE = POLL_MAX_INTERVAL
+
+# Server-Sent Events
+EVENT_BUFFER_SIZE = 256        # Events kept for Last-Event-ID resume
+SSE_KEEPALIVE = 15             # Seconds between keepalive comments
+SCHEDULER_WATCH_INTERVAL = 5   # Seconds between scheduler status checks
+
+# Fleet status fan-out
+FLEET_DEADLINE = 5.0           # Default per-request deadline (seconds)
+FLEET_MAX_WORKERS = 32         # Devices queried in parallel
+
+# Write coalescing (seconds)
+WRITE_COALESCE_WINDOW = 0.3    # Quiet period before pending changes are sent
+WRITE_MAX_DELAY = 1.0          # Longest a write waits while more keep arriving
+WRITE_STATE_MAX_AGE = 30       # Oldest polled state a write is compared against without a query
+
+# Schedule run history pages
+RUNS_PAGE_SIZE = 50            # Runs returned when no limit is given
+RUNS_MAX_PAGE_SIZE = 500       # Largest limit accepted
+
+# Sampling profiler (admin only)
+PROFILE_INTERVAL = 0.005       # Seconds between stack samples
+PROFILE_MAX_REQUESTS = 1000    # Most requests one profile may cover
+
+# Metrics histogram buckets (seconds)
+DEVICE_IO_BUCKETS = [0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30]
+HTTP_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+_phases = threading.local()
+
+def record_phase(name, seconds):
+    """Add time to a phase of the request being handled on this thread, if any"""
+    phases = getattr(_phases, 'current', None)
+    if phases is not None:
+        phases[name] = phases.get(name, 0) + seconds
+
+def merge_phases(phases):
+    """Add phases recorded on another thread (device worker, write flush) to this request"""
+    for name, seconds in phases.items():
+        record_phase(name, seconds)
+
+@contextlib.contextmanager
+def timed_phase(name):
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        record_phase(name, time.monotonic() - start)
+
+@contextlib.contextmanager
+def collecting_phases(phases):
+    """Record phases on this thread into the given dict for the with-block"""
+    previous = getattr(_phases, 'current', None)
+    _phases.current = phases
+    try:
+        yield
+    finally:
+        _phases.current = previous
+
+METRICS = []
+
+def escape_label(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def format_labels(names, values, extra=()):
+    """Format a Prometheus label set, e.g. {device="bedroom",le="0.5"}"""
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{n}="{escape_label(v)}"' for n, v in pairs) + '}'
+
+
+class _Metric:
+    """A named family of labelled values exported on /metrics"""
+
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+        METRICS.append(self)
+
+    def _key(self, labels):
+        return tuple(str(labels.get(n, '')) for n in self.labelnames)
+
+    def set(self, value, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+    def _samples(self, key, value):
+        yield f"{self.name}{format_labels(self.labelnames, key)} {value}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._samples(key, value))
+        return lines
+
+
+class Counter(_Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Counter):
+    type = 'gauge'
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+
+class Histogram(_Metric):
+    type = 'histogram'
+
+    def __init__(self, name, help, labelnames=(), buckets=DEVICE_IO_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = buckets
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            # [cumulative bucket counts, sum, count]
+            entry = self._values.setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    @contextlib.contextmanager
+    def time(self, **labels):
+        """Observe how long the with-block takes, even if it raises"""
+        start = time.monotonic()
+        try:
+            yield
+        finally:
+            self.observe(time.monotonic() - start, **labels)
+
+    def _samples(self, key, value):
+        counts, total, count = value
+        for bound, n in zip(self.buckets, counts):
+            yield f"{self.name}_bucket{format_labels(self.labelnames, key, [('le', f'{bound:g}')])} {n}"
+        yield f"{self.name}_bucket{format_labels(self.labelnames, key, [('le', '+Inf')])} {count}"
+        yield f"{self.name}_sum{format_labels(self.labelnames, key)} {total}"
+        yield f"{self.name}_count{format_labels(self.labelnames, key)} {count}"
+
+
+DEVICE_CONNECT_SECONDS = Histogram('senville_device_connect_seconds',
+                                   'Time to discover and authenticate a device', ['device'])
+DEVICE_QUERY_SECONDS = Histogram('senville_device_query_seconds',
+                                 'Time per device status query attempt', ['device'])
+DEVICE_APPLY_SECONDS = Histogram('senville_device_apply_seconds',
+                                 'Time per device apply() attempt', ['device'])
+DEVICE_WRITES = Counter('senville_device_writes_total',
+                        'Control writes by result (applied, unchanged = already in the requested state)',
+                        ['device', 'result'])
+DEVICE_RETRIES = Counter('senville_device_retries_total',
+                         'Device operations retried after an error', ['device'])
+DEVICE_BACKOFF_SECONDS = Counter('senville_device_backoff_seconds_total',
+                                 'Time spent sleeping before device retries', ['device'])
+DEVICE_SESSION = Counter('senville_device_session_total',
+                         'Device session lookups by result (reused, connected, rehandshake)',
+                         ['device', 'result'])
+BREAKER_STATE = Gauge('senville_device_breaker_state',
+                      'Circuit breaker state (1 for the current state)', ['device', 'state'])
+BREAKER_TRIPS = Counter('senville_device_breaker_trips_total',
+                        'Times the circuit breaker opened', ['device'])
+BREAKER_REJECTED = Counter('senville_device_breaker_rejected_total',
+                           'Requests refused while the circuit breaker was open', ['device'])
+STATUS_AGE = Gauge('senville_device_status_age_seconds',
+                   'Age of the latest status snapshot', ['device'])
+HTTP_REQUEST_SECONDS = Histogram('senville_http_request_seconds', 'API request latency by route',
+                                 ['method', 'route', 'status'], buckets=HTTP_BUCKETS)
+HTTP_IN_FLIGHT = Gauge('senville_http_requests_in_flight', 'API requests currently being handled')
+SCHEDULER_RUNNING = Gauge('senville_scheduler_running', '1 if the scheduler daemon is running')
+SCHEDULER_DRIFT = Gauge('senville_scheduler_fire_drift_seconds',
+                        'How late each schedule last fired after its scheduled minute',
+                        ['schedule', 'name'])
+
+def render_metrics():
+    """All metrics in the Prometheus text exposition format"""
+    lines = []
+    for metric in METRICS:
+        lines.extend(metric.render())
+    return '\n'.join(lines) + '\n'
+
+def load_device_configs():
+    """Load the device registry, falling back to the single unit in .env"""
+    devices_file = os.getenv('SENVILLE_DEVICES_FILE', DEVICES_FILE)
+
+    if os.path.exists(devices_file):
+        with open(devices_file, 'r') as f:
+            configs = json.load(f)
+
+        seen = set()
+        for config in configs:
+            missing = [k for k in ('id', 'ip', 'token', 'key') if not config.get(k)]
+            if missing:
+                raise ValueError(f"Device entry in {devices_file} is missing: {', '.join(missing)}")
+            if config['id'] in seen:
+                raise ValueError(f"Duplicate device id in {devices_file}: {config['id']}")
+            seen.add(config['id'])
+
+        if not configs:
+            raise ValueError(f"No devices defined in {devices_file}")
+        return configs
 
-    # Create new device connection
     ip = os.getenv('SENVILLE_IP')
     token = os.getenv('SENVILLE_TOKEN')
     key = os.getenv('SENVILLE_KEY')
@@ -44,16 +284,14 @@ def get_cached_device():
     if not all([ip, token, key]):
         raise ValueError("Missing credentials in .env file")
 
-    device = appliance_state(address=ip, token=token, key=key)
-
-    # Cache the device
-    _device_cache['device'] = device
-    _device_cache['timestamp'] = now
+    return [{'id': 'default', 'name': 'Senville AC', 'ip': ip, 'token': token, 'key': key}]
 
-    return device
+def connect_device(ip, token, key):
+    """Open a new device connection (through device_broker.py when it is running)"""
+    return broker_client.connect_device(ip, token, key)
 
-def retry_with_backoff(func, max_retries=3, initial_delay=0.5):
-    """Retry a function with exponential backoff"""
+def retry_with_backoff(func, max_retries=3, initial_delay=0.5, on_error=None, on_backoff=None):
+    """Retry a function with exponential backoff; on_backoff(delay) is called before each wait"""
     delay = initial_delay
     last_error = None
 
@@ -63,13 +301,709 @@ def retry_with_backoff(func, max_retries=3, initial_delay=0.5):
         except (MideaNetworkError, MideaError, TimeoutError) as e:
             last_error = e
             if attempt < max_retries - 1:
+                if on_backoff:
+                    on_backoff(delay)
                 time.sleep(delay)
                 delay *= 2  # Exponential backoff
-                # Clear cache on error
-                _device_cache['device'] = None
+                # Drop the connection on error
+                if on_error:
+                    on_error()
             else:
                 raise last_error
 
+def socket_alive(device):
+    """Check the device's TCP socket without blocking; False if the unit closed it"""
+    sock = getattr(device, '_socket', None)
+    if sock is None:
+        return True  # Not connected; the next request connects and authenticates
+    try:
+        readable, _, _ = select.select([sock], [], [], 0)
+        # Readable with nothing to read means the peer closed the connection
+        if readable and not sock.recv(1, socket.MSG_PEEK):
+            return False
+    except (OSError, ValueError):
+        return False
+    return True
+
+class CircuitOpenError(Exception):
+    """Raised instead of contacting a device whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a device that keeps failing.
+
+    closed:    requests go through; consecutive failures are counted
+    open:      requests fail immediately until reset_timeout has passed
+    half-open: one probe request is let through; success closes the
+               breaker, failure opens it again
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0
+        self._probing = False
+        self._rejected = 0
+        self._trips = 0
+
+    @property
+    def state(self):
+        with self._lock:
+            return self._state
+
+    def allow(self):
+        """Raise CircuitOpenError unless a request may be sent now"""
+        with self._lock:
+            if self._state == self.OPEN and time.time() - self._opened_at >= self.reset_timeout:
+                self._state = self.HALF_OPEN
+                self._probing = False
+
+            if self._state == self.CLOSED:
+                return
+            if self._state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return
+
+            self._rejected += 1
+            retry_in = max(0, self.reset_timeout - (time.time() - self._opened_at))
+            raise CircuitOpenError(f"Device unreachable, retrying in {retry_in:.0f}s")
+
+    def record_success(self):
+        with self._lock:
+            self._state = self.CLOSED
+            self._failures = 0
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    self._trips += 1
+                self._state = self.OPEN
+                self._opened_at = time.time()
+                self._probing = False
+
+    def describe(self):
+        with self._lock:
+            info = {
+                'state': self._state,
+                'failures': self._failures,
+                'rejected': self._rejected,
+                'trips': self._trips,
+            }
+            if self._state == self.OPEN:
+                info['retry_in'] = round(max(0, self.reset_timeout - (time.time() - self._opened_at)), 1)
+            return info
+
+class DeviceSession:
+    """
+    Long-lived authenticated connection to one unit.
+
+    The appliance object and its V3 session are kept for as long as they
+    work instead of being rebuilt on a timer. The socket is checked before
+    each use; a dead or failing socket is re-handshaked on the same object,
+    and the unit is only rediscovered from scratch if that keeps failing.
+    """
+
+    def __init__(self, connect, keepalive=SESSION_KEEPALIVE, name='default'):
+        self._connect = connect
+        self.keepalive = keepalive
+        self.name = name
+        self._device = None
+        self._failures = 0
+        self._last_used = 0
+
+    def get(self):
+        """The connected device, reconnecting if needed"""
+        if self._device is None:
+            DEVICE_SESSION.inc(device=self.name, result='connected')
+            with DEVICE_CONNECT_SECONDS.time(device=self.name), timed_phase('connect'):
+                self._device = self._connect()
+            self._failures = 0
+        elif not socket_alive(self._device):
+            print("Device closed the session, re-handshaking")
+            DEVICE_SESSION.inc(device=self.name, result='rehandshake')
+            self._device._disconnect()
+        else:
+            DEVICE_SESSION.inc(device=self.name, result='reused')
+
+        if self._device._socket is None:
+            # Re-handshake here rather than inside the next command, so its time is reported separately
+            with timed_phase('handshake'):
+                self._device._authenticate()
+        self._last_used = time.monotonic()
+        return self._device
+
+    def succeeded(self):
+        self._failures = 0
+
+    def reset(self):
+        """Drop the socket after an error so the next request re-handshakes"""
+        if self._device is None:
+            return
+        self._device._disconnect()
+        self._failures += 1
+        if self._failures > SESSION_MAX_REHANDSHAKES:
+            self._device = None
+
+    def idle(self, after=None):
+        """True if the session is open but has not been used for after (default keepalive) seconds"""
+        return (self._device is not None
+                and time.monotonic() - self._last_used >= (after or self.keepalive))
+
+class _Job:
+    """A unit of device I/O waiting for the device actor"""
+
+    def __init__(self, func, priority):
+        self.func = func
+        self.priority = priority
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.phases = {}
+        self.queued_at = time.monotonic()
+        self.started_at = None
+
+    def wait(self):
+        self.done.wait()
+        if self.started_at is not None:
+            record_phase('queue', self.started_at - self.queued_at)
+        merge_phases(self.phases)
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+
+class DeviceActor:
+    """
+    Owns a device session and runs all of its I/O on one worker thread.
+
+    Jobs are functions taking the connected device. They wait in a priority
+    queue, so user writes go ahead of background status reads, and a read
+    submitted while an identical read is still queued shares that read's
+    result instead of queueing another device query. While the queue is
+    idle the worker sends keepalive queries to hold the session open; with a
+    status poller attached they wait for the poller's current interval and
+    are made as polls, so they never add to the poll rate.
+
+    Jobs are refused up front while the device's circuit breaker is open,
+    and a half-open probe gets a single attempt instead of the usual retries.
+    """
+
+    def __init__(self, connect, keepalive=SESSION_KEEPALIVE, breaker=None, name='default'):
+        self.name = name
+        self._session = DeviceSession(connect, keepalive, name)
+        # Export zeroes until the first retry so rate() works from the start
+        DEVICE_RETRIES.inc(0, device=name)
+        DEVICE_BACKOFF_SECONDS.inc(0, device=name)
+        self.breaker = breaker or CircuitBreaker()
+        self._queue = queue.PriorityQueue()
+        self._order = itertools.count()
+        self._lock = threading.Lock()
+        self._queued_reads = {}
+        self._thread = None
+        self.poller = None      # StatusPoller that makes the keepalive queries (set by DeviceContext)
+
+    def read(self, func):
+        """Run a read job, sharing an identical read that is already queued"""
+        with self._lock:
+            job = self._queued_reads.get(func)
+            if job is None:
+                self.breaker.allow()
+                job = self._queued_reads[func] = _Job(func, PRIORITY_READ)
+                self._put(job)
+        return job.wait()
+
+    def write(self, func):
+        """Run a write job ahead of any queued reads"""
+        self.breaker.allow()
+        job = _Job(func, PRIORITY_WRITE)
+        with self._lock:
+            self._put(job)
+        return job.wait()
+
+    def _put(self, job):
+        """Queue a job and make sure the worker is running (lock held)"""
+        self._queue.put((job.priority, next(self._order), job))
+        if self._thread is None or not self._thread.is_alive():
+            self._thread = threading.Thread(target=self._run, name='device-actor', daemon=True)
+            self._thread.start()
+
+    def _call(self, func):
+        """Run func on the session's device, re-handshaking on errors (worker only)"""
+        if self.breaker.state == CircuitBreaker.OPEN:
+            # The breaker opened while this job was queued
+            self.breaker.allow()
+        probe = self.breaker.state == CircuitBreaker.HALF_OPEN
+        try:
+            result = retry_with_backoff(
+                lambda: func(self._session.get()),
+                max_retries=1 if probe else 3,
+                on_error=self._session.reset,
+                on_backoff=self._record_backoff
+            )
+        except Exception:
+            # Any failure settles a half-open probe; otherwise the breaker stays stuck
+            self._session.reset()
+            self.breaker.record_failure()
+            raise
+        self._session.succeeded()
+        self.breaker.record_success()
+        return result
+
+    def _record_backoff(self, delay):
+        record_phase('backoff', delay)
+        DEVICE_RETRIES.inc(device=self.name)
+        DEVICE_BACKOFF_SECONDS.inc(delay, device=self.name)
+
+    def _keepalive_interval(self):
+        """Idle seconds before a keepalive: never less than the poller's current interval"""
+        if self.poller is None:
+            return self._session.keepalive
+        return max(self._session.keepalive, self.poller.interval)
+
+    def _keepalive(self, interval):
+        """Send a status query on an idle session so the unit keeps it open"""
+        if not self._session.idle(interval) or self.breaker.state != CircuitBreaker.CLOSED:
+            return
+        if self.poller is not None:
+            # Poll now instead, so the state is used and the next poll moves back
+            self.poller.poll_now()
+            return
+        try:
+            self._call(lambda device: device.refresh())
+        except Exception as e:
+            print(f"Device keepalive failed: {e}")
+
+    def _run(self):
+        while True:
+            interval = self._keepalive_interval()
+            try:
+                _, _, job = self._queue.get(timeout=interval)
+            except queue.Empty:
+                self._keepalive(interval)
+                continue
+            if job.priority == PRIORITY_READ:
+                with self._lock:
+                    # Reads arriving from now on need a fresh query
+                    if self._queued_reads.get(job.func) is job:
+                        del self._queued_reads[job.func]
+
+            job.started_at = time.monotonic()
+            try:
+                with collecting_phases(job.phases):
+                    job.result = self._call(job.func)
+            except Exception as e:
+                job.error = e
+            job.done.set()
+
+class _Flight:
+    """A single in-flight status query shared by all concurrent callers"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class StatusPoller:
+    """
+    Background poller that keeps the latest device state in memory.
+
+    Concurrent refresh() calls are merged into a single device query, and the
+    polling interval adapts, slowly backing off to POLL_MAX_INTERVAL while
+    the state stays the same. Successful writes update the snapshot directly
+    (write_through) and schedule one reconciling read.
+    """
+
+    def __init__(self, fetch, on_change=None, on_error=None):
+        self._fetch = fetch
+        self._on_change = on_change
+        self._on_error = on_error
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._flight = None
+        self._snapshot = None
+        self._snapshot_time = 0
+        self._error = None
+        self._interval = POLL_BASE_INTERVAL
+        self._next_poll = 0
+
+    def start(self):
+        """Start the polling thread (safe to call more than once)"""
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._thread = threading.Thread(target=self._run, name='status-poller', daemon=True)
+            self._thread.start()
+
+    def refresh(self):
+        """Query the device now, joining a query already in flight if there is one"""
+        with self._lock:
+            flight = self._flight
+            leader = flight is None
+            if leader:
+                flight = self._flight = _Flight()
+
+        if not leader:
+            flight.done.wait()
+        else:
+            try:
+                flight.result = self._fetch()
+            except Exception as e:
+                flight.error = e
+
+            with self._lock:
+                self._flight = None
+                previous, had_error = self._snapshot, self._error is not None
+                if flight.error is None:
+                    changed = flight.result != previous
+                    self._snapshot = flight.result
+                    self._snapshot_time = time.time()
+                    self._error = None
+                    self._adapt_interval(changed)
+                else:
+                    self._error = flight.error
+                self._next_poll = time.time() + max(self._interval, POLL_FAST_INTERVAL)
+            flight.done.set()
+
+            if flight.error is None:
+                if (changed or had_error) and self._on_change:
+                    self._on_change(previous, flight.result)
+            elif not had_error and self._on_error:
+                self._on_error(flight.error)
+
+        if flight.error is not None:
+            raise flight.error
+        return flight.result
+
+    def snapshot(self, max_age=None):
+        """
+        Return (status, age in seconds, stale) without waiting on the device.
+
+        The device is only queried inline when there is no snapshot yet, or
+        the caller asked for one at most max_age seconds old. Otherwise the
+        last snapshot is returned straight away; if it is stale (too old, or
+        the last poll failed) the poller is woken to refresh it.
+        """
+        self.start()
+        with self._lock:
+            snapshot, error, taken = self._snapshot, self._error, self._snapshot_time
+            refreshing = self._flight is not None
+        age = time.time() - taken
+
+        if snapshot is None or (max_age is not None and age > max_age):
+            return self.refresh(), 0.0, False
+
+        stale = error is not None or age > STATUS_MAX_AGE
+        if stale and not refreshing:
+            self._poll_in(0)
+        return snapshot, age, stale
+
+    def get(self):
+        """Return the latest snapshot, querying the device only if there is none yet"""
+        return self.snapshot()[0]
+
+    @property
+    def interval(self):
+        """Seconds until the next background poll after a successful one"""
+        with self._lock:
+            return self._interval
+
+    def poll_now(self):
+        """Have the background poller query the device straight away"""
+        self.start()
+        self._poll_in(0)
+
+    def age(self):
+        """Seconds since the last successful poll, or None before the first one"""
+        with self._lock:
+            if self._snapshot is None:
+                return None
+            return time.time() - self._snapshot_time
+
+    def write_through(self, status):
+        """
+        Serve the state a successful write produced as the current snapshot.
+
+        The device is not queried; one read POLL_RECONCILE_DELAY later picks
+        up anything the unit did differently (it arrives as a normal change).
+        """
+        with self._lock:
+            previous = self._snapshot
+            self._snapshot = status
+            self._snapshot_time = time.time()
+            self._error = None
+            self._interval = POLL_BASE_INTERVAL
+        self._poll_in(POLL_RECONCILE_DELAY)
+
+        if status != previous and self._on_change:
+            self._on_change(previous, status)
+
+    def _poll_in(self, delay):
+        """Move the next background poll to delay seconds from now"""
+        with self._lock:
+            self._next_poll = time.time() + delay
+        self._wake.set()
+
+    def _adapt_interval(self, changed):
+        """Pick the next polling interval (called with the lock held)"""
+        if changed:
+            self._interval = POLL_BASE_INTERVAL
+        else:
+            self._interval = min(self._interval * 2, POLL_MAX_INTERVAL)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                delay = self._next_poll - time.time()
+            if delay > 0:
+                self._wake.wait(delay)
+                self._wake.clear()
+                continue
+
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Status poll failed: {e}")
+
+class EventBroker:
+    """
+    Fans server events out to Server-Sent Events clients.
+
+    Recent events are kept in a ring buffer so a reconnecting client can
+    resume from its Last-Event-ID instead of re-reading everything.
+    """
+
+    def __init__(self, size=EVENT_BUFFER_SIZE):
+        self._cond = threading.Condition()
+        self._events = collections.deque(maxlen=size)
+        self._next_id = 1
+
+    @property
+    def last_id(self):
+        with self._cond:
+            return self._next_id - 1
+
+    def publish(self, event, data):
+        """Publish an event to every connected client"""
+        with self._cond:
+            encoded = data.json if isinstance(data, StateSnapshot) else json.dumps(data)
+            self._events.append((self._next_id, event, encoded))
+            self._next_id += 1
+            self._cond.notify_all()
+
+    def _since(self, last_id):
+        """Events after last_id, or None if the client has to resync (lock held)"""
+        if last_id >= self._next_id:
+            return None  # Client is ahead of us, e.g. the server restarted
+        if self._events and last_id < self._events[0][0] - 1:
+            return None  # Events were dropped from the buffer
+        return [e for e in self._events if e[0] > last_id]
+
+    def wait(self, last_id, timeout):
+        """Block until there are events after last_id or the timeout expires"""
+        with self._cond:
+            events = self._since(last_id)
+            if events == []:
+                self._cond.wait(timeout)
+                events = self._since(last_id)
+            return events
+
+
+class _WriteBatch:
+    """Desired-state changes collected during one coalescing window"""
+
+    def __init__(self, now):
+        self.changes = {}
+        self.first = now
+        self.last = now
+        self.done = threading.Event()
+        self.error = None
+        self.result = None
+        self.phases = {}
+        self.flushed_at = None
+
+
+class WriteCoalescer:
+    """
+    Merges control writes that arrive close together into a single apply().
+
+    Each submit() adds its changes to the pending batch (later values win)
+    and waits for that batch to be sent. The batch is flushed once no new
+    write has arrived for WRITE_COALESCE_WINDOW, or WRITE_MAX_DELAY after its
+    first write, and every waiting request gets the shared result.
+    """
+
+    def __init__(self, apply):
+        self._apply = apply
+        self._cond = threading.Condition()
+        self._batch = None
+        self._thread = None
+
+    def submit(self, changes):
+        """Queue changes, block until their batch is applied and return the apply result"""
+        with self._cond:
+            now = time.monotonic()
+            if self._batch is None:
+                self._batch = _WriteBatch(now)
+            batch = self._batch
+            batch.changes.update(changes)
+            batch.last = now
+
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='write-coalescer', daemon=True)
+                self._thread.start()
+            self._cond.notify()
+
+        batch.done.wait()
+        record_phase('coalesce', batch.flushed_at - now)
+        merge_phases(batch.phases)
+        if batch.error is not None:
+            raise batch.error
+        return batch.result
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while self._batch is None:
+                    self._cond.wait()
+                batch = self._batch
+                deadline = min(batch.last + WRITE_COALESCE_WINDOW, batch.first + WRITE_MAX_DELAY)
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                # Later writes start a new batch while this one is sent
+                self._batch = None
+
+            batch.flushed_at = time.monotonic()
+            try:
+                with collecting_phases(batch.phases):
+                    batch.result = self._apply(dict(batch.changes))
+            except Exception as e:
+                batch.error = e
+            batch.done.set()
+
+
+def collapse_stack(thread_name, frame):
+    """One stack in collapsed format: thread;outermost;...;innermost"""
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{code.co_name} ({os.path.basename(code.co_filename)})")
+        frame = frame.f_back
+    return ';'.join([thread_name] + names[::-1])
+
+
+class SamplingProfiler:
+    """
+    Samples Python stacks while the next N API requests are handled.
+
+    The request threads being profiled are sampled together with the
+    device worker threads doing their I/O. Stacks are saved in the
+    collapsed format ("thread;outer;inner count" per line) read by
+    flamegraph.pl and speedscope.
+    """
+
+    WORKER_THREADS = ('device-actor', 'write-coalescer')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._remaining = 0
+        self._threads = set()
+        self._samples = collections.Counter()
+        self._interval = PROFILE_INTERVAL
+        self.last_output = None
+
+    def _active(self):
+        return bool(self._remaining or self._threads)
+
+    def start(self, requests, interval=PROFILE_INTERVAL):
+        """Profile the next `requests` requests (raises RuntimeError if already running)"""
+        with self._lock:
+            if self._active():
+                raise RuntimeError("A profile is already being recorded")
+            self._remaining = requests
+            self._interval = interval
+            self._samples = collections.Counter()
+        threading.Thread(target=self._run, name='profiler', daemon=True).start()
+
+    def status(self):
+        with self._lock:
+            return {
+                'active': self._active(),
+                'remaining': self._remaining,
+                'samples': sum(self._samples.values()),
+                'last_output': self.last_output,
+            }
+
+    def request_started(self):
+        """Include the current request in the profile if more are wanted"""
+        with self._lock:
+            if self._remaining > 0:
+                self._remaining -= 1
+                self._threads.add(threading.get_ident())
+
+    def request_finished(self):
+        with self._lock:
+            self._threads.discard(threading.get_ident())
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._active():
+                    break
+                requests = set(self._threads)
+
+            # Workers are only sampled while a profiled request may be waiting on them
+            if requests:
+                names = {ident: 'request' for ident in requests}
+                names.update((t.ident, t.name) for t in threading.enumerate()
+                             if t.name in self.WORKER_THREADS)
+                frames = sys._current_frames()
+                with self._lock:
+                    for ident, name in names.items():
+                        if ident in frames:
+                            self._samples[collapse_stack(name, frames[ident])] += 1
+            time.sleep(self._interval)
+
+        self._write()
+
+    def _write(self):
+        os.makedirs(PROFILE_DIR, exist_ok=True)
+        path = os.path.join(PROFILE_DIR, f"profile-{datetime.now():%Y%m%d-%H%M%S}.folded")
+        with self._lock:
+            samples = sorted(self._samples.items())
+        with open(path, 'w') as f:
+            for stack, count in samples:
+                f.write(f"{stack} {count}\n")
+        with self._lock:
+            self.last_output = path
+        print(f"Profile written to {path} ({sum(c for _, c in samples)} samples)")
+
+
+profiler = SamplingProfiler()
+
+def format_sse(event, data, event_id=None):
+    """Format one Server-Sent Events message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {data}")
+    return '\n'.join(lines) + '\n\n'
+
 def load_env():
     """Load environment variables from .env file"""
     env_file = '.env'
@@ -85,10 +1019,6 @@ def f_to_c(fahrenheit):
     """Convert Fahrenheit to Celsius"""
     return (fahrenheit - 32) * 5 / 9
 
-def c_to_f(celsius):
-    """Convert Celsius to Fahrenheit"""
-    return (celsius * 9 / 5) + 32
-
 
 @app.route('/')
 def index():
@@ -100,42 +1030,225 @@ def serve_static(path):
     """Serve static files from web directory"""
     return send_from_directory('web', path)
 
-@app.route('/api/status', methods=['GET'])
-def get_status():
-    """Get current AC status"""
+@app.before_request
+def start_request_timer():
+    g.request_start = time.monotonic()
+    g.phases = _phases.current = {}
+    HTTP_IN_FLIGHT.inc()
+    if not request.path.startswith('/api/admin/'):
+        profiler.request_started()
+
+@app.after_request
+def record_request_metrics(response):
+    """Observe request latency, add the Server-Timing header and log API requests"""
+    start = g.get('request_start')
+    if start is None:
+        return response
+    total = time.monotonic() - start
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    HTTP_REQUEST_SECONDS.observe(total, method=request.method, route=route, status=response.status_code)
+
+    phases = {name: round(seconds * 1000, 1) for name, seconds in g.phases.items()}
+    response.headers['Server-Timing'] = ', '.join(
+        [f"{name};dur={ms}" for name, ms in phases.items()] + [f"total;dur={total * 1000:.1f}"]
+    )
+    if request.path.startswith('/api/'):
+        print(json.dumps({
+            'event': 'request',
+            'method': request.method,
+            'path': request.path,
+            'status': response.status_code,
+            'ms': round(total * 1000, 1),
+            'phases': phases,
+        }))
+    return response
+
+@app.teardown_request
+def finish_request(error=None):
+    _phases.current = None
+    if g.pop('request_start', None) is not None:
+        HTTP_IN_FLIGHT.dec()
+        profiler.request_finished()
+
+state_publisher = StatePublisher()
+
+def publish_shared_state(device_id, ip, state):
+    """Publish a unit's state for status.py --cached, the GUI and shell scripts"""
+    global state_publisher
+    if state_publisher is None:
+        return
     try:
-        def fetch_status():
-            device = get_cached_device()
-            return device.state
-
-        state = retry_with_backoff(fetch_status)
-
-        # Get display unit preference
-        use_fahrenheit = state.fahrenheit
-        temp_display = c_to_f(state.target_temperature) if use_fahrenheit else state.target_temperature
-        indoor_temp = c_to_f(state.indoor_temperature) if use_fahrenheit else state.indoor_temperature
-        outdoor_temp = c_to_f(state.outdoor_temperature) if use_fahrenheit else state.outdoor_temperature
+        state_publisher.publish(device_id, ip, state)
+    except (OSError, ValueError) as e:
+        print(f"Shared state snapshot disabled: {e}")
+        state_publisher = None
+
+def query_status(device):
+    """Device job: query the device and snapshot its state"""
+    device.refresh()
+    return StateSnapshot.from_state(device.state)
+
+class DeviceContext:
+    """Per-device state: connection actor, status poller, write queue and event stream"""
+
+    def __init__(self, config):
+        self.id = config['id']
+        self.name = config.get('name', self.id)
+        self.ip = config['ip']
+        self.actor = DeviceActor(
+            lambda: connect_device(config['ip'], config['token'], config['key']),
+            keepalive=config.get('keepalive', SESSION_KEEPALIVE),
+            breaker=CircuitBreaker(
+                failure_threshold=config.get('breaker_threshold', BREAKER_FAILURE_THRESHOLD),
+                reset_timeout=config.get('breaker_timeout', BREAKER_RESET_TIMEOUT)
+            ),
+            name=self.id
+        )
+        self.events = EventBroker()
+        self.poller = StatusPoller(self.fetch_status, on_change=self.publish_status,
+                                   on_error=self.publish_device_error)
+        self.actor.poller = self.poller
+        self.writer = WriteCoalescer(self.apply_changes)
+        for result in ('applied', 'unchanged'):
+            DEVICE_WRITES.inc(0, device=self.id, result=result)
+
+    def describe(self):
+        return {'id': self.id, 'name': self.name, 'ip': self.ip}
+
+    def fetch_status(self):
+        """Query the device and return a fresh status payload"""
+        return self.actor.read(self.query_device)
+
+    def query_device(self, device):
+        """Device job: timed query_status (a bound method, so queued reads still merge)"""
+        with DEVICE_QUERY_SECONDS.time(device=self.id), timed_phase('query'):
+            status = query_status(device)
+        publish_shared_state(self.id, self.ip, status)
+        return status
+
+    def apply_changes(self, changes):
+        """
+        Send a merged set of state changes to the device in one apply().
+
+        Returns (new state, applied). The changes are compared against the
+        poller's snapshot, which is refreshed first only if it is older than
+        WRITE_STATE_MAX_AGE; when the unit already has every requested value
+        nothing is sent and the device isn't touched at all.
+        """
+        current, _, _ = self.poller.snapshot(max_age=WRITE_STATE_MAX_AGE)
+        pending = pending_changes(current, changes)
+        if not pending:
+            DEVICE_WRITES.inc(device=self.id, result='unchanged')
+            return current, False
+
+        def apply(device):
+            state = device.state
+            for attr, value in pending.items():
+                setattr(state, attr, value)
+            with DEVICE_APPLY_SECONDS.time(device=self.id), timed_phase('apply'):
+                device.apply()
+            return StateSnapshot.from_state(state)
+
+        status = self.actor.write(apply)
+        DEVICE_WRITES.inc(device=self.id, result='applied')
+        publish_shared_state(self.id, self.ip, status)
+        self.poller.write_through(status)
+        return status, True
+
+    def publish_status(self, previous, current):
+        """Push the status fields that changed since the previous snapshot"""
+        delta = {}
+        if previous is not None and current.diff(previous):
+            before = previous.as_dict()
+            delta = {k: v for k, v in current.as_dict().items() if before[k] != v}
+        if previous is None or not delta:
+            # First snapshot, or the device came back with the same state
+            self.events.publish('status', current)
+        else:
+            self.events.publish('delta', delta)
+
+    def publish_device_error(self, error):
+        """Tell clients the device stopped responding"""
+        self.events.publish('device-error', {'error': f'Communication error: {str(error)}'})
+
+
+_registry_lock = threading.Lock()
+_registry = None
+
+def get_devices():
+    """All configured devices, in registry order (loaded on first use)"""
+    global _registry
+
+    with _registry_lock:
+        if _registry is None:
+            _registry = {c['id']: DeviceContext(c) for c in load_device_configs()}
+        return list(_registry.values())
+
+def find_device(device_id=None):
+    """Look up a device by id; None means the default (first) device"""
+    devices = get_devices()
+    if device_id is None:
+        return devices[0]
+    for device in devices:
+        if device.id == device_id:
+            return device
+    return None
+
+def snapshot_response(snapshot, fields):
+    """JSON response with the snapshot's pre-encoded status as 'data'"""
+    body = json.dumps(fields, sort_keys=True, separators=(',', ':'))
+    return Response(f'{body[:-1]},"data":{snapshot.json}}}\n', mimetype='application/json')
+
+def device_not_found(device_id):
+    return jsonify({
+        'success': False,
+        'error': f"Unknown device: {device_id}"
+    }), 404
+
+@app.route('/api/devices', methods=['GET'])
+def list_devices():
+    """List configured devices"""
+    try:
+        return jsonify({
+            'success': True,
+            'data': [d.describe() for d in get_devices()]
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
 
+@app.route('/api/status', methods=['GET'])
+@app.route('/api/devices/<device_id>/status', methods=['GET'])
+def get_status(device_id=None):
+    """Get current AC status (served from the background poller's snapshot)"""
+    device = find_device(device_id)
+    if device is None:
+        return device_not_found(device_id)
+
+    max_age = request.args.get('max_age')
+    try:
+        max_age = float(max_age) if max_age is not None else None
+    except ValueError:
         return jsonify({
+            'success': False,
+            'error': 'max_age must be a number of seconds'
+        }), 400
+
+    try:
+        status, age, stale = device.poller.snapshot(max_age)
+        return snapshot_response(status, {
             'success': True,
-            'data': {
-                'running': state.running,
-                'mode': str(state.mode),
-                'target_temperature': round(temp_display, 1),
-                'indoor_temperature': round(indoor_temp, 1),
-                'outdoor_temperature': round(outdoor_temp, 1),
-                'fan_speed': state.fan_speed,
-                'vertical_swing': state.vertical_swing,
-                'horizontal_swing': state.horizontal_swing,
-                'fahrenheit': use_fahrenheit,
-                'eco_mode': state.eco_mode if hasattr(state, 'eco_mode') else False,
-                'turbo_mode': state.turbo_mode if hasattr(state, 'turbo_mode') else False,
-            }
+            'age_ms': round(age * 1000),
+            'stale': stale,
+            'breaker': device.actor.breaker.describe()
         })
-    except (MideaNetworkError, MideaError, TimeoutError) as e:
+    except (MideaNetworkError, MideaError, TimeoutError, CircuitOpenError) as e:
         return jsonify({
             'success': False,
-            'error': f'Communication error: {str(e)}'
+            'error': f'Communication error: {str(e)}',
+            'breaker': device.actor.breaker.describe()
         }), 503  # Service Unavailable
     except Exception as e:
         return jsonify({
@@ -144,23 +1257,23 @@ def get_status():
         }), 500
 
 @app.route('/api/power', methods=['POST'])
-def set_power():
+@app.route('/api/devices/<device_id>/power', methods=['POST'])
+def set_power(device_id=None):
     """Turn AC on or off"""
+    device = find_device(device_id)
+    if device is None:
+        return device_not_found(device_id)
+
     try:
         data = request.get_json()
         power_on = data.get('on', True)
 
-        def apply_power():
-            device = get_cached_device()
-            state = device.state
-            state.running = power_on
-            device.apply()
-
-        retry_with_backoff(apply_power)
+        status, applied = device.writer.submit({'running': power_on})
 
-        return jsonify({
+        return snapshot_response(status, {
             'success': True,
-            'message': f"AC turned {'on' if power_on else 'off'}"
+            'message': f"AC turned {'on' if power_on else 'off'}",
+            'applied': applied
         })
     except Exception as e:
         return jsonify({
@@ -169,8 +1282,13 @@ def set_power():
         }), 500
 
 @app.route('/api/mode', methods=['POST'])
-def set_mode():
+@app.route('/api/devices/<device_id>/mode', methods=['POST'])
+def set_mode(device_id=None):
     """Set operating mode"""
+    device = find_device(device_id)
+    if device is None:
+        return device_not_found(device_id)
+
     try:
         data = request.get_json()
         mode = data.get('mode', 'cool').lower()
@@ -189,17 +1307,12 @@ def set_mode():
                 'error': f"Invalid mode. Must be one of: {', '.join(mode_map.keys())}"
             }), 400
 
-        def apply_mode():
-            device = get_cached_device()
-            state = device.state
-            state.mode = mode_map[mode]
-            device.apply()
-
-        retry_with_backoff(apply_mode)
+        status, applied = device.writer.submit({'mode': mode_map[mode]})
 
-        return jsonify({
+        return snapshot_response(status, {
             'success': True,
-            'message': f"Mode set to {mode}"
+            'message': f"Mode set to {mode}",
+            'applied': applied
         })
     except Exception as e:
         return jsonify({
@@ -208,8 +1321,13 @@ def set_mode():
         }), 500
 
 @app.route('/api/temperature', methods=['POST'])
-def set_temperature():
+@app.route('/api/devices/<device_id>/temperature', methods=['POST'])
+def set_temperature(device_id=None):
     """Set target temperature"""
+    device = find_device(device_id)
+    if device is None:
+        return device_not_found(device_id)
+
     try:
         data = request.get_json()
         temp = data.get('temperature')
@@ -230,17 +1348,12 @@ def set_temperature():
                 'error': 'Temperature out of range (16-31°C / 60-87°F)'
             }), 400
 
-        def apply_temperature():
-            device = get_cached_device()
-            state = device.state
-            state.target_temperature = float(temp_c)
-            device.apply()
+        status, applied = device.writer.submit({'target_temperature': float(temp_c)})
 
-        retry_with_backoff(apply_temperature)
-
-        return jsonify({
+        return snapshot_response(status, {
             'success': True,
-            'message': f"Temperature set to {temp}°{'F' if use_fahrenheit else 'C'}"
+            'message': f"Temperature set to {temp}°{'F' if use_fahrenheit else 'C'}",
+            'applied': applied
         })
     except Exception as e:
         return jsonify({
@@ -249,8 +1362,13 @@ def set_temperature():
         }), 500
 
 @app.route('/api/fan', methods=['POST'])
-def set_fan():
+@app.route('/api/devices/<device_id>/fan', methods=['POST'])
+def set_fan(device_id=None):
     """Set fan speed"""
+    device = find_device(device_id)
+    if device is None:
+        return device_not_found(device_id)
+
     try:
         data = request.get_json()
         fan_speed = data.get('speed')
@@ -262,17 +1380,12 @@ def set_fan():
                 'error': f"Invalid fan speed. Must be one of: {valid_speeds}"
             }), 400
 
-        def apply_fan():
-            device = get_cached_device()
-            state = device.state
-            state.fan_speed = fan_speed
-            device.apply()
-
-        retry_with_backoff(apply_fan)
+        status, applied = device.writer.submit({'fan_speed': fan_speed})
 
-        return jsonify({
+        return snapshot_response(status, {
             'success': True,
-            'message': f"Fan speed set to {fan_speed}"
+            'message': f"Fan speed set to {fan_speed}",
+            'applied': applied
         })
     except Exception as e:
         return jsonify({
@@ -281,29 +1394,30 @@ def set_fan():
         }), 500
 
 @app.route('/api/swing', methods=['POST'])
-def set_swing():
+@app.route('/api/devices/<device_id>/swing', methods=['POST'])
+def set_swing(device_id=None):
     """Set swing settings"""
+    device = find_device(device_id)
+    if device is None:
+        return device_not_found(device_id)
+
     try:
         data = request.get_json()
         vertical = data.get('vertical')
         horizontal = data.get('horizontal')
 
-        def apply_swing():
-            device = get_cached_device()
-            state = device.state
-
-            if vertical is not None:
-                state.vertical_swing = bool(vertical)
-            if horizontal is not None:
-                state.horizontal_swing = bool(horizontal)
-
-            device.apply()
+        changes = {}
+        if vertical is not None:
+            changes['vertical_swing'] = bool(vertical)
+        if horizontal is not None:
+            changes['horizontal_swing'] = bool(horizontal)
 
-        retry_with_backoff(apply_swing)
+        status, applied = device.writer.submit(changes)
 
-        return jsonify({
+        return snapshot_response(status, {
             'success': True,
-            'message': 'Swing settings updated'
+            'message': 'Swing settings updated',
+            'applied': applied
         })
     except Exception as e:
         return jsonify({
@@ -312,65 +1426,124 @@ def set_swing():
         }), 500
 
 @app.route('/api/control', methods=['POST'])
-def control_all():
+@app.route('/api/devices/<device_id>/control', methods=['POST'])
+def control_all(device_id=None):
     """Set multiple parameters at once"""
+    device = find_device(device_id)
+    if device is None:
+        return device_not_found(device_id)
+
     try:
         data = request.get_json()
+        changes = {}
+        descriptions = []
+
+        # Power
+        if 'running' in data:
+            changes['running'] = bool(data['running'])
+            descriptions.append(f"power: {'on' if changes['running'] else 'off'}")
+
+        # Mode
+        if 'mode' in data:
+            mode = data['mode'].lower()
+            mode_map = {'auto': 1, 'cool': 2, 'dry': 3, 'heat': 4, 'fan': 5}
+            if mode in mode_map:
+                changes['mode'] = mode_map[mode]
+                descriptions.append(f"mode: {mode}")
+
+        # Temperature
+        if 'temperature' in data:
+            temp = data['temperature']
+            use_f = data.get('fahrenheit', False)
+            temp_c = f_to_c(temp) if use_f else temp
+            if 16 <= temp_c <= 31:
+                changes['target_temperature'] = float(temp_c)
+                descriptions.append(f"temp: {temp}°{'F' if use_f else 'C'}")
+
+        # Fan speed
+        if 'fan_speed' in data:
+            speed = data['fan_speed']
+            if speed in [20, 40, 60, 80, 102]:
+                changes['fan_speed'] = speed
+                descriptions.append(f"fan: {speed}")
+
+        # Swing
+        if 'vertical_swing' in data:
+            changes['vertical_swing'] = bool(data['vertical_swing'])
+            descriptions.append(f"v-swing: {'on' if changes['vertical_swing'] else 'off'}")
+
+        if 'horizontal_swing' in data:
+            changes['horizontal_swing'] = bool(data['horizontal_swing'])
+            descriptions.append(f"h-swing: {'on' if changes['horizontal_swing'] else 'off'}")
+
+        if not changes:
+            raise ValueError('No valid changes specified')
+
+        status, applied = device.writer.submit(changes)
+
+        return snapshot_response(status, {
+            'success': True,
+            'message': f"Updated: {', '.join(descriptions)}",
+            'applied': applied
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
 
-        def apply_all():
-            device = get_cached_device()
-            state = device.state
-            changes = []
-
-            # Power
-            if 'running' in data:
-                state.running = bool(data['running'])
-                changes.append(f"power: {'on' if state.running else 'off'}")
-
-            # Mode
-            if 'mode' in data:
-                mode = data['mode'].lower()
-                mode_map = {'auto': 1, 'cool': 2, 'dry': 3, 'heat': 4, 'fan': 5}
-                if mode in mode_map:
-                    state.mode = mode_map[mode]
-                    changes.append(f"mode: {mode}")
-
-            # Temperature
-            if 'temperature' in data:
-                temp = data['temperature']
-                use_f = data.get('fahrenheit', False)
-                temp_c = f_to_c(temp) if use_f else temp
-                if 16 <= temp_c <= 31:
-                    state.target_temperature = float(temp_c)
-                    changes.append(f"temp: {temp}°{'F' if use_f else 'C'}")
-
-            # Fan speed
-            if 'fan_speed' in data:
-                speed = data['fan_speed']
-                if speed in [20, 40, 60, 80, 102]:
-                    state.fan_speed = speed
-                    changes.append(f"fan: {speed}")
-
-            # Swing
-            if 'vertical_swing' in data:
-                state.vertical_swing = bool(data['vertical_swing'])
-                changes.append(f"v-swing: {'on' if state.vertical_swing else 'off'}")
-
-            if 'horizontal_swing' in data:
-                state.horizontal_swing = bool(data['horizontal_swing'])
-                changes.append(f"h-swing: {'on' if state.horizontal_swing else 'off'}")
-
-            if not changes:
-                raise ValueError('No valid changes specified')
-
-            device.apply()
-            return changes
-
-        changes = retry_with_backoff(apply_all)
+# Fleet Endpoints
+
+_fleet_executor = concurrent.futures.ThreadPoolExecutor(max_workers=FLEET_MAX_WORKERS,
+                                                        thread_name_prefix='fleet')
+
+def timed_refresh(device):
+    """Query one device, returning its status and how long the query took"""
+    started = time.monotonic()
+    try:
+        return device.poller.refresh(), None, time.monotonic() - started
+    except Exception as e:
+        return None, e, time.monotonic() - started
+
+@app.route('/api/fleet/status', methods=['GET'])
+def fleet_status():
+    """Query every device concurrently and return whatever answered by the deadline"""
+    try:
+        deadline = float(request.args.get('timeout', FLEET_DEADLINE))
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'timeout must be a number of seconds'
+        }), 400
+
+    try:
+        started = time.monotonic()
+        devices = get_devices()
+        futures = {_fleet_executor.submit(timed_refresh, d): d for d in devices}
+        concurrent.futures.wait(futures, timeout=deadline)
+
+        results = []
+        for future, device in futures.items():
+            entry = device.describe()
+            if future.done():
+                data, error, elapsed = future.result()
+                entry['latency_ms'] = round(elapsed * 1000, 1)
+                entry['data'] = data.as_dict() if data else None
+                entry['error'] = f'Communication error: {str(error)}' if error else None
+            else:
+                # Still running; it keeps going in the background and
+                # updates the device's snapshot when it finishes
+                entry['latency_ms'] = None
+                entry['data'] = None
+                entry['error'] = f'No response within {deadline:g}s'
+            results.append(entry)
 
         return jsonify({
             'success': True,
-            'message': f"Updated: {', '.join(changes)}"
+            'data': results,
+            'responded': sum(1 for r in results if r['error'] is None),
+            'total': len(results),
+            'elapsed_ms': round((time.monotonic() - started) * 1000, 1)
         })
     except Exception as e:
         return jsonify({
@@ -378,32 +1551,99 @@ def control_all():
             'error': str(e)
         }), 500
 
-# Schedule Management Endpoints
+# Server-Sent Events
 
-def load_schedules():
-    """Load schedules from JSON file"""
-    if not os.path.exists(SCHEDULE_FILE):
-        return []
+_background_lock = threading.Lock()
+_scheduler_watcher = None
+
+def watch_scheduler():
+    """Publish a scheduler event whenever the scheduler status changes"""
+    last_status = None
+    while True:
+        try:
+            status = read_scheduler_status()
+            if status != last_status:
+                publish_all('scheduler', status)
+                last_status = status
+        except Exception as e:
+            print(f"Scheduler watch failed: {e}")
+        time.sleep(SCHEDULER_WATCH_INTERVAL)
+
+def publish_all(event, data):
+    """Publish an event that is not tied to one device on every device stream"""
+    for device in get_devices():
+        device.events.publish(event, data)
+
+def start_background_tasks():
+    """Start the status pollers and scheduler watcher (safe to call more than once)"""
+    global _scheduler_watcher
+
+    for device in get_devices():
+        device.poller.start()
+    with _background_lock:
+        if _scheduler_watcher is None:
+            _scheduler_watcher = threading.Thread(target=watch_scheduler, name='scheduler-watch', daemon=True)
+            _scheduler_watcher.start()
+
+def sync_events(device, event_id):
+    """Full status and scheduler events for a client that is (re)syncing"""
     try:
-        with open(SCHEDULE_FILE, 'r') as f:
-            return json.load(f)
-    except Exception:
-        return []
+        yield format_sse('status', device.poller.get().json, event_id)
+    except Exception as e:
+        yield format_sse('device-error', json.dumps({'error': f'Communication error: {str(e)}'}), event_id)
+    yield format_sse('scheduler', json.dumps(read_scheduler_status()), event_id)
 
-def save_schedules(schedules):
-    """Save schedules to JSON file"""
+@app.route('/api/events', methods=['GET'])
+@app.route('/api/devices/<device_id>/events', methods=['GET'])
+def stream_events(device_id=None):
+    """Stream status deltas and scheduler events (Server-Sent Events)"""
+    device = find_device(device_id)
+    if device is None:
+        return device_not_found(device_id)
+
+    start_background_tasks()
+
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
     try:
-        with open(SCHEDULE_FILE, 'w') as f:
-            json.dump(schedules, f, indent=2)
-        return True
-    except Exception:
-        return False
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        last_id = None
+
+    def generate(last_id):
+        yield 'retry: 3000\n\n'
+        events = None if last_id is None else device.events.wait(last_id, 0)
+        while True:
+            if events is None:
+                # New client, or it missed events we no longer have
+                last_id = device.events.last_id
+                yield from sync_events(device, last_id)
+                events = []
+
+            for event_id, event, data in events:
+                last_id = event_id
+                yield format_sse(event, data, event_id)
+
+            events = device.events.wait(last_id, SSE_KEEPALIVE)
+            if events == []:
+                yield ': keepalive\n\n'
+
+    return Response(generate(last_id), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+
+# Schedule Management Endpoints
+
+# Schedule database shared with scheduler.py and manage_schedules.py
+schedule_store = ScheduleStore()
+# Runs recorded by scheduler.py
+run_journal = RunJournal()
 
 @app.route('/api/schedules', methods=['GET'])
 def get_schedules():
     """Get all schedules"""
     try:
-        schedules = load_schedules()
+        schedules = schedule_store.load()
         return jsonify({
             'success': True,
             'data': schedules
@@ -427,24 +1667,16 @@ def create_schedule():
                 'error': 'Missing required fields: name, time, action'
             }), 400
 
-        schedules = load_schedules()
-
-        # Generate ID
-        schedule_id = max([s.get('id', 0) for s in schedules], default=0) + 1
-
-        schedule = {
-            'id': schedule_id,
+        schedule = schedule_store.create({
             'name': data['name'],
             'time': data['time'],
             'days': data.get('days', []),
             'action': data['action'],
             'enabled': data.get('enabled', True),
             'created_at': data.get('created_at'),
-            'last_run': None
-        }
-
-        schedules.append(schedule)
-        save_schedules(schedules)
+        })
+        schedule_id = schedule['id']
+        publish_all('schedules', {'action': 'created', 'id': schedule_id})
 
         return jsonify({
             'success': True,
@@ -461,14 +1693,8 @@ def update_schedule(schedule_id):
     """Update a schedule"""
     try:
         data = request.get_json()
-        schedules = load_schedules()
-
-        # Find schedule
-        schedule = None
-        for s in schedules:
-            if s['id'] == schedule_id:
-                schedule = s
-                break
+        changes = {k: data[k] for k in ['name', 'time', 'days', 'action', 'enabled'] if k in data}
+        schedule = schedule_store.update(schedule_id, changes)
 
         if not schedule:
             return jsonify({
@@ -476,19 +1702,7 @@ def update_schedule(schedule_id):
                 'error': 'Schedule not found'
             }), 404
 
-        # Update fields
-        if 'name' in data:
-            schedule['name'] = data['name']
-        if 'time' in data:
-            schedule['time'] = data['time']
-        if 'days' in data:
-            schedule['days'] = data['days']
-        if 'action' in data:
-            schedule['action'] = data['action']
-        if 'enabled' in data:
-            schedule['enabled'] = data['enabled']
-
-        save_schedules(schedules)
+        publish_all('schedules', {'action': 'updated', 'id': schedule_id})
 
         return jsonify({
             'success': True,
@@ -504,9 +1718,8 @@ def update_schedule(schedule_id):
 def delete_schedule(schedule_id):
     """Delete a schedule"""
     try:
-        schedules = load_schedules()
-        schedules = [s for s in schedules if s['id'] != schedule_id]
-        save_schedules(schedules)
+        schedule_store.delete(schedule_id)
+        publish_all('schedules', {'action': 'deleted', 'id': schedule_id})
 
         return jsonify({
             'success': True,
@@ -518,38 +1731,71 @@ def delete_schedule(schedule_id):
             'error': str(e)
         }), 500
 
-@app.route('/api/scheduler/status', methods=['GET'])
-def scheduler_status():
-    """Get scheduler daemon status"""
+@app.route('/api/schedules/<int:schedule_id>/runs', methods=['GET'])
+def get_schedule_runs(schedule_id):
+    """Execution history of a schedule, newest first (?offset=&limit=)"""
     try:
-        pid_file = os.path.join(os.path.dirname(__file__), 'scheduler.pid')
-        running = False
-        pid = None
+        try:
+            offset = int(request.args.get('offset', 0))
+            limit = int(request.args.get('limit', RUNS_PAGE_SIZE))
+        except ValueError:
+            offset = limit = -1
+        if offset < 0 or not 1 <= limit <= RUNS_MAX_PAGE_SIZE:
+            return jsonify({
+                'success': False,
+                'error': f'offset must be 0 or more and limit 1-{RUNS_MAX_PAGE_SIZE}'
+            }), 400
 
-        if os.path.exists(pid_file):
-            try:
-                with open(pid_file, 'r') as f:
-                    pid = int(f.read().strip())
-                # Check if process is running
-                try:
-                    os.kill(pid, 0)
-                    running = True
-                except OSError:
-                    running = False
-            except:
-                pass
+        runs, total = run_journal.runs(schedule_id, offset, limit)
+        return jsonify({
+            'success': True,
+            'data': runs,
+            'total': total,
+            'offset': offset,
+            'limit': limit
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
 
-        schedules = load_schedules()
-        enabled_count = sum(1 for s in schedules if s.get('enabled', True))
+def read_scheduler_status():
+    """Read scheduler daemon status from its PID file and the schedule file"""
+    pid_file = os.path.join(os.path.dirname(__file__), 'scheduler.pid')
+    running = False
+    pid = None
 
+    if os.path.exists(pid_file):
+        try:
+            with open(pid_file, 'r') as f:
+                pid = int(f.read().strip())
+            # Check if process is running
+            try:
+                os.kill(pid, 0)
+                running = True
+            except OSError:
+                running = False
+        except:
+            pass
+
+    schedules = schedule_store.load()
+    enabled_count = sum(1 for s in schedules if s.get('enabled', True))
+
+    return {
+        'running': running,
+        'pid': pid,
+        'total_schedules': len(schedules),
+        'enabled_schedules': enabled_count
+    }
+
+@app.route('/api/scheduler/status', methods=['GET'])
+def scheduler_status():
+    """Get scheduler daemon status"""
+    try:
         return jsonify({
             'success': True,
-            'data': {
-                'running': running,
-                'pid': pid,
-                'total_schedules': len(schedules),
-                'enabled_schedules': enabled_count
-            }
+            'data': read_scheduler_status()
         })
     except Exception as e:
         return jsonify({
@@ -613,18 +1859,112 @@ def stop_scheduler():
             'error': str(e)
         }), 500
 
+def admin_denied():
+    """Error response unless the request carries the admin token, else None"""
+    token = os.getenv('SENVILLE_ADMIN_TOKEN')
+    if not token:
+        return jsonify({
+            'success': False,
+            'error': 'Admin endpoints are disabled (set SENVILLE_ADMIN_TOKEN)'
+        }), 403
+    if not hmac.compare_digest(request.headers.get('X-Admin-Token', ''), token):
+        return jsonify({
+            'success': False,
+            'error': 'Invalid admin token'
+        }), 403
+    return None
+
+@app.route('/api/admin/profile', methods=['GET', 'POST'])
+def admin_profile():
+    """Profile the next N requests with the sampling profiler (admin only)"""
+    denied = admin_denied()
+    if denied:
+        return denied
+
+    if request.method == 'GET':
+        return jsonify({
+            'success': True,
+            'data': profiler.status()
+        })
+
+    try:
+        data = request.get_json(silent=True) or {}
+        requests = int(data.get('requests', 20))
+        interval = float(data.get('interval_ms', PROFILE_INTERVAL * 1000)) / 1000
+        if not 1 <= requests <= PROFILE_MAX_REQUESTS or not 0.001 <= interval <= 1:
+            raise ValueError()
+    except (TypeError, ValueError):
+        return jsonify({
+            'success': False,
+            'error': f'requests must be 1-{PROFILE_MAX_REQUESTS} and interval_ms 1-1000'
+        }), 400
+
+    try:
+        profiler.start(requests, interval)
+        return jsonify({
+            'success': True,
+            'message': f'Profiling the next {requests} requests'
+        })
+    except RuntimeError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 409
+
+def schedule_drift(schedule):
+    """Seconds between a schedule's last run and its scheduled minute, or None"""
+    try:
+        ran = datetime.fromisoformat(schedule['last_run'])
+        scheduled = dt_time.fromisoformat(schedule['time'])
+    except (KeyError, TypeError, ValueError):
+        return None
+    return (ran - ran.replace(hour=scheduled.hour, minute=scheduled.minute,
+                              second=0, microsecond=0)).total_seconds()
+
+def collect_metrics():
+    """Update the metrics that are read from current state at scrape time"""
+    for device in get_devices():
+        breaker = device.actor.breaker.describe()
+        for state in (CircuitBreaker.CLOSED, CircuitBreaker.OPEN, CircuitBreaker.HALF_OPEN):
+            BREAKER_STATE.set(1 if breaker['state'] == state else 0, device=device.id, state=state)
+        BREAKER_TRIPS.set(breaker['trips'], device=device.id)
+        BREAKER_REJECTED.set(breaker['rejected'], device=device.id)
+        age = device.poller.age()
+        if age is not None:
+            STATUS_AGE.set(round(age, 3), device=device.id)
+
+    SCHEDULER_RUNNING.set(1 if read_scheduler_status()['running'] else 0)
+    SCHEDULER_DRIFT.clear()
+    for schedule in schedule_store.load():
+        drift = schedule_drift(schedule)
+        if drift is not None:
+            SCHEDULER_DRIFT.set(round(drift, 3), schedule=schedule.get('id'), name=schedule.get('name', ''))
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Prometheus metrics"""
+    try:
+        collect_metrics()
+        return Response(render_metrics(), content_type='text/plain; version=0.0.4; charset=utf-8')
+    except Exception as e:
+        return Response(f"# Error collecting metrics: {e}\n", status=500, content_type='text/plain')
+
 def main():
     load_env()
 
-    # Verify credentials
-    if not all([os.getenv('SENVILLE_IP'), os.getenv('SENVILLE_TOKEN'), os.getenv('SENVILLE_KEY')]):
-        print("Error: Missing credentials in .env file")
+    # Verify credentials / device registry
+    try:
+        devices = get_devices()
+    except Exception as e:
+        print(f"Error: {e}")
         sys.exit(1)
 
     print("=" * 60)
     print("Senville AC REST API Server")
     print("=" * 60)
-    print(f"\nDevice IP: {os.getenv('SENVILLE_IP')}")
+    print("\nDevices:")
+    for device in devices:
+        print(f"  {device.id:<16} {device.ip:<16} {device.name}")
     print(f"\nServer starting on http://0.0.0.0:5000")
     print("\nAvailable endpoints:")
     print("  GET  /api/status           - Get current AC status")
@@ -634,6 +1974,10 @@ def main():
     print("  POST /api/fan              - Set fan speed")
     print("  POST /api/swing            - Set swing")
     print("  POST /api/control          - Set multiple parameters")
+    print("  GET  /api/events           - Status/scheduler event stream (SSE)")
+    print("  GET  /api/devices          - List configured devices")
+    print("  *    /api/devices/<id>/...  - Same device endpoints for a specific unit")
+    print("  GET  /api/fleet/status     - Query all units concurrently")
     print("  GET  /api/schedules        - Get all schedules")
     print("  POST /api/schedules        - Create schedule")
     print("  PUT  /api/schedules/<id>   - Update schedule")
@@ -641,10 +1985,14 @@ def main():
     print("  GET  /api/scheduler/status - Get scheduler status")
     print("  POST /api/scheduler/start  - Start scheduler")
     print("  POST /api/scheduler/stop   - Stop scheduler")
+    print("  GET  /metrics              - Prometheus metrics")
+    print("  POST /api/admin/profile    - Profile the next N requests (admin token)")
     print("\nWeb Dashboard: http://localhost:5000")
     print("=" * 60)
     print()
 
+    start_background_tasks()
+
     app.run(host='0.0.0.0', port=5000, debug=False)
 
 if __name__ == '__main__':
@@ -0,0 +1,1405 @@
+#!/usr/bin/env python3
+"""
+Senville/Midea AC REST API Server (asyncio)
+
+Same routes and JSON responses as api_server.py, but served from a single
+asyncio event loop (Quart on Hypercorn) and driven by the async msmart-ng
+client, so slow device round trips and long-lived event streams do not tie
+up a thread each.
+
+Requires:
+    pip install msmart-ng quart hypercorn
+
+Each device needs its numeric device id (SENVILLE_DEVICE_ID in .env, or
+"device_id" in devices.json) in addition to the IP, token and key.
+
+Usage:
+    python3 api_server_async.py
+
+Access the web interface at: http://localhost:5000
+"""
+
+import os
+import sys
+import json
+import asyncio
+import itertools
+import time
+import types
+from hypercorn.asyncio import serve
+from hypercorn.config import Config
+from msmart.device import AirConditioner as AC
+from msmart.lan import AuthenticationError, ProtocolError
+from quart import Quart, Response, jsonify, request, send_from_directory
+from schedule_store import ScheduleStore
+from shared_state import pending_changes
+from run_journal import RunJournal
+
+app = Quart(__name__, static_folder='web')
+
+DEVICES_FILE = os.path.join(os.path.dirname(__file__), 'devices.json')
+
+# Circuit breaker
+BREAKER_FAILURE_THRESHOLD = 3  # Consecutive failed device jobs before the breaker opens
+BREAKER_RESET_TIMEOUT = 30     # Seconds open before one probe request is let through
+
+# Device job priorities (lower runs first)
+PRIORITY_WRITE = 0
+PRIORITY_READ = 1
+
+# Status polling intervals (seconds)
+POLL_FAST_INTERVAL = 2     # Minimum time between polls
+POLL_BASE_INTERVAL = 10    # Normal interval when the state is changing
+POLL_MAX_INTERVAL = 60     # Upper bound when nothing changes
+POLL_RECONCILE_DELAY = 5   # One read to confirm the written-through state after a write
+
+# Status snapshots older than this are served as stale (seconds)
+STATUS_MAX_AGE = POLL_MAX_INTERVAL
+
+# Server-Sent Events
+EVENT_BUFFER_SIZE = 256        # Events kept for Last-Event-ID resume
+SSE_KEEPALIVE = 15             # Seconds between keepalive comments
+SCHEDULER_WATCH_INTERVAL = 5   # Seconds between scheduler status checks
+
+# Fleet status fan-out
+FLEET_DEADLINE = 5.0           # Default per-request deadline (seconds)
+
+# Write coalescing (seconds)
+WRITE_COALESCE_WINDOW = 0.3    # Quiet period before pending changes are sent
+WRITE_MAX_DELAY = 1.0          # Longest a write waits while more keep arriving
+WRITE_STATE_MAX_AGE = 30       # Oldest polled state a write is compared against without a query
+
+# Schedule run history pages
+RUNS_PAGE_SIZE = 50            # Runs returned when no limit is given
+RUNS_MAX_PAGE_SIZE = 500       # Largest limit accepted
+
+# Errors that mean the device did not answer
+DEVICE_ERRORS = (AuthenticationError, ProtocolError, TimeoutError, OSError)
+
+def load_device_configs():
+    """Load the device registry, falling back to the single unit in .env"""
+    devices_file = os.getenv('SENVILLE_DEVICES_FILE', DEVICES_FILE)
+
+    if os.path.exists(devices_file):
+        with open(devices_file, 'r') as f:
+            configs = json.load(f)
+
+        seen = set()
+        for config in configs:
+            missing = [k for k in ('id', 'ip', 'token', 'key', 'device_id') if not config.get(k)]
+            if missing:
+                raise ValueError(f"Device entry in {devices_file} is missing: {', '.join(missing)}")
+            if config['id'] in seen:
+                raise ValueError(f"Duplicate device id in {devices_file}: {config['id']}")
+            seen.add(config['id'])
+
+        if not configs:
+            raise ValueError(f"No devices defined in {devices_file}")
+        return configs
+
+    ip = os.getenv('SENVILLE_IP')
+    token = os.getenv('SENVILLE_TOKEN')
+    key = os.getenv('SENVILLE_KEY')
+    device_id = os.getenv('SENVILLE_DEVICE_ID')
+
+    if not all([ip, token, key, device_id]):
+        raise ValueError("Missing credentials in .env file "
+                         "(SENVILLE_IP, SENVILLE_TOKEN, SENVILLE_KEY, SENVILLE_DEVICE_ID)")
+
+    return [{'id': 'default', 'name': 'Senville AC', 'ip': ip, 'token': token,
+             'key': key, 'device_id': device_id}]
+
+async def connect_device(ip, device_id, token, key):
+    """Create a device and authenticate its V3 session"""
+    device = AC(ip=ip, port=6444, device_id=int(device_id))
+    await device.authenticate(token, key)
+    return device
+
+async def retry_with_backoff(func, max_retries=3, initial_delay=0.5, on_error=None):
+    """Retry a coroutine function with exponential backoff"""
+    delay = initial_delay
+    last_error = None
+
+    for attempt in range(max_retries):
+        try:
+            return await func()
+        except DEVICE_ERRORS as e:
+            last_error = e
+            if attempt < max_retries - 1:
+                await asyncio.sleep(delay)
+                delay *= 2  # Exponential backoff
+                # Drop the connection on error
+                if on_error:
+                    on_error()
+            else:
+                raise last_error
+
+class CircuitOpenError(Exception):
+    """Raised instead of contacting a device whose circuit breaker is open"""
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests to a device that keeps failing.
+
+    closed:    requests go through; consecutive failures are counted
+    open:      requests fail immediately until reset_timeout has passed
+    half-open: one probe request is let through; success closes the
+               breaker, failure opens it again
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=BREAKER_FAILURE_THRESHOLD, reset_timeout=BREAKER_RESET_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0
+        self._probing = False
+        self._rejected = 0
+        self._trips = 0
+
+    def allow(self):
+        """Raise CircuitOpenError unless a request may be sent now"""
+        if self.state == self.OPEN and time.time() - self._opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+            self._probing = False
+
+        if self.state == self.CLOSED:
+            return
+        if self.state == self.HALF_OPEN and not self._probing:
+            self._probing = True
+            return
+
+        self._rejected += 1
+        retry_in = max(0, self.reset_timeout - (time.time() - self._opened_at))
+        raise CircuitOpenError(f"Device unreachable, retrying in {retry_in:.0f}s")
+
+    def record_success(self):
+        self.state = self.CLOSED
+        self._failures = 0
+        self._probing = False
+
+    def record_failure(self):
+        self._failures += 1
+        if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self.state != self.OPEN:
+                self._trips += 1
+            self.state = self.OPEN
+            self._opened_at = time.time()
+            self._probing = False
+
+    def describe(self):
+        info = {
+            'state': self.state,
+            'failures': self._failures,
+            'rejected': self._rejected,
+            'trips': self._trips,
+        }
+        if self.state == self.OPEN:
+            info['retry_in'] = round(max(0, self.reset_timeout - (time.time() - self._opened_at)), 1)
+        return info
+
+class DeviceActor:
+    """
+    Owns a device connection and runs all of its I/O in one task.
+
+    Jobs are coroutine functions taking the connected device. They wait in a
+    priority queue, so user writes go ahead of background status reads, and
+    a read submitted while an identical read is still queued shares that
+    read's result instead of queueing another device query.
+
+    Jobs are refused up front while the device's circuit breaker is open,
+    and a half-open probe gets a single attempt instead of the usual retries.
+    """
+
+    def __init__(self, connect, breaker=None):
+        self._connect = connect
+        self.breaker = breaker or CircuitBreaker()
+        self._device = None
+        self._queue = asyncio.PriorityQueue()
+        self._order = itertools.count()
+        self._queued_reads = {}
+        self._task = None
+
+    async def read(self, func):
+        """Run a read job, sharing an identical read that is already queued"""
+        future = self._queued_reads.get(func)
+        if future is None:
+            self.breaker.allow()
+            future = self._queued_reads[func] = self._put(func, PRIORITY_READ)
+        return await asyncio.shield(future)
+
+    async def write(self, func):
+        """Run a write job ahead of any queued reads"""
+        self.breaker.allow()
+        return await asyncio.shield(self._put(func, PRIORITY_WRITE))
+
+    def _put(self, func, priority):
+        """Queue a job and make sure the worker is running"""
+        future = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((priority, next(self._order), func, future))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return future
+
+    async def _get_device(self):
+        """Get the connected device, authenticating a new session if needed"""
+        if self._device is None:
+            self._device = await self._connect()
+        return self._device
+
+    def _drop_device(self):
+        """Forget the session so the next attempt reconnects"""
+        self._device = None
+
+    async def _run(self):
+        while True:
+            priority, _, func, future = await self._queue.get()
+            if priority == PRIORITY_READ and self._queued_reads.get(func) is future:
+                # Reads arriving from now on need a fresh query
+                del self._queued_reads[func]
+
+            try:
+                if self.breaker.state == CircuitBreaker.OPEN:
+                    # The breaker opened while this job was queued
+                    self.breaker.allow()
+                probe = self.breaker.state == CircuitBreaker.HALF_OPEN
+                try:
+                    result = await retry_with_backoff(
+                        lambda: self._call(func),
+                        max_retries=1 if probe else 3,
+                        on_error=self._drop_device
+                    )
+                except Exception:
+                    # Any failure settles a half-open probe; otherwise the breaker stays stuck
+                    self._drop_device()
+                    self.breaker.record_failure()
+                    raise
+                self.breaker.record_success()
+            except Exception as e:
+                future.set_exception(e)
+            else:
+                future.set_result(result)
+
+    async def _call(self, func):
+        return await func(await self._get_device())
+
+class StatusPoller:
+    """
+    Background poller that keeps the latest device state in memory.
+
+    Concurrent refresh() calls are merged into a single device query, and the
+    polling interval adapts, slowly backing off to POLL_MAX_INTERVAL while
+    the state stays the same. Successful writes update the snapshot directly
+    (write_through) and schedule one reconciling read.
+    """
+
+    def __init__(self, fetch, on_change=None, on_error=None):
+        self._fetch = fetch
+        self._on_change = on_change
+        self._on_error = on_error
+        self._wake = asyncio.Event()
+        self._task = None
+        self._flight = None
+        self._snapshot = None
+        self._snapshot_time = 0
+        self._error = None
+        self._interval = POLL_BASE_INTERVAL
+        self._next_poll = 0
+
+    def start(self):
+        """Start the polling task (safe to call more than once)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def refresh(self):
+        """Query the device now, joining a query already in flight if there is one"""
+        if self._flight is None:
+            self._flight = asyncio.create_task(self._refresh())
+        return await asyncio.shield(self._flight)
+
+    async def _refresh(self):
+        try:
+            result = await self._fetch()
+        except Exception as e:
+            self._flight = None
+            self._next_poll = time.time() + max(self._interval, POLL_FAST_INTERVAL)
+            had_error, self._error = self._error is not None, e
+            if not had_error and self._on_error:
+                self._on_error(e)
+            raise
+
+        self._flight = None
+        previous, had_error = self._snapshot, self._error is not None
+        changed = result != previous
+        self._snapshot = result
+        self._snapshot_time = time.time()
+        self._error = None
+        self._adapt_interval(changed)
+        self._next_poll = time.time() + max(self._interval, POLL_FAST_INTERVAL)
+
+        if (changed or had_error) and self._on_change:
+            self._on_change(previous, result)
+        return result
+
+    async def snapshot(self, max_age=None):
+        """
+        Return (status, age in seconds, stale) without waiting on the device.
+
+        The device is only queried inline when there is no snapshot yet, or
+        the caller asked for one at most max_age seconds old. Otherwise the
+        last snapshot is returned straight away; if it is stale (too old, or
+        the last poll failed) the poller is woken to refresh it.
+        """
+        self.start()
+        age = time.time() - self._snapshot_time
+
+        if self._snapshot is None or (max_age is not None and age > max_age):
+            return await self.refresh(), 0.0, False
+
+        stale = self._error is not None or age > STATUS_MAX_AGE
+        if stale and self._flight is None:
+            self._poll_in(0)
+        return self._snapshot, age, stale
+
+    async def get(self):
+        """Return the latest snapshot, querying the device only if there is none yet"""
+        return (await self.snapshot())[0]
+
+    def write_through(self, status):
+        """
+        Serve the state a successful write produced as the current snapshot.
+
+        The device is not queried; one read POLL_RECONCILE_DELAY later picks
+        up anything the unit did differently (it arrives as a normal change).
+        """
+        previous = self._snapshot
+        self._snapshot = status
+        self._snapshot_time = time.time()
+        self._error = None
+        self._interval = POLL_BASE_INTERVAL
+        self._poll_in(POLL_RECONCILE_DELAY)
+
+        if status != previous and self._on_change:
+            self._on_change(previous, status)
+
+    def _poll_in(self, delay):
+        """Move the next background poll to delay seconds from now"""
+        self._next_poll = time.time() + delay
+        self._wake.set()
+
+    def _adapt_interval(self, changed):
+        """Pick the next polling interval"""
+        if changed:
+            self._interval = POLL_BASE_INTERVAL
+        else:
+            self._interval = min(self._interval * 2, POLL_MAX_INTERVAL)
+
+    async def _run(self):
+        while True:
+            delay = self._next_poll - time.time()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self._wake.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+                self._wake.clear()
+                continue
+
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"Status poll failed: {e}")
+
+class EventBroker:
+    """
+    Fans server events out to Server-Sent Events clients.
+
+    Recent events are kept in a ring buffer so a reconnecting client can
+    resume from its Last-Event-ID instead of re-reading everything.
+    """
+
+    def __init__(self, size=EVENT_BUFFER_SIZE):
+        self._events = []
+        self._size = size
+        self._next_id = 1
+        self._changed = asyncio.Event()
+
+    @property
+    def last_id(self):
+        return self._next_id - 1
+
+    def publish(self, event, data):
+        """Publish an event to every connected client"""
+        self._events.append((self._next_id, event, json.dumps(data)))
+        del self._events[:-self._size]
+        self._next_id += 1
+        # Wake everyone waiting on the current event, later waiters get a new one
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def _since(self, last_id):
+        """Events after last_id, or None if the client has to resync"""
+        if last_id >= self._next_id:
+            return None  # Client is ahead of us, e.g. the server restarted
+        if self._events and last_id < self._events[0][0] - 1:
+            return None  # Events were dropped from the buffer
+        return [e for e in self._events if e[0] > last_id]
+
+    async def wait(self, last_id, timeout):
+        """Wait until there are events after last_id or the timeout expires"""
+        events = self._since(last_id)
+        if events == []:
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            events = self._since(last_id)
+        return events
+
+class _WriteBatch:
+    """Desired-state changes collected during one coalescing window"""
+
+    def __init__(self, now):
+        self.changes = {}
+        self.first = now
+        self.last = now
+        self.done = asyncio.get_running_loop().create_future()
+
+class WriteCoalescer:
+    """
+    Merges control writes that arrive close together into a single apply().
+
+    Each submit() adds its changes to the pending batch (later values win)
+    and waits for that batch to be sent. The batch is flushed once no new
+    write has arrived for WRITE_COALESCE_WINDOW, or WRITE_MAX_DELAY after its
+    first write, and every waiting request gets the shared result.
+    """
+
+    def __init__(self, apply):
+        self._apply = apply
+        self._batch = None
+
+    async def submit(self, changes):
+        """Queue changes, wait until their batch is applied and return the apply result"""
+        now = time.monotonic()
+        if self._batch is None:
+            self._batch = _WriteBatch(now)
+            asyncio.create_task(self._flush(self._batch))
+        batch = self._batch
+        batch.changes.update(changes)
+        batch.last = now
+
+        return await asyncio.shield(batch.done)
+
+    async def _flush(self, batch):
+        while True:
+            deadline = min(batch.last + WRITE_COALESCE_WINDOW, batch.first + WRITE_MAX_DELAY)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            await asyncio.sleep(remaining)
+
+        # Later writes start a new batch while this one is sent
+        self._batch = None
+        try:
+            result = await self._apply(dict(batch.changes))
+        except Exception as e:
+            batch.done.set_exception(e)
+        else:
+            batch.done.set_result(result)
+
+
+def format_sse(event, data, event_id=None):
+    """Format one Server-Sent Events message"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {data}")
+    return '\n'.join(lines) + '\n\n'
+
+def load_env():
+    """Load environment variables from .env file"""
+    env_file = '.env'
+    if os.path.exists(env_file):
+        with open(env_file) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#') and '=' in line:
+                    key, value = line.split('=', 1)
+                    os.environ[key] = value
+
+def f_to_c(fahrenheit):
+    """Convert Fahrenheit to Celsius"""
+    return (fahrenheit - 32) * 5 / 9
+
+def c_to_f(celsius):
+    """Convert Celsius to Fahrenheit"""
+    return (celsius * 9 / 5) + 32
+
+
+@app.after_request
+async def add_cors_headers(response):
+    """Allow the dashboard to be served from another origin (same as flask-cors defaults)"""
+    response.headers['Access-Control-Allow-Origin'] = '*'
+    if request.method == 'OPTIONS':
+        response.headers['Access-Control-Allow-Headers'] = request.headers.get(
+            'Access-Control-Request-Headers', '*')
+        response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS'
+    return response
+
+@app.route('/')
+async def index():
+    """Serve the web dashboard"""
+    return await send_from_directory('web', 'index.html')
+
+@app.route('/<path:path>')
+async def serve_static(path):
+    """Serve static files from web directory"""
+    return await send_from_directory('web', path)
+
+def build_status(device):
+    """Build the JSON status payload from an msmart-ng device"""
+    # Get display unit preference
+    use_fahrenheit = bool(device.fahrenheit)
+
+    def display(temp):
+        if temp is None:
+            return None
+        return round(c_to_f(temp) if use_fahrenheit else temp, 1)
+
+    swing = device.swing_mode
+    return {
+        'running': bool(device.power_state),
+        'mode': str(int(device.operational_mode)),
+        'target_temperature': display(device.target_temperature),
+        'indoor_temperature': display(device.indoor_temperature),
+        'outdoor_temperature': display(device.outdoor_temperature),
+        'fan_speed': int(device.fan_speed),
+        'vertical_swing': bool(swing & AC.SwingMode.VERTICAL),
+        'horizontal_swing': bool(swing & AC.SwingMode.HORIZONTAL),
+        'fahrenheit': use_fahrenheit,
+        'eco_mode': bool(device.eco),
+        'turbo_mode': bool(device.turbo),
+    }
+
+async def query_status(device):
+    """Device job: query the device and build a status payload"""
+    await device.refresh()
+    if not device.online:
+        # msmart-ng logs timeouts instead of raising them
+        raise TimeoutError(f"No response from {device.ip}")
+    return build_status(device)
+
+def set_state(device, changes):
+    """Copy api_server.py-style state changes onto an msmart-ng device"""
+    if 'running' in changes:
+        device.power_state = changes['running']
+    if 'mode' in changes:
+        device.operational_mode = AC.OperationalMode(changes['mode'])
+    if 'target_temperature' in changes:
+        device.target_temperature = changes['target_temperature']
+    if 'fan_speed' in changes:
+        device.fan_speed = AC.FanSpeed(changes['fan_speed'])
+    if 'vertical_swing' in changes or 'horizontal_swing' in changes:
+        swing = device.swing_mode
+        vertical = changes.get('vertical_swing', bool(swing & AC.SwingMode.VERTICAL))
+        horizontal = changes.get('horizontal_swing', bool(swing & AC.SwingMode.HORIZONTAL))
+        device.swing_mode = AC.SwingMode(
+            (AC.SwingMode.VERTICAL if vertical else 0) | (AC.SwingMode.HORIZONTAL if horizontal else 0)
+        )
+
+def current_state(device):
+    """An msmart-ng device's state in the api_server.py-style fields set_state() takes"""
+    swing = device.swing_mode
+    return types.SimpleNamespace(
+        running=bool(device.power_state),
+        mode=int(device.operational_mode),
+        target_temperature=device.target_temperature,
+        fan_speed=int(device.fan_speed),
+        vertical_swing=bool(swing & AC.SwingMode.VERTICAL),
+        horizontal_swing=bool(swing & AC.SwingMode.HORIZONTAL),
+    )
+
+class DeviceContext:
+    """Per-device state: connection actor, status poller, write queue and event stream"""
+
+    def __init__(self, config):
+        self.id = config['id']
+        self.name = config.get('name', self.id)
+        self.ip = config['ip']
+        self.actor = DeviceActor(
+            lambda: connect_device(config['ip'], config['device_id'], config['token'], config['key']),
+            breaker=CircuitBreaker(
+                failure_threshold=config.get('breaker_threshold', BREAKER_FAILURE_THRESHOLD),
+                reset_timeout=config.get('breaker_timeout', BREAKER_RESET_TIMEOUT)
+            )
+        )
+        self.events = EventBroker()
+        self.poller = StatusPoller(self.fetch_status, on_change=self.publish_status,
+                                   on_error=self.publish_device_error)
+        self.writer = WriteCoalescer(self.apply_changes)
+
+    def describe(self):
+        return {'id': self.id, 'name': self.name, 'ip': self.ip}
+
+    async def fetch_status(self):
+        """Query the device and return a fresh status payload"""
+        return await self.actor.read(query_status)
+
+    async def apply_changes(self, changes):
+        """
+        Send a merged set of state changes to the device in one apply().
+
+        Returns (new status, applied). The changes are compared against the
+        state of the last poll, which is refreshed first only if it is older
+        than WRITE_STATE_MAX_AGE; when the unit already has every requested
+        value nothing is sent.
+        """
+        await self.poller.snapshot(max_age=WRITE_STATE_MAX_AGE)
+
+        async def apply(device):
+            pending = pending_changes(current_state(device), changes)
+            if not pending:
+                return build_status(device), False
+            set_state(device, pending)
+            await device.apply()
+            if not device.online:
+                raise TimeoutError(f"No response from {device.ip}")
+            return build_status(device), True
+
+        status, applied = await self.actor.write(apply)
+        self.poller.write_through(status)
+        return status, applied
+
+    def publish_status(self, previous, current):
+        """Push the status fields that changed since the previous snapshot"""
+        delta = {k: v for k, v in current.items() if previous is None or previous.get(k) != v}
+        if previous is None or not delta:
+            # First snapshot, or the device came back with the same state
+            self.events.publish('status', current)
+        else:
+            self.events.publish('delta', delta)
+
+    def publish_device_error(self, error):
+        """Tell clients the device stopped responding"""
+        self.events.publish('device-error', {'error': f'Communication error: {str(error)}'})
+
+
+_registry = None
+
+def get_devices():
+    """All configured devices, in registry order (loaded on first use)"""
+    global _registry
+
+    if _registry is None:
+        _registry = {c['id']: DeviceContext(c) for c in load_device_configs()}
+    return list(_registry.values())
+
+def find_device(device_id=None):
+    """Look up a device by id; None means the default (first) device"""
+    devices = get_devices()
+    if device_id is None:
+        return devices[0]
+    for device in devices:
+        if device.id == device_id:
+            return device
+    return None
+
+def device_not_found(device_id):
+    return jsonify({
+        'success': False,
+        'error': f"Unknown device: {device_id}"
+    }), 404
+
+
+@app.route('/api/devices', methods=['GET'])
+async def list_devices():
+    """List configured devices"""
+    try:
+        return jsonify({
+            'success': True,
+            'data': [d.describe() for d in get_devices()]
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/status', methods=['GET'])
+@app.route('/api/devices/<device_id>/status', methods=['GET'])
+async def get_status(device_id=None):
+    """Get current AC status (served from the background poller's snapshot)"""
+    device = find_device(device_id)
+    if device is None:
+        return device_not_found(device_id)
+
+    max_age = request.args.get('max_age')
+    try:
+        max_age = float(max_age) if max_age is not None else None
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'max_age must be a number of seconds'
+        }), 400
+
+    try:
+        status, age, stale = await device.poller.snapshot(max_age)
+        return jsonify({
+            'success': True,
+            'data': status,
+            'age_ms': round(age * 1000),
+            'stale': stale,
+            'breaker': device.actor.breaker.describe()
+        })
+    except DEVICE_ERRORS + (CircuitOpenError,) as e:
+        return jsonify({
+            'success': False,
+            'error': f'Communication error: {str(e)}',
+            'breaker': device.actor.breaker.describe()
+        }), 503  # Service Unavailable
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/power', methods=['POST'])
+@app.route('/api/devices/<device_id>/power', methods=['POST'])
+async def set_power(device_id=None):
+    """Turn AC on or off"""
+    device = find_device(device_id)
+    if device is None:
+        return device_not_found(device_id)
+
+    try:
+        data = await request.get_json()
+        power_on = data.get('on', True)
+
+        status, applied = await device.writer.submit({'running': power_on})
+
+        return jsonify({
+            'success': True,
+            'message': f"AC turned {'on' if power_on else 'off'}",
+            'applied': applied,
+            'data': status
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/mode', methods=['POST'])
+@app.route('/api/devices/<device_id>/mode', methods=['POST'])
+async def set_mode(device_id=None):
+    """Set operating mode"""
+    device = find_device(device_id)
+    if device is None:
+        return device_not_found(device_id)
+
+    try:
+        data = await request.get_json()
+        mode = data.get('mode', 'cool').lower()
+
+        mode_map = {
+            'auto': 1,
+            'cool': 2,
+            'dry': 3,
+            'heat': 4,
+            'fan': 5
+        }
+
+        if mode not in mode_map:
+            return jsonify({
+                'success': False,
+                'error': f"Invalid mode. Must be one of: {', '.join(mode_map.keys())}"
+            }), 400
+
+        status, applied = await device.writer.submit({'mode': mode_map[mode]})
+
+        return jsonify({
+            'success': True,
+            'message': f"Mode set to {mode}",
+            'applied': applied,
+            'data': status
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/temperature', methods=['POST'])
+@app.route('/api/devices/<device_id>/temperature', methods=['POST'])
+async def set_temperature(device_id=None):
+    """Set target temperature"""
+    device = find_device(device_id)
+    if device is None:
+        return device_not_found(device_id)
+
+    try:
+        data = await request.get_json()
+        temp = data.get('temperature')
+        use_fahrenheit = data.get('fahrenheit', False)
+
+        if temp is None:
+            return jsonify({
+                'success': False,
+                'error': 'Temperature is required'
+            }), 400
+
+        # Convert to Celsius if needed
+        temp_c = f_to_c(temp) if use_fahrenheit else temp
+
+        if not (16 <= temp_c <= 31):
+            return jsonify({
+                'success': False,
+                'error': 'Temperature out of range (16-31°C / 60-87°F)'
+            }), 400
+
+        status, applied = await device.writer.submit({'target_temperature': float(temp_c)})
+
+        return jsonify({
+            'success': True,
+            'message': f"Temperature set to {temp}°{'F' if use_fahrenheit else 'C'}",
+            'applied': applied,
+            'data': status
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/fan', methods=['POST'])
+@app.route('/api/devices/<device_id>/fan', methods=['POST'])
+async def set_fan(device_id=None):
+    """Set fan speed"""
+    device = find_device(device_id)
+    if device is None:
+        return device_not_found(device_id)
+
+    try:
+        data = await request.get_json()
+        fan_speed = data.get('speed')
+
+        valid_speeds = [20, 40, 60, 80, 102]
+        if fan_speed not in valid_speeds:
+            return jsonify({
+                'success': False,
+                'error': f"Invalid fan speed. Must be one of: {valid_speeds}"
+            }), 400
+
+        status, applied = await device.writer.submit({'fan_speed': fan_speed})
+
+        return jsonify({
+            'success': True,
+            'message': f"Fan speed set to {fan_speed}",
+            'applied': applied,
+            'data': status
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/swing', methods=['POST'])
+@app.route('/api/devices/<device_id>/swing', methods=['POST'])
+async def set_swing(device_id=None):
+    """Set swing settings"""
+    device = find_device(device_id)
+    if device is None:
+        return device_not_found(device_id)
+
+    try:
+        data = await request.get_json()
+        vertical = data.get('vertical')
+        horizontal = data.get('horizontal')
+
+        changes = {}
+        if vertical is not None:
+            changes['vertical_swing'] = bool(vertical)
+        if horizontal is not None:
+            changes['horizontal_swing'] = bool(horizontal)
+
+        status, applied = await device.writer.submit(changes)
+
+        return jsonify({
+            'success': True,
+            'message': 'Swing settings updated',
+            'applied': applied,
+            'data': status
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/control', methods=['POST'])
+@app.route('/api/devices/<device_id>/control', methods=['POST'])
+async def control_all(device_id=None):
+    """Set multiple parameters at once"""
+    device = find_device(device_id)
+    if device is None:
+        return device_not_found(device_id)
+
+    try:
+        data = await request.get_json()
+        changes = {}
+        descriptions = []
+
+        # Power
+        if 'running' in data:
+            changes['running'] = bool(data['running'])
+            descriptions.append(f"power: {'on' if changes['running'] else 'off'}")
+
+        # Mode
+        if 'mode' in data:
+            mode = data['mode'].lower()
+            mode_map = {'auto': 1, 'cool': 2, 'dry': 3, 'heat': 4, 'fan': 5}
+            if mode in mode_map:
+                changes['mode'] = mode_map[mode]
+                descriptions.append(f"mode: {mode}")
+
+        # Temperature
+        if 'temperature' in data:
+            temp = data['temperature']
+            use_f = data.get('fahrenheit', False)
+            temp_c = f_to_c(temp) if use_f else temp
+            if 16 <= temp_c <= 31:
+                changes['target_temperature'] = float(temp_c)
+                descriptions.append(f"temp: {temp}°{'F' if use_f else 'C'}")
+
+        # Fan speed
+        if 'fan_speed' in data:
+            speed = data['fan_speed']
+            if speed in [20, 40, 60, 80, 102]:
+                changes['fan_speed'] = speed
+                descriptions.append(f"fan: {speed}")
+
+        # Swing
+        if 'vertical_swing' in data:
+            changes['vertical_swing'] = bool(data['vertical_swing'])
+            descriptions.append(f"v-swing: {'on' if changes['vertical_swing'] else 'off'}")
+
+        if 'horizontal_swing' in data:
+            changes['horizontal_swing'] = bool(data['horizontal_swing'])
+            descriptions.append(f"h-swing: {'on' if changes['horizontal_swing'] else 'off'}")
+
+        if not changes:
+            raise ValueError('No valid changes specified')
+
+        status, applied = await device.writer.submit(changes)
+
+        return jsonify({
+            'success': True,
+            'message': f"Updated: {', '.join(descriptions)}",
+            'applied': applied,
+            'data': status
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# Fleet Endpoints
+
+async def timed_refresh(device):
+    """Query one device, returning its status and how long the query took"""
+    started = time.monotonic()
+    try:
+        return await device.poller.refresh(), None, time.monotonic() - started
+    except Exception as e:
+        return None, e, time.monotonic() - started
+
+@app.route('/api/fleet/status', methods=['GET'])
+async def fleet_status():
+    """Query every device concurrently and return whatever answered by the deadline"""
+    try:
+        deadline = float(request.args.get('timeout', FLEET_DEADLINE))
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'timeout must be a number of seconds'
+        }), 400
+
+    try:
+        started = time.monotonic()
+        devices = get_devices()
+        tasks = {asyncio.create_task(timed_refresh(d)): d for d in devices}
+        await asyncio.wait(tasks, timeout=deadline)
+
+        results = []
+        for task, device in tasks.items():
+            entry = device.describe()
+            if task.done():
+                data, error, elapsed = task.result()
+                entry['latency_ms'] = round(elapsed * 1000, 1)
+                entry['data'] = data
+                entry['error'] = f'Communication error: {str(error)}' if error else None
+            else:
+                # Still running; it keeps going in the background and
+                # updates the device's snapshot when it finishes
+                entry['latency_ms'] = None
+                entry['data'] = None
+                entry['error'] = f'No response within {deadline:g}s'
+            results.append(entry)
+
+        return jsonify({
+            'success': True,
+            'data': results,
+            'responded': sum(1 for r in results if r['error'] is None),
+            'total': len(results),
+            'elapsed_ms': round((time.monotonic() - started) * 1000, 1)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+# Server-Sent Events
+
+_scheduler_watcher = None
+
+async def watch_scheduler():
+    """Publish a scheduler event whenever the scheduler status changes"""
+    last_status = None
+    while True:
+        try:
+            status = await asyncio.to_thread(read_scheduler_status)
+            if status != last_status:
+                publish_all('scheduler', status)
+                last_status = status
+        except Exception as e:
+            print(f"Scheduler watch failed: {e}")
+        await asyncio.sleep(SCHEDULER_WATCH_INTERVAL)
+
+def publish_all(event, data):
+    """Publish an event that is not tied to one device on every device stream"""
+    for device in get_devices():
+        device.events.publish(event, data)
+
+@app.before_serving
+async def start_background_tasks():
+    """Start the status pollers and scheduler watcher (safe to call more than once)"""
+    global _scheduler_watcher
+
+    for device in get_devices():
+        device.poller.start()
+    if _scheduler_watcher is None or _scheduler_watcher.done():
+        _scheduler_watcher = asyncio.create_task(watch_scheduler())
+
+async def sync_events(device, event_id):
+    """Full status and scheduler events for a client that is (re)syncing"""
+    events = []
+    try:
+        events.append(format_sse('status', json.dumps(await device.poller.get()), event_id))
+    except Exception as e:
+        events.append(format_sse('device-error', json.dumps({'error': f'Communication error: {str(e)}'}), event_id))
+    events.append(format_sse('scheduler', json.dumps(await asyncio.to_thread(read_scheduler_status)), event_id))
+    return events
+
+@app.route('/api/events', methods=['GET'])
+@app.route('/api/devices/<device_id>/events', methods=['GET'])
+async def stream_events(device_id=None):
+    """Stream status deltas and scheduler events (Server-Sent Events)"""
+    device = find_device(device_id)
+    if device is None:
+        return device_not_found(device_id)
+
+    last_id = request.headers.get('Last-Event-ID') or request.args.get('lastEventId')
+    try:
+        last_id = int(last_id) if last_id else None
+    except ValueError:
+        last_id = None
+
+    async def generate(last_id):
+        yield 'retry: 3000\n\n'
+        events = None if last_id is None else await device.events.wait(last_id, 0)
+        while True:
+            if events is None:
+                # New client, or it missed events we no longer have
+                last_id = device.events.last_id
+                for message in await sync_events(device, last_id):
+                    yield message
+                events = []
+
+            for event_id, event, data in events:
+                last_id = event_id
+                yield format_sse(event, data, event_id)
+
+            events = await device.events.wait(last_id, SSE_KEEPALIVE)
+            if events == []:
+                yield ': keepalive\n\n'
+
+    response = Response(generate(last_id), mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no',
+    })
+    response.timeout = None  # Stream for as long as the client stays connected
+    return response
+
+# Schedule Management Endpoints
+
+# Schedule database shared with scheduler.py and manage_schedules.py. Its
+# calls (and the run journal's) do blocking file I/O, so they run in a thread.
+schedule_store = ScheduleStore()
+# Runs recorded by scheduler.py
+run_journal = RunJournal()
+
+@app.route('/api/schedules', methods=['GET'])
+async def get_schedules():
+    """Get all schedules"""
+    try:
+        schedules = await asyncio.to_thread(schedule_store.load)
+        return jsonify({
+            'success': True,
+            'data': schedules
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/schedules', methods=['POST'])
+async def create_schedule():
+    """Create a new schedule"""
+    try:
+        data = await request.get_json()
+
+        # Validate required fields
+        if not all(k in data for k in ['name', 'time', 'action']):
+            return jsonify({
+                'success': False,
+                'error': 'Missing required fields: name, time, action'
+            }), 400
+
+        schedule = await asyncio.to_thread(schedule_store.create, {
+            'name': data['name'],
+            'time': data['time'],
+            'days': data.get('days', []),
+            'action': data['action'],
+            'enabled': data.get('enabled', True),
+            'created_at': data.get('created_at'),
+        })
+        schedule_id = schedule['id']
+        publish_all('schedules', {'action': 'created', 'id': schedule_id})
+
+        return jsonify({
+            'success': True,
+            'data': schedule
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/schedules/<int:schedule_id>', methods=['PUT'])
+async def update_schedule(schedule_id):
+    """Update a schedule"""
+    try:
+        data = await request.get_json()
+        changes = {k: data[k] for k in ['name', 'time', 'days', 'action', 'enabled'] if k in data}
+        schedule = await asyncio.to_thread(schedule_store.update, schedule_id, changes)
+
+        if not schedule:
+            return jsonify({
+                'success': False,
+                'error': 'Schedule not found'
+            }), 404
+
+        publish_all('schedules', {'action': 'updated', 'id': schedule_id})
+
+        return jsonify({
+            'success': True,
+            'data': schedule
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/schedules/<int:schedule_id>', methods=['DELETE'])
+async def delete_schedule(schedule_id):
+    """Delete a schedule"""
+    try:
+        await asyncio.to_thread(schedule_store.delete, schedule_id)
+        publish_all('schedules', {'action': 'deleted', 'id': schedule_id})
+
+        return jsonify({
+            'success': True,
+            'message': 'Schedule deleted'
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/schedules/<int:schedule_id>/runs', methods=['GET'])
+async def get_schedule_runs(schedule_id):
+    """Execution history of a schedule, newest first (?offset=&limit=)"""
+    try:
+        try:
+            offset = int(request.args.get('offset', 0))
+            limit = int(request.args.get('limit', RUNS_PAGE_SIZE))
+        except ValueError:
+            offset = limit = -1
+        if offset < 0 or not 1 <= limit <= RUNS_MAX_PAGE_SIZE:
+            return jsonify({
+                'success': False,
+                'error': f'offset must be 0 or more and limit 1-{RUNS_MAX_PAGE_SIZE}'
+            }), 400
+
+        runs, total = await asyncio.to_thread(run_journal.runs, schedule_id, offset, limit)
+        return jsonify({
+            'success': True,
+            'data': runs,
+            'total': total,
+            'offset': offset,
+            'limit': limit
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def read_scheduler_status():
+    """Read scheduler daemon status from its PID file and the schedule file"""
+    pid_file = os.path.join(os.path.dirname(__file__), 'scheduler.pid')
+    running = False
+    pid = None
+
+    if os.path.exists(pid_file):
+        try:
+            with open(pid_file, 'r') as f:
+                pid = int(f.read().strip())
+            # Check if process is running
+            try:
+                os.kill(pid, 0)
+                running = True
+            except OSError:
+                running = False
+        except:
+            pass
+
+    schedules = schedule_store.load()
+    enabled_count = sum(1 for s in schedules if s.get('enabled', True))
+
+    return {
+        'running': running,
+        'pid': pid,
+        'total_schedules': len(schedules),
+        'enabled_schedules': enabled_count
+    }
+
+@app.route('/api/scheduler/status', methods=['GET'])
+async def scheduler_status():
+    """Get scheduler daemon status"""
+    try:
+        return jsonify({
+            'success': True,
+            'data': await asyncio.to_thread(read_scheduler_status)
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+async def run_scheduler_command(flag):
+    """Run scheduler.py with a control flag, returning (returncode, stderr)"""
+    script_dir = os.path.dirname(__file__)
+    venv_python = os.path.join(script_dir, 'venv', 'bin', 'python3')
+    scheduler_script = os.path.join(script_dir, 'scheduler.py')
+
+    process = await asyncio.create_subprocess_exec(
+        venv_python, scheduler_script, flag,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+        cwd=script_dir
+    )
+    _, stderr = await process.communicate()
+    return process.returncode, stderr.decode()
+
+@app.route('/api/scheduler/start', methods=['POST'])
+async def start_scheduler():
+    """Start the scheduler daemon"""
+    try:
+        returncode, stderr = await run_scheduler_command('--daemon')
+
+        if returncode == 0:
+            return jsonify({
+                'success': True,
+                'message': 'Scheduler started'
+            })
+        else:
+            return jsonify({
+                'success': False,
+                'error': stderr or 'Failed to start scheduler'
+            }), 500
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/scheduler/stop', methods=['POST'])
+async def stop_scheduler():
+    """Stop the scheduler daemon"""
+    try:
+        await run_scheduler_command('--stop')
+
+        return jsonify({
+            'success': True,
+            'message': 'Scheduler stopped'
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def main():
+    load_env()
+
+    # Verify credentials / device registry
+    try:
+        configs = load_device_configs()
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    print("=" * 60)
+    print("Senville AC REST API Server (asyncio)")
+    print("=" * 60)
+    print("\nDevices:")
+    for config in configs:
+        print(f"  {config['id']:<16} {config['ip']:<16} {config.get('name', config['id'])}")
+    print(f"\nServer starting on http://0.0.0.0:5000")
+    print("Endpoints are the same as api_server.py")
+    print("\nWeb Dashboard: http://localhost:5000")
+    print("=" * 60)
+    print()
+
+    config = Config()
+    config.bind = ['0.0.0.0:5000']
+    asyncio.run(serve(app, config))
+
+if __name__ == '__main__':
+    main()
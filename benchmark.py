@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+"""
+Senville API Benchmark
+
+Drives every api_server.py route at a configurable concurrency and records
+throughput and latency histograms per route to a JSON results file.
+Results can be compared with a stored baseline; routes whose p50/p99
+latency or throughput regressed beyond the threshold are reported and
+the script exits with status 1.
+
+Routes benchmarked:
+    status            GET    /api/status
+    control           POST   /api/control
+    schedules_create  POST   /api/schedules
+    schedules_list    GET    /api/schedules
+    schedules_update  PUT    /api/schedules/<id>
+    schedules_delete  DELETE /api/schedules/<id>
+    scheduler_status  GET    /api/scheduler/status
+
+Benchmark schedules are created disabled and deleted again; to keep them
+out of the real schedule database, run the API server with
+SENVILLE_SCHEDULES_FILE pointing at a scratch file (the database is created
+next to it).
+
+Usage:
+    python3 device_emulator.py --write-devices /tmp/emulator/devices.json
+    SENVILLE_DEVICES_FILE=/tmp/emulator/devices.json \\
+    SENVILLE_SCHEDULES_FILE=/tmp/emulator/schedules.json python3 api_server.py
+
+    # Record a baseline
+    python3 benchmark.py --requests 500 --concurrency 8 --output baseline.json
+
+    # Later: compare against it
+    python3 benchmark.py --requests 500 --concurrency 8 --output run.json --baseline baseline.json
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import threading
+from datetime import datetime
+from api_client import percentile, api_request
+
+ROUTES = ['status', 'control', 'schedules', 'scheduler_status']
+
+# Histogram bucket upper bounds in milliseconds (last bucket is +Inf)
+HISTOGRAM_BUCKETS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000]
+
+# Default allowed change before a metric counts as a regression
+REGRESSION_THRESHOLD = 0.20
+REGRESSION_MIN_DELTA_MS = 5    # Ignore latency changes smaller than this (timer noise)
+
+class RouteStats:
+    """Latencies and errors recorded for one route"""
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+        self.lock = threading.Lock()
+
+    def record(self, seconds, ok):
+        with self.lock:
+            self.latencies.append(seconds * 1000)
+            if not ok:
+                self.errors += 1
+
+    def summary(self, elapsed):
+        latencies = self.latencies
+        counts = [0] * (len(HISTOGRAM_BUCKETS) + 1)
+        for ms in latencies:
+            counts[next((i for i, bound in enumerate(HISTOGRAM_BUCKETS) if ms <= bound),
+                        len(HISTOGRAM_BUCKETS))] += 1
+
+        def rounded(value):
+            return None if value is None else round(value, 2)
+
+        return {
+            'requests': len(latencies),
+            'errors': self.errors,
+            'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else None,
+            'mean_ms': rounded(sum(latencies) / len(latencies)) if latencies else None,
+            'p50_ms': rounded(percentile(latencies, 50)),
+            'p90_ms': rounded(percentile(latencies, 90)),
+            'p99_ms': rounded(percentile(latencies, 99)),
+            'max_ms': rounded(max(latencies)) if latencies else None,
+            'histogram': {
+                **{f"le_{bound}ms": n for bound, n in zip(HISTOGRAM_BUCKETS, counts)},
+                'le_inf': counts[-1],
+            },
+        }
+
+class Benchmark:
+    """Runs each route's workload at the configured concurrency"""
+
+    def __init__(self, base_url, timeout):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.stats = {}
+
+    def timed(self, name, method, path, payload=None):
+        """Time one request against a route; returns the parsed body or None"""
+        stats = self.stats.setdefault(name, RouteStats())
+        start = time.monotonic()
+        body = None
+        try:
+            status, body = api_request(method, f"{self.base_url}{path}", payload, self.timeout)
+            ok = status == 200 and body.get('success', False)
+        except Exception:
+            ok = False
+        stats.record(time.monotonic() - start, ok)
+        return body if ok else None
+
+    def status(self):
+        self.timed('status', 'GET', '/api/status')
+
+    def control(self):
+        self.timed('control', 'POST', '/api/control', {'temperature': random.randint(20, 25)})
+
+    def scheduler_status(self):
+        self.timed('scheduler_status', 'GET', '/api/scheduler/status')
+
+    def schedules(self):
+        """One create/list/update/delete cycle on a disabled benchmark schedule"""
+        body = self.timed('schedules_create', 'POST', '/api/schedules', {
+            'name': f"benchmark-{random.getrandbits(32):08x}",
+            'time': '03:00',
+            'days': [],
+            'action': {'power': False},
+            'enabled': False,
+        })
+        self.timed('schedules_list', 'GET', '/api/schedules')
+        if body is None:
+            return
+        schedule_id = body['data']['id']
+        self.timed('schedules_update', 'PUT', f"/api/schedules/{schedule_id}", {'time': '03:30'})
+        self.timed('schedules_delete', 'DELETE', f"/api/schedules/{schedule_id}")
+
+    def run_route(self, route, iterations, concurrency):
+        """Run a route's workload iterations times; returns elapsed seconds"""
+        workload = getattr(self, route)
+        remaining = [iterations]
+        lock = threading.Lock()
+
+        def worker():
+            while True:
+                with lock:
+                    if remaining[0] <= 0:
+                        return
+                    remaining[0] -= 1
+                workload()
+
+        start = time.monotonic()
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(concurrency)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return time.monotonic() - start
+
+def compare(results, baseline, threshold, min_delta_ms=REGRESSION_MIN_DELTA_MS):
+    """List (route, metric, baseline, current, change) regressions"""
+    regressions = []
+    for route, current in results['routes'].items():
+        previous = baseline.get('routes', {}).get(route)
+        if not previous:
+            continue
+        for metric in ['p50_ms', 'p99_ms']:
+            before, after = previous.get(metric), current.get(metric)
+            if before and after and after > before * (1 + threshold) and after - before >= min_delta_ms:
+                regressions.append((route, metric, before, after, after / before - 1))
+        before, after = previous.get('throughput_rps'), current.get('throughput_rps')
+        if before and after and after < before * (1 - threshold):
+            regressions.append((route, 'throughput_rps', before, after, after / before - 1))
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmark api_server.py routes and compare with a baseline'
+    )
+    parser.add_argument(
+        '--url',
+        default='http://localhost:5000',
+        help='API server base URL (default: http://localhost:5000)'
+    )
+    parser.add_argument(
+        '--routes',
+        default=','.join(ROUTES),
+        help=f"Comma-separated routes to run (default: {','.join(ROUTES)})"
+    )
+    parser.add_argument(
+        '--requests',
+        type=int,
+        default=200,
+        help='Iterations per route (default: 200)'
+    )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=4,
+        help='Parallel clients per route (default: 4)'
+    )
+    parser.add_argument(
+        '--warmup',
+        type=int,
+        default=10,
+        help='Untimed iterations per route before measuring (default: 10)'
+    )
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=30,
+        help='Client-side request timeout in seconds (default: 30)'
+    )
+    parser.add_argument(
+        '--min-delta',
+        type=float,
+        default=REGRESSION_MIN_DELTA_MS,
+        help=f'Ignore latency changes smaller than this many ms (default: {REGRESSION_MIN_DELTA_MS})'
+    )
+    parser.add_argument(
+        '--output',
+        metavar='PATH',
+        default='benchmark_results.json',
+        help='Results file (default: benchmark_results.json)'
+    )
+    parser.add_argument(
+        '--baseline',
+        metavar='PATH',
+        help='Compare with a previous results file'
+    )
+    parser.add_argument(
+        '--threshold',
+        type=float,
+        default=REGRESSION_THRESHOLD,
+        help=f'Allowed relative change before a regression is reported (default: {REGRESSION_THRESHOLD})'
+    )
+
+    args = parser.parse_args()
+
+    routes = [r.strip() for r in args.routes.split(',') if r.strip()]
+    unknown = [r for r in routes if r not in ROUTES]
+    if unknown:
+        print(f"Error: unknown route(s): {', '.join(unknown)}")
+        sys.exit(1)
+
+    base_url = args.url.rstrip('/')
+    try:
+        api_request('GET', f"{base_url}/api/devices", timeout=args.timeout)
+    except Exception as e:
+        print(f"Error: API server not reachable at {args.url}: {e}")
+        sys.exit(1)
+
+    print("=" * 60)
+    print("Senville API Benchmark")
+    print("=" * 60)
+    print(f"{args.requests} iterations per route, concurrency {args.concurrency}\n")
+
+    results = {
+        'meta': {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'url': base_url,
+            'requests': args.requests,
+            'concurrency': args.concurrency,
+            'python': platform.python_version(),
+            'host': platform.node(),
+        },
+        'routes': {},
+    }
+
+    for route in routes:
+        if args.warmup:
+            Benchmark(base_url, args.timeout).run_route(route, args.warmup, args.concurrency)
+        bench = Benchmark(base_url, args.timeout)
+        elapsed = bench.run_route(route, args.requests, args.concurrency)
+        for name, stats in sorted(bench.stats.items()):
+            summary = stats.summary(elapsed)
+            results['routes'][name] = summary
+            print(f"{name:<18} {summary['throughput_rps']:>8.1f} req/s  "
+                  f"p50 {summary['p50_ms']:>8.1f}ms  "
+                  f"p99 {summary['p99_ms']:>8.1f}ms  "
+                  f"errors {summary['errors']}")
+
+    with open(args.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        try:
+            with open(args.baseline) as f:
+                baseline = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Error reading baseline: {e}")
+            sys.exit(1)
+
+        regressions = compare(results, baseline, args.threshold, args.min_delta)
+        print(f"\nCompared with {args.baseline} ({baseline.get('meta', {}).get('timestamp', 'unknown date')}):")
+        if not regressions:
+            print(f"  No regressions beyond {args.threshold:.0%}")
+        for route, metric, before, after, change in regressions:
+            print(f"  REGRESSION {route} {metric}: {before} -> {after} ({change:+.0%})")
+        print("=" * 60)
+        if regressions:
+            sys.exit(1)
+    else:
+        print("=" * 60)
+
+if __name__ == '__main__':
+    main()
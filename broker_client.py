@@ -0,0 +1,184 @@
+"""
+Senville Device Broker Client
+
+Lets the local tools share device_broker.py's connection to a unit instead
+of each opening their own. connect_device() is a drop-in replacement for
+midea_beautiful's appliance_state(): while the broker is running it returns
+a BrokerDevice with the same state/refresh()/apply() interface, otherwise it
+connects to the unit directly.
+
+Environment:
+    SENVILLE_BROKER         "off" to always connect directly
+    SENVILLE_BROKER_SOCKET  Broker socket path (default: broker.sock next to
+                            the scripts)
+"""
+
+import os
+import json
+import socket
+import itertools
+from midea_beautiful import appliance_state
+from midea_beautiful.exceptions import MideaError, MideaNetworkError
+
+DEFAULT_BROKER_SOCKET = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'broker.sock')
+BROKER_TIMEOUT = 60  # Seconds to wait for a reply; writes may queue for the rate budget
+
+# Fields shared between the broker and its clients
+STATE_FIELDS = [
+    'running', 'mode', 'target_temperature', 'indoor_temperature', 'outdoor_temperature',
+    'fan_speed', 'vertical_swing', 'horizontal_swing', 'fahrenheit', 'eco_mode', 'turbo',
+    'turbo_fan', 'comfort_mode', 'comfort_sleep', 'dryer', 'purifier', 'frost_protect',
+    'show_screen', 'beep_prompt', 'error_code',
+]
+WRITABLE_FIELDS = [
+    'running', 'mode', 'target_temperature', 'fan_speed', 'vertical_swing', 'horizontal_swing',
+    'fahrenheit', 'eco_mode', 'turbo', 'turbo_fan', 'comfort_mode', 'comfort_sleep', 'dryer',
+    'purifier', 'frost_protect', 'show_screen', 'beep_prompt',
+]
+INFO_FIELDS = ['appliance_id', 'name', 'serial_number', 'mac', 'firmware_version', 'protocol_version']
+
+def broker_socket_path():
+    return os.getenv('SENVILLE_BROKER_SOCKET', DEFAULT_BROKER_SOCKET)
+
+class BrokerError(MideaError):
+    """An error reported by the broker (code is e.g. 'unknown_device' or 'device_error')"""
+
+    def __init__(self, message, code=None):
+        super().__init__(message)
+        self.code = code
+
+
+class BrokerClient:
+    """One connection to the broker: JSON request/response lines plus subscription events"""
+
+    def __init__(self, path=None, timeout=BROKER_TIMEOUT):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(timeout)
+        try:
+            self.sock.connect(path or broker_socket_path())
+        except OSError:
+            self.sock.close()
+            raise
+        self._reader = self.sock.makefile('rb')
+        self._ids = itertools.count(1)
+
+    def _read(self):
+        line = self._reader.readline()
+        if not line:
+            raise MideaNetworkError("Broker closed the connection")
+        return json.loads(line)
+
+    def call(self, method, **params):
+        """Send a request and return its result, raising BrokerError on errors"""
+        request_id = next(self._ids)
+        self.sock.sendall((json.dumps({'id': request_id, 'method': method, 'params': params}) + '\n').encode())
+        while True:
+            message = self._read()
+            if message.get('id') != request_id:
+                continue  # Subscription event received before the reply
+            if 'error' in message:
+                raise BrokerError(message['error'], message.get('code'))
+            return message['result']
+
+    def events(self):
+        """Yield events after subscribe(); keepalives are skipped"""
+        while True:
+            message = self._read()
+            if message.get('event') not in (None, 'keepalive'):
+                yield message
+
+    def close(self):
+        self._reader.close()
+        self.sock.close()
+
+
+class BrokerState:
+    """Device state fields as plain attributes, like an appliance's state object"""
+
+    def __init__(self, fields):
+        self.__dict__.update(fields)
+
+
+class BrokerDevice:
+    """
+    Drop-in for a midea_beautiful LAN appliance that goes through the broker.
+
+    apply() only sends the fields changed since the last refresh, so tools
+    sharing the broker don't overwrite each other's settings with stale
+    values. _socket/_disconnect()/_authenticate() mirror the appliance's
+    session handling so the API server can manage it the same way.
+    """
+
+    def __init__(self, address, path=None):
+        self.address = address
+        self._path = path
+        self._client = None
+        self._sent = {}
+        self.state = None
+        self.stale = False      # True if the broker answered from its cache for lack of budget
+        for field in INFO_FIELDS:
+            setattr(self, field, None)
+        self.refresh()
+
+    @property
+    def _socket(self):
+        return self._client.sock if self._client else None
+
+    def _authenticate(self):
+        """(Re)connect to the broker"""
+        self._disconnect()
+        try:
+            self._client = BrokerClient(self._path)
+        except OSError as e:
+            raise MideaNetworkError(f"Broker not reachable: {e}") from e
+
+    def _disconnect(self):
+        if self._client:
+            self._client.close()
+            self._client = None
+
+    def _call(self, method, **params):
+        if self._client is None:
+            self._authenticate()
+        try:
+            return self._client.call(method, device=self.address, **params)
+        except (OSError, ValueError) as e:
+            self._disconnect()
+            raise MideaNetworkError(f"Broker connection failed: {e}") from e
+
+    def _update(self, result):
+        self.state = BrokerState(result['state'])
+        self.stale = result.get('stale', False)
+        self._sent = dict(result['state'])
+        for field, value in result.get('info', {}).items():
+            setattr(self, field, value)
+
+    def refresh(self, max_age=0):
+        """
+        Fetch the state from the unit.
+
+        A non-zero max_age accepts the broker's cache if it is that recent; the
+        broker may then also answer from an older cache when its request budget
+        is used up, and sets stale. With max_age=0 it waits for budget instead.
+        """
+        self._update(self._call('get_state', max_age=max_age))
+
+    def apply(self):
+        changes = {f: getattr(self.state, f) for f in WRITABLE_FIELDS
+                   if hasattr(self.state, f) and getattr(self.state, f) != self._sent.get(f)}
+        if changes:
+            self._update(self._call('apply', changes=changes))
+
+
+def connect_device(ip, token, key):
+    """Connect through the broker when it is running, otherwise directly"""
+    if os.getenv('SENVILLE_BROKER', 'auto').lower() != 'off' and os.path.exists(broker_socket_path()):
+        try:
+            return BrokerDevice(ip)
+        except BrokerError as e:
+            if e.code != 'unknown_device':
+                raise
+            print(f"Broker does not manage {ip}, connecting directly")
+        except MideaNetworkError as e:
+            print(f"{e}, connecting directly")
+    return appliance_state(address=ip, token=token, key=key)
@@ -13,7 +13,7 @@ Usage:
 import os
 import sys
 import argparse
-from midea_beautiful import appliance_state
+from broker_client import connect_device
 
 def load_env():
     """Load environment variables from .env file"""
@@ -50,7 +50,7 @@ def control_ac(power=None, mode=None, temp=None, temp_f=None,
     print(f"Connecting to {ip}...")
 
     # Get current state
-    device = appliance_state(address=ip, token=token, key=key)
+    device = connect_device(ip, token, key)
     state = device.state
 
     temp_unit = '°F' if state.fahrenheit else '°C'
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+Senville Device Broker
+
+Owns the connection to each configured unit and shares it with every local
+tool over a Unix domain socket, so the unit sees one well-behaved client
+instead of the API server, scheduler, GUI and scripts each connecting and
+polling on their own.
+
+Device requests are limited by a per-device budget (token bucket) shared
+by all clients. Reads beyond the budget are answered from the last known
+state (marked stale); writes, and reads with max_age 0, wait for budget.
+
+Protocol (one JSON object per line; devices are addressed by registry id
+or IP address, the first device when omitted):
+    -> {"id": 1, "method": "get_state", "params": {"device": "192.168.1.100", "max_age": 5}}
+    <- {"id": 1, "result": {"state": {...}, "info": {...}, "age": 1.2, "stale": false}}
+    -> {"id": 2, "method": "apply", "params": {"device": "bedroom", "changes": {"running": true}}}
+    <- {"id": 2, "result": {"state": {...}, ...}}
+    -> {"id": 3, "method": "subscribe", "params": {"device": "bedroom"}}
+    <- {"id": 3, "result": {"state": {...}, ...}}
+    <- {"event": "state", "device": "bedroom", "data": {"state": {...}, ...}}   (on every change)
+    -> {"id": 4, "method": "devices"}
+
+Usage:
+    python3 device_broker.py
+    python3 device_broker.py --rate 0.5 --burst 4
+
+Tools go through the broker automatically while it is running (see
+broker_client.py); set SENVILLE_BROKER=off to bypass it.
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import socket
+import argparse
+import threading
+import socketserver
+from midea_beautiful import appliance_state
+from midea_beautiful.exceptions import MideaError, MideaNetworkError
+from broker_client import STATE_FIELDS, WRITABLE_FIELDS, INFO_FIELDS, broker_socket_path
+from shared_state import StatePublisher
+
+DEVICES_FILE = os.path.join(os.path.dirname(__file__), 'devices.json')
+
+# Per-device request budget, shared by all clients
+BROKER_RATE = 0.5              # Device requests per second, sustained
+BROKER_BURST = 4               # Requests allowed back to back after a quiet period
+BROKER_WRITE_WAIT = 30         # Longest a write waits for budget (seconds)
+
+DEFAULT_MAX_AGE = 5            # Reads accept a cached state this old (seconds)
+POLL_INTERVAL = 30             # Background refresh / keepalive interval (seconds)
+SUBSCRIBE_KEEPALIVE = 15       # Seconds between keepalive events to subscribers
+
+DEVICE_ERRORS = (MideaNetworkError, MideaError, TimeoutError, OSError)
+
+def load_env():
+    """Load environment variables from .env file"""
+    env_file = '.env'
+    if os.path.exists(env_file):
+        with open(env_file) as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#') and '=' in line:
+                    key, value = line.split('=', 1)
+                    os.environ[key] = value
+
+def load_device_configs():
+    """Load the device registry, falling back to the single unit in .env"""
+    devices_file = os.getenv('SENVILLE_DEVICES_FILE', DEVICES_FILE)
+
+    if os.path.exists(devices_file):
+        with open(devices_file, 'r') as f:
+            configs = json.load(f)
+        for config in configs:
+            missing = [k for k in ('id', 'ip', 'token', 'key') if not config.get(k)]
+            if missing:
+                raise ValueError(f"Device entry in {devices_file} is missing: {', '.join(missing)}")
+        if not configs:
+            raise ValueError(f"No devices defined in {devices_file}")
+        return configs
+
+    ip = os.getenv('SENVILLE_IP')
+    token = os.getenv('SENVILLE_TOKEN')
+    key = os.getenv('SENVILLE_KEY')
+
+    if not all([ip, token, key]):
+        raise ValueError("Missing credentials in .env file")
+
+    return [{'id': 'default', 'name': 'Senville AC', 'ip': ip, 'token': token, 'key': key}]
+
+class BrokerRequestError(Exception):
+    """An error returned to the client with a machine-readable code"""
+
+    def __init__(self, message, code):
+        super().__init__(message)
+        self.code = code
+
+
+class TokenBucket:
+    """Request budget: `rate` requests per second with bursts of up to `burst`"""
+
+    def __init__(self, rate=BROKER_RATE, burst=BROKER_BURST):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_take(self):
+        """Take a token if one is available right now"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def take(self, timeout):
+        """Wait up to timeout seconds for a token"""
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self.rate
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(wait, remaining))
+
+
+class ManagedDevice:
+    """One unit's connection, cached state, request budget and subscribers"""
+
+    def __init__(self, config, rate=BROKER_RATE, burst=BROKER_BURST, publisher=None):
+        self.id = config['id']
+        self.name = config.get('name', self.id)
+        self.ip = config['ip']
+        self._token = config['token']
+        self._key = config['key']
+        self.budget = TokenBucket(rate, burst)
+        self.publisher = publisher       # Shared state snapshot for tools that read without a request
+        self._device = None
+        self._io = threading.Lock()      # Serializes device I/O; waiting reads share the result
+        self._changed = threading.Condition()
+        self._state = None
+        self._info = {}
+        self._updated = 0
+        self.version = 0
+        self.stats = {'queries': 0, 'applies': 0, 'cached': 0, 'throttled': 0, 'errors': 0}
+
+    def _call(self, func):
+        """Run func on the connected unit, reconnecting once after an error (io lock held)"""
+        for attempt in range(2):
+            try:
+                if self._device is None:
+                    self._device = appliance_state(address=self.ip, token=self._token, key=self._key)
+                    self._info = {f: getattr(self._device, f, None) for f in INFO_FIELDS}
+                result = func(self._device)
+                self._store(self._device.state)
+                return result
+            except DEVICE_ERRORS as e:
+                self.stats['errors'] += 1
+                if self._device is not None:
+                    self._device._disconnect()
+                if attempt == 1:
+                    raise BrokerRequestError(f"Communication error: {e}", 'device_error')
+
+    def _store(self, state):
+        fields = {f: getattr(state, f) for f in STATE_FIELDS if hasattr(state, f)}
+        with self._changed:
+            self._updated = time.time()
+            if fields != self._state:
+                self._state = fields
+                self.version += 1
+                self._changed.notify_all()
+
+        if self.publisher:
+            try:
+                self.publisher.publish(self.id, self.ip, state)
+            except (OSError, ValueError) as e:
+                print(f"[{self.id}] Shared state snapshot disabled: {e}")
+                self.publisher = None
+
+    def snapshot(self, stale=False):
+        with self._changed:
+            return {
+                'state': self._state,
+                'info': self._info,
+                'age': round(time.time() - self._updated, 3),
+                'stale': stale,
+            }
+
+    def _fresh(self, max_age):
+        return self._state is not None and time.time() - self._updated <= max_age
+
+    def get_state(self, max_age=None):
+        """Latest state, querying the unit only if the cache is too old and budget allows (max_age=0 always queries)"""
+        max_age = DEFAULT_MAX_AGE if max_age is None else max_age
+        if self._fresh(max_age):
+            self.stats['cached'] += 1
+            return self.snapshot()
+
+        with self._io:
+            if self._fresh(max_age):
+                # Another client refreshed it while we waited
+                self.stats['cached'] += 1
+                return self.snapshot()
+            if not self.budget.try_take():
+                if self._state is not None and max_age > 0:
+                    self.stats['throttled'] += 1
+                    return self.snapshot(stale=True)
+                if not self.budget.take(BROKER_WRITE_WAIT):
+                    raise BrokerRequestError("Device request budget exhausted", 'throttled')
+            self.stats['queries'] += 1
+            self._call(lambda device: device.refresh())
+            return self.snapshot()
+
+    def apply(self, changes):
+        """Apply a delta to the unit's current state"""
+        unknown = [k for k in changes if k not in WRITABLE_FIELDS]
+        if unknown:
+            raise BrokerRequestError(f"Fields not writable: {', '.join(unknown)}", 'bad_request')
+
+        def apply(device):
+            for field, value in changes.items():
+                setattr(device.state, field, value)
+            device.apply()
+
+        with self._io:
+            if not self.budget.take(BROKER_WRITE_WAIT):
+                self.stats['throttled'] += 1
+                raise BrokerRequestError("Device request budget exhausted", 'throttled')
+            self.stats['applies'] += 1
+            self._call(apply)
+            return self.snapshot()
+
+    def wait_change(self, version, timeout):
+        """Block until the state version differs from version or timeout; returns the new version"""
+        with self._changed:
+            self._changed.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+
+class BrokerHandler(socketserver.StreamRequestHandler):
+    """Serves one client connection"""
+
+    def send(self, message):
+        self.wfile.write((json.dumps(message) + '\n').encode())
+
+    def handle(self):
+        for line in self.rfile:
+            request_id = None
+            try:
+                request = json.loads(line)
+                request_id = request.get('id')
+                method = request.get('method')
+                params = request.get('params') or {}
+
+                if method == 'devices':
+                    self.send({'id': request_id, 'result': [
+                        {'id': d.id, 'name': d.name, 'ip': d.ip, 'stats': d.stats}
+                        for d in self.server.devices
+                    ]})
+                    continue
+
+                device = self.server.find(params.get('device'))
+                if method == 'get_state':
+                    self.send({'id': request_id, 'result': device.get_state(params.get('max_age'))})
+                elif method == 'apply':
+                    self.send({'id': request_id, 'result': device.apply(params.get('changes') or {})})
+                elif method == 'subscribe':
+                    self.subscribe(request_id, device)
+                    return
+                else:
+                    raise BrokerRequestError(f"Unknown method: {method}", 'bad_request')
+
+            except BrokerRequestError as e:
+                self.send({'id': request_id, 'error': str(e), 'code': e.code})
+            except (ValueError, AttributeError, TypeError) as e:
+                self.send({'id': request_id, 'error': f"Bad request: {e}", 'code': 'bad_request'})
+
+    def subscribe(self, request_id, device):
+        """Send the current state, then every change until the client disconnects"""
+        version = device.version
+        self.send({'id': request_id, 'result': device.get_state()})
+        while True:
+            new_version = device.wait_change(version, SUBSCRIBE_KEEPALIVE)
+            if new_version != version:
+                version = new_version
+                self.send({'event': 'state', 'device': device.id, 'data': device.snapshot()})
+            else:
+                self.send({'event': 'keepalive'})
+
+
+class Broker(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, path, devices):
+        self.devices = devices
+        super().__init__(path, BrokerHandler)
+
+    def find(self, name):
+        """Look up a device by id or IP; None means the first device"""
+        if name is None:
+            return self.devices[0]
+        for device in self.devices:
+            if name in (device.id, device.ip):
+                return device
+        raise BrokerRequestError(f"Unknown device: {name}", 'unknown_device')
+
+    def handle_error(self, request, client_address):
+        error = sys.exc_info()[1]
+        if not isinstance(error, (BrokenPipeError, ConnectionResetError)):
+            super().handle_error(request, client_address)
+
+def poll_devices(devices):
+    """Keep each unit's cached state fresh (and its session open) in the background"""
+    while True:
+        for device in devices:
+            try:
+                device.get_state(max_age=POLL_INTERVAL)
+            except BrokerRequestError as e:
+                print(f"[{device.id}] Poll failed: {e}")
+        time.sleep(POLL_INTERVAL / 3)
+
+def socket_in_use(path):
+    """True if another broker is already listening on path"""
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Share device connections with local tools over a Unix socket'
+    )
+    parser.add_argument(
+        '--socket',
+        help='Socket path (default: SENVILLE_BROKER_SOCKET or broker.sock next to this script)'
+    )
+    parser.add_argument(
+        '--rate',
+        type=float,
+        default=BROKER_RATE,
+        help=f'Device requests per second per unit (default: {BROKER_RATE})'
+    )
+    parser.add_argument(
+        '--burst',
+        type=int,
+        default=BROKER_BURST,
+        help=f'Requests allowed back to back (default: {BROKER_BURST})'
+    )
+
+    args = parser.parse_args()
+    load_env()
+
+    path = args.socket or broker_socket_path()
+    try:
+        publisher = StatePublisher()
+        devices = [ManagedDevice(c, args.rate, args.burst, publisher) for c in load_device_configs()]
+    except Exception as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    if os.path.exists(path):
+        if socket_in_use(path):
+            print(f"Error: a broker is already running on {path}")
+            sys.exit(1)
+        os.remove(path)  # Left over from a broker that did not shut down cleanly
+
+    server = Broker(path, devices)
+    os.chmod(path, 0o600)  # Only the owner may control the units
+
+    print("=" * 60)
+    print("Senville Device Broker")
+    print("=" * 60)
+    print(f"Socket: {path}")
+    print(f"Budget: {args.rate} requests/s per unit, bursts of {args.burst}")
+    print("\nDevices:")
+    for device in devices:
+        print(f"  {device.id:<16} {device.ip:<16} {device.name}")
+    print("\nPress Ctrl+C to stop")
+    print("=" * 60)
+
+    # Exit through the cleanup below on SIGTERM (systemd stop, scheduler-style kill)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+
+    threading.Thread(target=poll_devices, args=(devices,), name='broker-poll', daemon=True).start()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nBroker stopped")
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.remove(path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,606 @@
+#!/usr/bin/env python3
+"""
+Senville/Midea V3 Device Emulator
+
+Emulates one or more Midea V3 air conditioners on localhost so the API
+server, scheduler, status and control scripts can be exercised and load
+tested without a physical unit.
+
+Each virtual unit answers:
+    UDP 6445 / 20086  Discovery (encrypted device description)
+    TCP 6444          V3 (8370) token/key handshake, then encrypted
+                      0x41 status queries and 0x40 set commands, both
+                      answered with a 0xC0 status frame. 0xB5 capability
+                      queries get an empty capability list.
+
+Units are bound to consecutive loopback addresses (127.0.0.10, .11, ...),
+which Linux routes to lo without any setup, and all run in one asyncio
+process. Tokens/keys are derived from the unit number, so they are the
+same every run.
+
+Faults can be injected to exercise the client retry paths:
+    --drop-handshake P  Close the connection instead of answering a handshake
+    --timeout P         Silently ignore a request
+    --corrupt P         Answer with a bad V3 packet signature (the SHA-256
+                        after the encrypted payload). It is the only check
+                        both clients make: midea_beautiful ignores the 5A5A
+                        MD5 and the AA frame checksum/CRC8, which msmart
+                        also verifies
+    --outage-every S    Every S seconds drop all connections and go silent
+    --outage-duration S   for S seconds (mimics the SK103 WiFi drop)
+    --fault-script F    JSON list of timed phases overriding the above, e.g.
+                        [{"duration": 60},
+                         {"duration": 60, "timeout": 0.2, "latency": 0.5}]
+                        Phases repeat once the script ends.
+
+Usage:
+    # One unit on 127.0.0.10
+    python3 device_emulator.py
+
+    # 50 units, 80ms +/- 40ms per response, and a registry for api_server.py
+    python3 device_emulator.py --count 50 --latency 0.08 --jitter 0.04 \\
+        --write-devices /tmp/emulator/devices.json
+
+    SENVILLE_DEVICES_FILE=/tmp/emulator/devices.json python3 api_server.py
+
+    # .env for scripts that use a single unit (status.py, control_*.py,
+    # scheduler.py read .env from the current directory)
+    python3 device_emulator.py --write-env /tmp/emulator/.env
+    cd /tmp/emulator && python3 /path/to/status.py
+
+    # 10% silent timeouts and a 15s WiFi drop every 2 minutes
+    python3 device_emulator.py --timeout 0.1 --outage-every 120 --outage-duration 15
+"""
+
+import os
+import sys
+import json
+import argparse
+import asyncio
+import hashlib
+import ipaddress
+import random
+import time
+from midea_beautiful.crypto import Security, crc8
+
+# Discovery ports (both are probed by the client libraries)
+DISCOVERY_PORTS = [6445, 20086]
+
+# V3 (8370) packet types
+MSGTYPE_HANDSHAKE_REQUEST = 0x0
+MSGTYPE_HANDSHAKE_RESPONSE = 0x1
+MSGTYPE_ENCRYPTED_RESPONSE = 0x3
+MSGTYPE_ENCRYPTED_REQUEST = 0x6
+MSGTYPE_ERROR = 0xF
+
+APPLIANCE_TYPE_AC = 0xAC
+BASE_DEVICE_ID = 150000000000000
+
+# Fault settings that can be set on the command line or per script phase
+FAULT_SETTINGS = ['latency', 'jitter', 'drop_handshake', 'timeout', 'corrupt',
+                  'outage_every', 'outage_duration']
+
+security = Security()
+
+def unit_credentials(number):
+    """Token (128 hex chars) and key (64 hex chars) for a virtual unit"""
+    seed = f"senville-emulator-{number}".encode()
+    return hashlib.sha512(seed).hexdigest(), hashlib.sha256(seed).hexdigest()
+
+def strxor(data, key):
+    return bytes(a ^ b for a, b in zip(data, key))
+
+def encode_8370(data, msgtype, count, tcp_key=None):
+    """Wrap data in a V3 packet, encrypting it for encrypted message types"""
+    size, pad = len(data), 0
+    if msgtype == MSGTYPE_ENCRYPTED_RESPONSE:
+        if (size + 2) % 16 != 0:
+            pad = 16 - (size + 2) % 16
+            data += os.urandom(pad)
+        size += pad + 32
+    header = b'\x83\x70' + size.to_bytes(2, 'big') + bytes([0x20, pad << 4 | msgtype])
+    data = (count & 0xFFF).to_bytes(2, 'big') + data
+    if msgtype == MSGTYPE_ENCRYPTED_RESPONSE:
+        sign = hashlib.sha256(header + data).digest()
+        data = security.aes_cbc_encrypt(data, tcp_key) + sign
+    return header + data
+
+def decode_8370(buffer, tcp_key=None):
+    """Split complete V3 packets off the buffer: ([(msgtype, count, data)], rest)"""
+    packets = []
+    while len(buffer) >= 6:
+        if buffer[:2] != b'\x83\x70':
+            raise ValueError("Not a V3 (8370) packet")
+        total = int.from_bytes(buffer[2:4], 'big') + 8
+        if len(buffer) < total:
+            break
+        packet, buffer = buffer[:total], buffer[total:]
+        header, msgtype, pad = packet[:6], packet[5] & 0xF, packet[5] >> 4
+        data = packet[6:]
+
+        if msgtype == MSGTYPE_ENCRYPTED_REQUEST:
+            if tcp_key is None:
+                raise ValueError("Encrypted request before handshake")
+            sign, data = data[-32:], security.aes_cbc_decrypt(data[:-32], tcp_key)
+            if hashlib.sha256(header + data).digest() != sign:
+                raise ValueError("Packet signature mismatch")
+            if pad:
+                data = data[:-pad]
+        packets.append((msgtype, int.from_bytes(data[:2], 'big'), data[2:]))
+    return packets, buffer
+
+def lan_packet(device_id, frame):
+    """Wrap an AA frame in an encrypted 5A5A LAN packet"""
+    header = bytearray(40)
+    header[0:4] = b'\x5a\x5a\x01\x11'
+    header[6:8] = b'\x20\x00'
+    header[20:28] = device_id.to_bytes(8, 'little')
+    packet = header + security.aes_encrypt(frame)
+    packet[4:6] = (len(packet) + 16).to_bytes(2, 'little')
+    return bytes(packet + security.md5fingerprint(bytes(packet)))
+
+def build_frame(frame_type, body):
+    """Build an AA frame: header, body, body CRC8 and frame checksum"""
+    frame = bytearray([0xAA, 0, APPLIANCE_TYPE_AC, 0, 0, 0, 0, 0, 0, frame_type])
+    frame += body
+    frame.append(crc8(bytes(body)))
+    frame[1] = len(frame)  # Length excludes the 0xAA start byte, includes the checksum
+    frame.append((~sum(frame[1:]) + 1) & 0xFF)
+    return bytes(frame)
+
+def encode_temperature(celsius):
+    """Encode an indoor/outdoor temperature byte (0.5°C steps)"""
+    if celsius is None:
+        return 0xFF
+    return max(0, min(0xFE, int(round(celsius * 2)) + 50))
+
+
+class FaultInjector:
+    """Decides which faults to inject, following an optional timed script"""
+
+    def __init__(self, settings, script=None):
+        self.settings = settings
+        self.script = script or []
+        self.started = time.monotonic()
+        self.counts = {'drop_handshake': 0, 'timeout': 0, 'corrupt': 0, 'outages': 0}
+
+    def current(self):
+        """Fault settings for the current script phase"""
+        if not self.script:
+            return self.settings
+        elapsed = (time.monotonic() - self.started) % sum(p['duration'] for p in self.script)
+        for phase in self.script:
+            if elapsed < phase['duration']:
+                break
+            elapsed -= phase['duration']
+        return {**self.settings, **{k: v for k, v in phase.items() if k in FAULT_SETTINGS}}
+
+    def chance(self, fault):
+        """Roll the dice for a probabilistic fault, counting hits"""
+        if random.random() < self.current()[fault]:
+            self.counts[fault] += 1
+            return True
+        return False
+
+    def in_outage(self):
+        """True during the last outage_duration seconds of every outage_every period"""
+        settings = self.current()
+        every = settings['outage_every']
+        if not every:
+            return False
+        return (time.monotonic() - self.started) % every >= every - settings['outage_duration']
+
+    async def delay(self):
+        """Simulate the unit's response time"""
+        settings = self.current()
+        latency = settings['latency'] + random.uniform(-settings['jitter'], settings['jitter'])
+        if latency > 0:
+            await asyncio.sleep(latency)
+
+
+class VirtualUnit:
+    """State and protocol handling for one emulated air conditioner"""
+
+    def __init__(self, number, ip, port, faults):
+        self.number = number
+        self.id = f"emulator-{number}"
+        self.ip = ip
+        self.port = port
+        self.device_id = BASE_DEVICE_ID + number
+        self.token, self.key = unit_credentials(number)
+        self.faults = faults
+        self.writers = set()
+
+        # Device state
+        self.running = False
+        self.mode = 2  # cool
+        self.target_temperature = 22.0
+        self.fan_speed = 102  # auto
+        self.swing = 0  # low nibble: 0xC vertical, 0x3 horizontal
+        self.eco = False
+        self.turbo = False
+        self.fahrenheit = False
+        self.indoor_temperature = 24.5
+        self.outdoor_temperature = 18.0
+
+        # Counters
+        self.connections = 0
+        self.handshakes = 0
+        self.queries = 0
+        self.commands = 0
+
+    def config(self):
+        """Registry entry in the devices.json format used by the API servers"""
+        return {
+            'id': self.id,
+            'name': f"Emulated AC {self.number}",
+            'ip': self.ip,
+            'device_id': self.device_id,
+            'token': self.token,
+            'key': self.key,
+        }
+
+    def disconnect_all(self):
+        """Abort every open connection, as a WiFi drop would"""
+        for writer in list(self.writers):
+            writer.transport.abort()
+
+    def status_frame(self, frame_type):
+        """Current state as a 0xC0 status response"""
+        target = self.target_temperature
+        body = bytearray(23)
+        body[0] = 0xC0
+        body[1] = 0x01 if self.running else 0x00
+        body[2] = (self.mode & 0x7) << 5 | (int(target) - 16) & 0xF | (0x10 if target % 1 else 0)
+        body[3] = self.fan_speed & 0x7F
+        body[7] = self.swing & 0xF
+        body[8] = 0x20 if self.turbo else 0
+        body[9] = 0x10 if self.eco else 0
+        body[10] = (0x02 if self.turbo else 0) | (0x04 if self.fahrenheit else 0)
+        body[11] = encode_temperature(self.indoor_temperature)
+        body[12] = encode_temperature(self.outdoor_temperature)
+        return build_frame(frame_type, body)
+
+    def apply_command(self, body):
+        """Update the state from a 0x40 set command body"""
+        self.running = bool(body[1] & 0x01)
+        self.mode = (body[2] >> 5) & 0x7
+        target = (body[2] & 0xF) + 16
+        if len(body) > 18 and body[18] & 0x1F:
+            target = (body[18] & 0x1F) + 12  # Alternate encoding for 16 and 31
+        self.target_temperature = target + (0.5 if body[2] & 0x10 else 0.0)
+        self.fan_speed = body[3] & 0x7F
+        self.swing = body[7] & 0xF
+        self.turbo = bool(body[8] & 0x20 or body[10] & 0x02)
+        self.eco = bool(body[9] & 0x80)
+        self.fahrenheit = bool(body[10] & 0x04)
+
+    def handle_frame(self, frame):
+        """Answer one decrypted AA frame, or return None to stay silent"""
+        if len(frame) < 12 or frame[0] != 0xAA:
+            return None
+        frame_type, body = frame[9], frame[10:-2]
+
+        if body[0] == 0x41:
+            self.queries += 1
+            return self.status_frame(frame_type)
+        if body[0] == 0x40:
+            self.commands += 1
+            self.apply_command(body)
+            return self.status_frame(frame_type)
+        if body[0] == 0xB5:
+            return build_frame(frame_type, bytes([0xB5, 0x00]))
+
+        print(f"[{self.id}] Ignoring unsupported command 0x{body[0]:02X}")
+        return None
+
+    def discovery_reply(self):
+        """Encrypted V3 discovery response describing this unit"""
+        ssid = f"net_ac_{self.number & 0xFFFF:04X}".encode()
+        mac = bytes([0x02, 0x00, 0x00, 0x00, (self.number >> 8) & 0xFF, self.number & 0xFF])
+
+        reply = bytearray()
+        reply += ipaddress.IPv4Address(self.ip).packed[::-1]
+        reply += self.port.to_bytes(4, 'little')
+        reply += f"EMULATOR{self.number:024d}".encode()
+        reply += bytes([len(ssid)]) + ssid
+
+        extra = bytearray(94 - 41)  # Fields at fixed offsets after the SSID
+        extra[55 - 41] = APPLIANCE_TYPE_AC
+        extra[63 - 41:69 - 41] = mac
+        extra[69 - 41:72 - 41] = b'\x00\x00\x03'  # Protocol version
+        extra[72 - 41:75 - 41] = b'\x03\x00\x08'  # Firmware 3.0.8
+        reply += extra
+
+        inner = bytearray(40)
+        inner[0:4] = b'\x5a\x5a\x01\x11'
+        inner[20:26] = self.device_id.to_bytes(6, 'little')
+        inner += security.aes_encrypt(bytes(reply))
+        inner[4:6] = (len(inner) + 16).to_bytes(2, 'little')
+        inner += security.md5fingerprint(bytes(inner))
+
+        outer = b'\x83\x70' + (len(inner) + 16).to_bytes(2, 'big') + b'\x20\x00\x00\x00'
+        return outer + bytes(inner) + hashlib.md5(bytes(inner)).digest()
+
+    async def handle_connection(self, reader, writer):
+        """Serve one TCP client: handshake, then encrypted commands"""
+        self.connections += 1
+        self.writers.add(writer)
+        faults = self.faults
+        tcp_key = None
+        count = 0
+        buffer = b''
+
+        try:
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                packets, buffer = decode_8370(buffer + data, tcp_key)
+
+                for msgtype, _, payload in packets:
+                    await faults.delay()
+                    if faults.in_outage() or faults.chance('timeout'):
+                        continue
+
+                    if msgtype == MSGTYPE_HANDSHAKE_REQUEST:
+                        if faults.chance('drop_handshake'):
+                            writer.transport.abort()
+                            return
+                        if payload != bytes.fromhex(self.token):
+                            writer.write(encode_8370(b'ERROR', MSGTYPE_ERROR, count))
+                            count += 1
+                            continue
+                        key = bytes.fromhex(self.key)
+                        plain = os.urandom(32)
+                        response = security.aes_cbc_encrypt(plain, key) + hashlib.sha256(plain).digest()
+                        tcp_key = strxor(plain, key)
+                        self.handshakes += 1
+                        writer.write(encode_8370(response, MSGTYPE_HANDSHAKE_RESPONSE, count))
+                        count += 1
+
+                    elif msgtype == MSGTYPE_ENCRYPTED_REQUEST:
+                        if payload[:2] != b'\x5a\x5a':
+                            continue
+                        frame = security.aes_decrypt(payload[40:-16])
+                        reply = self.handle_frame(frame)
+                        if reply is not None:
+                            packet = encode_8370(lan_packet(self.device_id, reply),
+                                                 MSGTYPE_ENCRYPTED_RESPONSE, count, tcp_key)
+                            if faults.chance('corrupt'):
+                                # Last byte of the signature
+                                packet = packet[:-1] + bytes([packet[-1] ^ 0xFF])
+                            writer.write(packet)
+                            count += 1
+
+                await writer.drain()
+        except (ConnectionError, ValueError) as e:
+            print(f"[{self.id}] Dropping connection: {e}")
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+
+class DiscoveryProtocol(asyncio.DatagramProtocol):
+    """Answers UDP discovery probes for one unit"""
+
+    def __init__(self, unit):
+        self.unit = unit
+        self.transport = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+
+    def datagram_received(self, data, addr):
+        if data[:2] in (b'\x5a\x5a', b'\x83\x70'):
+            asyncio.ensure_future(self.reply(addr))
+
+    async def reply(self, addr):
+        await self.unit.faults.delay()
+        if self.unit.faults.in_outage():
+            return
+        self.transport.sendto(self.unit.discovery_reply(), addr)
+
+
+async def start_unit(unit):
+    """Bind the TCP and discovery sockets for one unit"""
+    loop = asyncio.get_running_loop()
+    server = await asyncio.start_server(unit.handle_connection, unit.ip, unit.port)
+    for port in DISCOVERY_PORTS:
+        await loop.create_datagram_endpoint(lambda: DiscoveryProtocol(unit), local_addr=(unit.ip, port))
+    return server
+
+async def simulate_outages(units, faults):
+    """Drop every connection when an outage starts"""
+    was_out = False
+    while True:
+        out = faults.in_outage()
+        if out and not was_out:
+            faults.counts['outages'] += 1
+            print(f"Simulating WiFi drop for {faults.current()['outage_duration']:.0f}s")
+            for unit in units:
+                unit.disconnect_all()
+        elif was_out and not out:
+            print("WiFi restored")
+        was_out = out
+        await asyncio.sleep(0.1)
+
+def load_fault_script(path):
+    """Load a JSON list of timed fault phases"""
+    with open(path) as f:
+        script = json.load(f)
+    if not isinstance(script, list) or not all(p.get('duration', 0) > 0 for p in script):
+        raise ValueError("Fault script must be a list of phases, each with a positive 'duration'")
+    return script
+
+def write_devices(units, path):
+    """Write a devices.json registry for the API servers"""
+    with open(path, 'w') as f:
+        json.dump([u.config() for u in units], f, indent=2)
+    print(f"Wrote device registry to {path}")
+
+def write_env(unit, path):
+    """Write a .env for scripts that talk to a single unit"""
+    with open(path, 'w') as f:
+        f.write("# Generated by device_emulator.py\n")
+        f.write(f"SENVILLE_IP={unit.ip}\n")
+        f.write(f"SENVILLE_DEVICE_ID={unit.device_id}\n")
+        f.write(f"SENVILLE_TOKEN={unit.token}\n")
+        f.write(f"SENVILLE_KEY={unit.key}\n")
+    print(f"Wrote .env for {unit.id} to {path}")
+
+async def run(args):
+    script = None
+    if args.fault_script:
+        try:
+            script = load_fault_script(args.fault_script)
+        except (OSError, ValueError) as e:
+            print(f"Error loading fault script: {e}")
+            sys.exit(1)
+    faults = FaultInjector({name: getattr(args, name) for name in FAULT_SETTINGS}, script)
+
+    first = ipaddress.IPv4Address(args.host)
+    units = [VirtualUnit(n, str(first + n), args.port, faults) for n in range(args.count)]
+
+    try:
+        servers = [await start_unit(u) for u in units]
+    except OSError as e:
+        print(f"Error: {e}")
+        print("Loopback aliases other than 127.0.0.1 may need to be added first on non-Linux systems")
+        sys.exit(1)
+
+    if args.write_devices:
+        write_devices(units, args.write_devices)
+    if args.write_env:
+        write_env(units[0], args.write_env)
+
+    print("=" * 60)
+    print("Senville V3 Device Emulator")
+    print("=" * 60)
+    print(f"{len(units)} unit(s), latency {args.latency * 1000:.0f}ms +/- {args.jitter * 1000:.0f}ms")
+    print(f"Faults: drop_handshake={args.drop_handshake} timeout={args.timeout} corrupt={args.corrupt}", end='')
+    if args.outage_every:
+        print(f" outage={args.outage_duration:.0f}s every {args.outage_every:.0f}s", end='')
+    if script:
+        print(f" script={args.fault_script} ({len(script)} phases)", end='')
+    print("\n")
+    for unit in units[:10]:
+        print(f"  {unit.id:<16} {unit.ip}:{unit.port}  device_id={unit.device_id}")
+    if len(units) > 10:
+        print(f"  ... {len(units) - 10} more")
+    print("\nPress Ctrl+C to stop")
+    print("=" * 60)
+
+    outages = asyncio.ensure_future(simulate_outages(units, faults))
+    try:
+        while True:
+            await asyncio.sleep(args.stats_interval)
+            print(f"connections={sum(u.connections for u in units)} "
+                  f"handshakes={sum(u.handshakes for u in units)} "
+                  f"queries={sum(u.queries for u in units)} "
+                  f"commands={sum(u.commands for u in units)} "
+                  + " ".join(f"{name}={n}" for name, n in faults.counts.items()))
+    finally:
+        outages.cancel()
+        for server in servers:
+            server.close()
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Emulate Senville/Midea V3 air conditioners on localhost'
+    )
+    parser.add_argument(
+        '--count',
+        type=int,
+        default=1,
+        help='Number of virtual units (default: 1)'
+    )
+    parser.add_argument(
+        '--host',
+        default='127.0.0.10',
+        help='Address of the first unit; later units count up from it (default: 127.0.0.10)'
+    )
+    parser.add_argument(
+        '--port',
+        type=int,
+        default=6444,
+        help='TCP port for every unit (default: 6444)'
+    )
+    parser.add_argument(
+        '--latency',
+        type=float,
+        default=0.05,
+        help='Response latency in seconds (default: 0.05)'
+    )
+    parser.add_argument(
+        '--jitter',
+        type=float,
+        default=0.0,
+        help='Random +/- variation added to the latency in seconds (default: 0)'
+    )
+    parser.add_argument(
+        '--drop-handshake',
+        type=float,
+        default=0.0,
+        metavar='P',
+        help='Probability of closing the connection instead of answering a handshake'
+    )
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=0.0,
+        metavar='P',
+        help='Probability of silently ignoring a request'
+    )
+    parser.add_argument(
+        '--corrupt',
+        type=float,
+        default=0.0,
+        metavar='P',
+        help='Probability of answering with a corrupted packet signature'
+    )
+    parser.add_argument(
+        '--outage-every',
+        type=float,
+        default=0,
+        metavar='SECONDS',
+        help='Simulate a WiFi drop once per this many seconds (default: off)'
+    )
+    parser.add_argument(
+        '--outage-duration',
+        type=float,
+        default=15,
+        metavar='SECONDS',
+        help='Length of each simulated WiFi drop (default: 15)'
+    )
+    parser.add_argument(
+        '--fault-script',
+        metavar='PATH',
+        help='JSON list of timed fault phases, e.g. [{"duration": 60, "timeout": 0.2}]'
+    )
+    parser.add_argument(
+        '--write-devices',
+        metavar='PATH',
+        help='Write a devices.json registry for api_server.py'
+    )
+    parser.add_argument(
+        '--write-env',
+        metavar='PATH',
+        help='Write a .env pointing at the first unit'
+    )
+    parser.add_argument(
+        '--stats-interval',
+        type=float,
+        default=30,
+        help='Seconds between request counter printouts (default: 30)'
+    )
+
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(run(args))
+    except KeyboardInterrupt:
+        print("\nEmulator stopped")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+Senville API Fault Report
+
+Drives the REST API with a mix of status reads and control writes and
+reports success rate and latency as seen by API clients. Run it against
+device_emulator.py with faults enabled to measure how the server's retry,
+session and circuit breaker logic hold up when the unit misbehaves.
+
+Reads use max_age=0 so every request goes to the device instead of the
+poller's cached snapshot.
+
+Usage:
+    # Terminal 1: emulated unit with 10% silent timeouts and WiFi drops
+    python3 device_emulator.py --timeout 0.1 --outage-every 120 \\
+        --write-devices /tmp/emulator/devices.json
+
+    # Terminal 2: API server pointed at the emulator
+    SENVILLE_DEVICES_FILE=/tmp/emulator/devices.json python3 api_server.py
+
+    # Terminal 3: 5 minute run, 20% writes, JSON results saved
+    python3 fault_report.py --duration 300 --write-ratio 0.2 --output report.json
+"""
+
+import sys
+import json
+import time
+import random
+import argparse
+import threading
+from collections import Counter
+from api_client import percentile, api_request
+
+class FaultRun:
+    """Runs request workers until the deadline and collects the results"""
+
+    def __init__(self, base_url, write_ratio, timeout):
+        self.base_url = base_url
+        self.write_ratio = write_ratio
+        self.timeout = timeout
+        self.results = []  # (kind, ok, seconds, error)
+        self.lock = threading.Lock()
+
+    def one_request(self):
+        """Issue one read or write and record the outcome"""
+        if random.random() < self.write_ratio:
+            kind, method = 'write', 'POST'
+            url = f"{self.base_url}/control"
+            payload = {'temperature': random.randint(20, 25)}
+        else:
+            kind, method = 'read', 'GET'
+            url = f"{self.base_url}/status?max_age=0"
+            payload = None
+
+        start = time.monotonic()
+        error = None
+        try:
+            status, body = api_request(method, url, payload, self.timeout)
+            if status != 200 or not body.get('success'):
+                error = f"HTTP {status}: {body.get('error', 'no error message')}"
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        elapsed = time.monotonic() - start
+
+        with self.lock:
+            self.results.append((kind, error is None, elapsed, error))
+
+    def worker(self, deadline, max_requests, pause):
+        while time.monotonic() < deadline:
+            with self.lock:
+                if max_requests and len(self.results) >= max_requests:
+                    return
+            self.one_request()
+            if pause:
+                time.sleep(pause)
+
+    def run(self, duration, concurrency, max_requests=None, pause=0):
+        deadline = time.monotonic() + duration
+        workers = [threading.Thread(target=self.worker, args=(deadline, max_requests, pause), daemon=True)
+                   for _ in range(concurrency)]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+
+def summarize(results):
+    """Success rate and latency percentiles for a list of results"""
+    latencies = [r[2] for r in results]
+    ok_latencies = [r[2] for r in results if r[1]]
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 1)
+
+    return {
+        'requests': len(results),
+        'succeeded': len(ok_latencies),
+        'success_rate': round(len(ok_latencies) / len(results) * 100, 2) if results else None,
+        'p50_ms': ms(percentile(latencies, 50)),
+        'p90_ms': ms(percentile(latencies, 90)),
+        'p99_ms': ms(percentile(latencies, 99)),
+        'max_ms': ms(max(latencies)) if latencies else None,
+        'ok_p50_ms': ms(percentile(ok_latencies, 50)),
+        'ok_p99_ms': ms(percentile(ok_latencies, 99)),
+    }
+
+def print_summary(label, summary):
+    if not summary['requests']:
+        print(f"{label:<8} no requests")
+        return
+    print(f"{label:<8} {summary['requests']:>6} requests  "
+          f"{summary['success_rate']:>6.2f}% ok  "
+          f"p50 {summary['p50_ms']:>8.1f}ms  "
+          f"p90 {summary['p90_ms']:>8.1f}ms  "
+          f"p99 {summary['p99_ms']:>8.1f}ms  "
+          f"max {summary['max_ms']:>8.1f}ms")
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Measure API success rate and latency while the device misbehaves'
+    )
+    parser.add_argument(
+        '--url',
+        default='http://localhost:5000',
+        help='API server base URL (default: http://localhost:5000)'
+    )
+    parser.add_argument(
+        '--device',
+        help='Device ID to target (default: the first configured device)'
+    )
+    parser.add_argument(
+        '--duration',
+        type=float,
+        default=60,
+        help='Run time in seconds (default: 60)'
+    )
+    parser.add_argument(
+        '--requests',
+        type=int,
+        help='Stop after this many requests'
+    )
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=1,
+        help='Number of parallel clients (default: 1)'
+    )
+    parser.add_argument(
+        '--write-ratio',
+        type=float,
+        default=0.2,
+        help='Fraction of requests that are /api/control writes (default: 0.2)'
+    )
+    parser.add_argument(
+        '--pause',
+        type=float,
+        default=0.5,
+        help='Seconds each client waits between requests (default: 0.5)'
+    )
+    parser.add_argument(
+        '--timeout',
+        type=float,
+        default=30,
+        help='Client-side request timeout in seconds (default: 30)'
+    )
+    parser.add_argument(
+        '--output',
+        metavar='PATH',
+        help='Also write the report as JSON'
+    )
+
+    args = parser.parse_args()
+
+    api = args.url.rstrip('/') + '/api'
+    base_url = f"{api}/devices/{args.device}" if args.device else api
+
+    try:
+        api_request('GET', f"{api}/devices", timeout=args.timeout)
+    except Exception as e:
+        print(f"Error: API server not reachable at {args.url}: {e}")
+        sys.exit(1)
+
+    print(f"Running for {args.duration:.0f}s against {base_url} "
+          f"({args.concurrency} client(s), {args.write_ratio:.0%} writes)...")
+
+    fault_run = FaultRun(base_url, args.write_ratio, args.timeout)
+    started = time.monotonic()
+    try:
+        fault_run.run(args.duration, args.concurrency, args.requests, args.pause)
+    except KeyboardInterrupt:
+        print("\nInterrupted, reporting partial results")
+    elapsed = time.monotonic() - started
+
+    results = list(fault_run.results)
+    report = {
+        'duration_s': round(elapsed, 1),
+        'all': summarize(results),
+        'read': summarize([r for r in results if r[0] == 'read']),
+        'write': summarize([r for r in results if r[0] == 'write']),
+        'errors': dict(Counter(r[3] for r in results if r[3]).most_common()),
+    }
+
+    # Breaker state is included even in 503 responses
+    try:
+        _, body = api_request('GET', f"{base_url}/status", timeout=args.timeout)
+        report['breaker'] = body.get('breaker')
+    except Exception:
+        report['breaker'] = None
+
+    print()
+    print("=" * 60)
+    print(f"Fault Report ({report['duration_s']}s)")
+    print("=" * 60)
+    print_summary('all', report['all'])
+    print_summary('read', report['read'])
+    print_summary('write', report['write'])
+    if report['errors']:
+        print("\nErrors:")
+        for error, count in list(report['errors'].items())[:10]:
+            print(f"  {count:>6}  {error}")
+    if report['breaker']:
+        print(f"\nCircuit breaker: {report['breaker']}")
+    print("=" * 60)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.output}")
+
+if __name__ == '__main__':
+    main()
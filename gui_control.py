@@ -18,7 +18,8 @@ sys.path.insert(0, str(Path(__file__).parent))
 
 # Import check moved to after potential venv activation
 # These imports will fail with clear error if libraries missing
-from midea_beautiful import appliance_state
+from broker_client import connect_device
+from shared_state import StateSnapshot, read_snapshot
 from dotenv import load_dotenv
 
 
@@ -37,6 +38,8 @@ class SenvilleGUI:
         # State variables
         self.device = None
         self.current_state = None
+        self.displayed = None  # (snapshot, temperature unit) currently shown
+        self.last_write = 0  # Snapshots older than our own last write are ignored
         self.auto_refresh = tk.BooleanVar(value=True)
         self.refresh_interval = 5  # seconds
         self.refresh_thread = None
@@ -328,11 +331,7 @@ class SenvilleGUI:
         """Get or create device connection"""
         try:
             if self.device is None:
-                self.device = appliance_state(
-                    address=self.ip,
-                    token=self.token,
-                    key=self.key
-                )
+                self.device = connect_device(self.ip, self.token, self.key)
             return self.device
         except Exception as e:
             messagebox.showerror("Connection Error", f"Failed to connect to device:\n{str(e)}")
@@ -344,9 +343,16 @@ class SenvilleGUI:
 
         def refresh_thread():
             try:
-                device = self.get_device()
-                if device:
-                    state = device.state
+                # State published by the API server or broker, if recent enough
+                state = read_snapshot(self.ip, max_age=self.refresh_interval)
+                if state is not None and time.time() - state.age < self.last_write:
+                    state = None
+                if state is None:
+                    device = self.get_device()
+                    if device:
+                        device.refresh()
+                        state = StateSnapshot.from_state(device.state)
+                if state is not None:
                     self.current_state = state
 
                     # Update UI in main thread
@@ -356,9 +362,21 @@ class SenvilleGUI:
 
         threading.Thread(target=refresh_thread, daemon=True).start()
 
+    def show_applied_state(self, device):
+        """Display the state a successful apply() left on the device, without reading it back"""
+        state = StateSnapshot.from_state(device.state)
+        self.current_state = state
+        self.root.after(0, self.update_status_display, state)
+
     def update_status_display(self, state):
-        """Update status display with device state"""
+        """Update status display with device state (a StateSnapshot)"""
         try:
+            if self.displayed == (state, self.temp_unit.get()):
+                # Nothing changed since the last refresh
+                self.last_updated_label.config(text=datetime.now().strftime("%H:%M:%S"))
+                self.update_status_bar("Status updated")
+                return
+
             # Power
             power_text = "ON" if state.running else "OFF"
             self.status_labels['power'].config(
@@ -381,8 +399,8 @@ class SenvilleGUI:
             indoor_temp = state.indoor_temperature
 
             if self.temp_unit.get() == "F":
-                target_temp = int(target_temp * 9 / 5 + 32)
-                indoor_temp = int(indoor_temp * 9 / 5 + 32)
+                target_temp = int(state.target_temperature_f)
+                indoor_temp = int(state.indoor_temperature_f)
                 unit = "°F"
             else:
                 unit = "°C"
@@ -420,6 +438,7 @@ class SenvilleGUI:
             # Last updated
             now = datetime.now().strftime("%H:%M:%S")
             self.last_updated_label.config(text=now)
+            self.displayed = (state, self.temp_unit.get())
 
             self.update_status_bar("Status updated")
 
@@ -440,7 +459,8 @@ class SenvilleGUI:
                 if device:
                     device.state.running = power_on
                     device.apply()
-                    self.root.after(1000, self.refresh_status)
+                    self.last_write = time.time()
+                    self.show_applied_state(device)
                     self.root.after(0, self.update_status_bar,
                                   f"Power {'ON' if power_on else 'OFF'}")
             except Exception as e:
@@ -463,7 +483,8 @@ class SenvilleGUI:
                 if device:
                     device.state.mode = mode_num
                     device.apply()
-                    self.root.after(1000, self.refresh_status)
+                    self.last_write = time.time()
+                    self.show_applied_state(device)
                     self.root.after(0, self.update_status_bar, f"Mode set to {mode}")
             except Exception as e:
                 self.root.after(0, messagebox.showerror, "Error",
@@ -487,7 +508,8 @@ class SenvilleGUI:
                 if device:
                     device.state.target_temperature = temp_c
                     device.apply()
-                    self.root.after(1000, self.refresh_status)
+                    self.last_write = time.time()
+                    self.show_applied_state(device)
                     self.root.after(0, self.update_status_bar,
                                   f"Temperature set to {temp}°{unit}")
             except Exception as e:
@@ -513,7 +535,8 @@ class SenvilleGUI:
                 if device:
                     device.state.fan_speed = fan_speed
                     device.apply()
-                    self.root.after(1000, self.refresh_status)
+                    self.last_write = time.time()
+                    self.show_applied_state(device)
                     self.root.after(0, self.update_status_bar, f"Fan speed set to {fan}")
             except Exception as e:
                 self.root.after(0, messagebox.showerror, "Error",
@@ -531,7 +554,8 @@ class SenvilleGUI:
                 if device:
                     device.state.vertical_swing = enabled
                     device.apply()
-                    self.root.after(1000, self.refresh_status)
+                    self.last_write = time.time()
+                    self.show_applied_state(device)
                     self.root.after(0, self.update_status_bar,
                                   f"Vertical swing {'enabled' if enabled else 'disabled'}")
             except Exception as e:
@@ -550,7 +574,8 @@ class SenvilleGUI:
                 if device:
                     device.state.horizontal_swing = enabled
                     device.apply()
-                    self.root.after(1000, self.refresh_status)
+                    self.last_write = time.time()
+                    self.show_applied_state(device)
                     self.root.after(0, self.update_status_bar,
                                   f"Horizontal swing {'enabled' if enabled else 'disabled'}")
             except Exception as e:
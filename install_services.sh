@@ -12,6 +12,12 @@ fi
 
 SCRIPT_DIR="$(cd "$(dirname "$0")" && pwd)"
 
+# Install device broker service
+echo "Installing device broker service..."
+cp "$SCRIPT_DIR/senville-broker.service" /etc/systemd/system/
+systemctl daemon-reload
+systemctl enable senville-broker.service
+
 # Install API server service
 echo "Installing API server service..."
 cp "$SCRIPT_DIR/senville-api.service" /etc/systemd/system/
@@ -28,14 +34,17 @@ echo ""
 echo "Installation complete!"
 echo ""
 echo "To start the services:"
+echo "  sudo systemctl start senville-broker"
 echo "  sudo systemctl start senville-api"
 echo "  sudo systemctl start senville-scheduler"
 echo ""
 echo "To check status:"
+echo "  sudo systemctl status senville-broker"
 echo "  sudo systemctl status senville-api"
 echo "  sudo systemctl status senville-scheduler"
 echo ""
 echo "To view logs:"
+echo "  sudo journalctl -u senville-broker -f"
 echo "  sudo journalctl -u senville-api -f"
 echo "  sudo journalctl -u senville-scheduler -f"
 echo ""
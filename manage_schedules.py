@@ -8,37 +8,15 @@ Usage:
     python3 manage_schedules.py delete <id>
 """
 
-import json
 import argparse
-import os
 from datetime import datetime
+from schedule_store import ScheduleStore
 
-SCHEDULE_FILE = os.path.join(os.path.dirname(__file__), 'schedules.json')
-
-def load_schedules():
-    """Load schedules from JSON file"""
-    if not os.path.exists(SCHEDULE_FILE):
-        return []
-    try:
-        with open(SCHEDULE_FILE, 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Error loading schedules: {e}")
-        return []
-
-def save_schedules(schedules):
-    """Save schedules to JSON file"""
-    try:
-        with open(SCHEDULE_FILE, 'w') as f:
-            json.dump(schedules, f, indent=2)
-        return True
-    except Exception as e:
-        print(f"Error saving schedules: {e}")
-        return False
+store = ScheduleStore()
 
 def list_schedules():
     """List all schedules"""
-    schedules = load_schedules()
+    schedules = store.load()
 
     if not schedules:
         print("No schedules found")
@@ -76,11 +54,6 @@ def list_schedules():
 
 def add_schedule(name, time, days, power, mode, temp, temp_f, fan_speed):
     """Add a new schedule"""
-    schedules = load_schedules()
-
-    # Generate ID
-    schedule_id = max([s.get('id', 0) for s in schedules], default=0) + 1
-
     # Build action
     action = {}
     if power is not None:
@@ -100,54 +73,35 @@ def add_schedule(name, time, days, power, mode, temp, temp_f, fan_speed):
         print("Error: No actions specified")
         return False
 
-    schedule = {
-        'id': schedule_id,
+    schedule = store.create({
         'name': name,
         'time': time,
         'days': days if days else [],
         'action': action,
         'enabled': True,
         'created_at': datetime.now().isoformat(),
-        'last_run': None
-    }
-
-    schedules.append(schedule)
-    if save_schedules(schedules):
-        print(f"Schedule created successfully (ID: {schedule_id})")
-        return True
-    return False
+    })
+    print(f"Schedule created successfully (ID: {schedule['id']})")
+    return True
 
 def delete_schedule(schedule_id):
     """Delete a schedule"""
-    schedules = load_schedules()
-    original_count = len(schedules)
-
-    schedules = [s for s in schedules if s['id'] != schedule_id]
-
-    if len(schedules) == original_count:
+    if not store.delete(schedule_id):
         print(f"Schedule {schedule_id} not found")
         return False
 
-    if save_schedules(schedules):
-        print(f"Schedule {schedule_id} deleted")
-        return True
-    return False
+    print(f"Schedule {schedule_id} deleted")
+    return True
 
 def enable_schedule(schedule_id, enabled=True):
     """Enable or disable a schedule"""
-    schedules = load_schedules()
+    if not store.update(schedule_id, {'enabled': enabled}):
+        print(f"Schedule {schedule_id} not found")
+        return False
 
-    for s in schedules:
-        if s['id'] == schedule_id:
-            s['enabled'] = enabled
-            if save_schedules(schedules):
-                status = "enabled" if enabled else "disabled"
-                print(f"Schedule {schedule_id} {status}")
-                return True
-            return False
-
-    print(f"Schedule {schedule_id} not found")
-    return False
+    status = "enabled" if enabled else "disabled"
+    print(f"Schedule {schedule_id} {status}")
+    return True
 
 def main():
     parser = argparse.ArgumentParser(
@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+"""
+Senville Schedule Run Journal
+
+scheduler.py appends one JSON line per schedule execution (intended
+action, the fields actually sent, latency, retries and any error) to
+schedule_runs.jsonl. The file is never rewritten: once it would grow past
+JOURNAL_MAX_BYTES it is renamed to schedule_runs.jsonl.1 (older segments
+shift up to .JOURNAL_BACKUPS, the oldest is dropped) and a new one started.
+
+Readers index records by schedule ID. Rotated segments never change, so
+each is scanned once; the active one is scanned only from where the last
+scan stopped.
+
+Usage:
+    python3 run_journal.py                    # Latest runs of all schedules
+    python3 run_journal.py --schedule 3 --limit 5
+
+Environment:
+    SENVILLE_RUNS_FILE  Journal file (default: schedule_runs.jsonl next to
+                        the scripts)
+"""
+
+import os
+import json
+import argparse
+import threading
+
+RUNS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schedule_runs.jsonl')
+JOURNAL_MAX_BYTES = 1024 * 1024  # Rotate the active file past this size
+JOURNAL_BACKUPS = 5              # Rotated segments kept
+
+class RunJournal:
+    """Append-only, size-rotated log of schedule runs with a per-schedule index"""
+
+    def __init__(self, path=None, max_bytes=JOURNAL_MAX_BYTES, backups=JOURNAL_BACKUPS):
+        self._path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._segments = {}     # (inode, first line) -> {'scanned': bytes indexed, 'runs': [offset], 'by_schedule': {id: [offset]}}
+        self.lock = threading.Lock()
+
+    @property
+    def path(self):
+        # Resolved on each use: scripts load .env after creating their journal
+        return self._path or os.getenv('SENVILLE_RUNS_FILE', RUNS_FILE)
+
+    def _segment_paths(self):
+        """Oldest segment first, the active file last"""
+        path = self.path
+        return [f"{path}.{n}" for n in range(self.backups, 0, -1)] + [path]
+
+    def _rotate(self):
+        path = self.path
+        for n in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{path}.{n}"):
+                os.replace(f"{path}.{n}", f"{path}.{n + 1}")
+        if self.backups:
+            os.replace(path, f"{path}.1")
+        else:
+            os.unlink(path)
+
+    def append(self, run):
+        """Write one run record; returns False if it couldn't be written"""
+        line = (json.dumps(run, separators=(',', ':')) + '\n').encode()
+        with self.lock:
+            try:
+                try:
+                    size = os.path.getsize(self.path)
+                except FileNotFoundError:
+                    size = 0
+                if size and size + len(line) > self.max_bytes:
+                    self._rotate()
+                with open(self.path, 'ab') as f:
+                    f.write(line)
+                return True
+            except OSError as e:
+                print(f"Error writing run journal: {e}")
+                return False
+
+    def _index(self, handles):
+        """[(file, segment)] for the segments on disk, oldest first, scanning any new records"""
+        segments = []
+        seen = {}
+        for path in self._segment_paths():
+            try:
+                f = open(path, 'rb')
+            except FileNotFoundError:
+                continue
+            # Read through this handle: a rotation can rename the path meanwhile
+            handles.append(f)
+            # Inodes of dropped segments get reused, so the first record is part of the key
+            key = (os.fstat(f.fileno()).st_ino, f.readline())
+            segment = self._segments.get(key) or {'scanned': 0, 'runs': [], 'by_schedule': {}}
+            f.seek(segment['scanned'])
+            offset = segment['scanned']
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # Record still being written
+                try:
+                    schedule_id = json.loads(line).get('schedule_id')
+                    segment['runs'].append(offset)
+                    segment['by_schedule'].setdefault(schedule_id, []).append(offset)
+                except ValueError:
+                    pass
+                offset += len(line)
+            segment['scanned'] = offset
+            seen[key] = segment
+            segments.append((f, segment))
+        # Forget segments that rotated away
+        self._segments = seen
+        return segments
+
+    def runs(self, schedule_id=None, offset=0, limit=50):
+        """(runs newest first, total) for one schedule, or all schedules if schedule_id is None"""
+        handles = []
+        with self.lock:
+            try:
+                matches = []
+                for f, segment in self._index(handles):
+                    positions = segment['runs'] if schedule_id is None else segment['by_schedule'].get(schedule_id, [])
+                    matches.extend((f, position) for position in positions)
+                total = len(matches)
+
+                runs = []
+                for f, position in matches[::-1][offset:offset + limit]:
+                    f.seek(position)
+                    runs.append(json.loads(f.readline()))
+                return runs, total
+            finally:
+                for f in handles:
+                    f.close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Show schedule runs from the journal')
+    parser.add_argument('--schedule', type=int, help='Only runs of this schedule ID')
+    parser.add_argument('--limit', type=int, default=20, help='Runs to show (default: 20)')
+    args = parser.parse_args()
+
+    journal = RunJournal()
+    runs, total = journal.runs(args.schedule, 0, args.limit)
+    print(f"{total} run(s) in {journal.path}\n")
+    for run in runs:
+        outcome = run['result'] if not run.get('error') else f"{run['result']}: {run['error']}"
+        print(f"{run['started']}  #{run['schedule_id']} {run['name']:<20} {outcome}  "
+              f"{run['latency_ms']}ms  retries {run['retries']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,261 @@
+#!/usr/bin/env python3
+"""
+Senville Schedule Store
+
+Schedules live in a SQLite database in WAL mode, shared by api_server.py,
+scheduler.py and manage_schedules.py. Every change is a single-row
+transaction, so concurrent writers can't lose each other's updates or
+leave a truncated file, and new IDs come from SQLite instead of max()+1.
+
+The first time a database is opened, schedules.json is imported and
+renamed to schedules.json.migrated.
+
+Readers keep a parsed copy in memory: load() re-queries only after
+PRAGMA data_version reports a commit from another connection, or after a
+change made through this store.
+
+Usage:
+    python3 schedule_store.py            # Migrate (if needed) and list schedules
+    python3 schedule_store.py --json     # Dump schedules as JSON, e.g. for backups
+
+Environment:
+    SENVILLE_SCHEDULES_DB    Database (default: the schedule file with a .db
+                             extension, i.e. schedules.db next to the scripts)
+    SENVILLE_SCHEDULES_FILE  JSON file to migrate from (default: schedules.json)
+"""
+
+import os
+import sys
+import json
+import sqlite3
+import contextlib
+import argparse
+import threading
+
+SCHEDULE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'schedules.json')
+BUSY_TIMEOUT = 5000  # Milliseconds to wait for another process's write to finish
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS schedules (
+    id          INTEGER PRIMARY KEY AUTOINCREMENT,
+    name        TEXT NOT NULL,
+    time        TEXT NOT NULL,
+    days        TEXT NOT NULL DEFAULT '[]',
+    action      TEXT NOT NULL,
+    enabled     INTEGER NOT NULL DEFAULT 1,
+    created_at  TEXT,
+    last_run    TEXT
+);
+CREATE INDEX IF NOT EXISTS schedules_enabled_time ON schedules (enabled, time);
+-- Weekday lookup for SQL queries; schedules.days stays the list the tools use
+CREATE TABLE IF NOT EXISTS schedule_days (
+    day          TEXT NOT NULL,
+    schedule_id  INTEGER NOT NULL REFERENCES schedules (id) ON DELETE CASCADE,
+    PRIMARY KEY (day, schedule_id)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS meta (
+    key    TEXT PRIMARY KEY,
+    value  TEXT
+);
+"""
+
+# Columns a schedule update may change, and how they are stored
+EDITABLE_FIELDS = {
+    'name': str,
+    'time': str,
+    'days': json.dumps,
+    'action': json.dumps,
+    'enabled': int,
+    'last_run': lambda value: value,
+}
+
+def schedules_db_path():
+    path = os.getenv('SENVILLE_SCHEDULES_DB')
+    if path:
+        return path
+    return os.path.splitext(os.getenv('SENVILLE_SCHEDULES_FILE', SCHEDULE_FILE))[0] + '.db'
+
+def row_to_schedule(row):
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'time': row['time'],
+        'days': json.loads(row['days']),
+        'action': json.loads(row['action']),
+        'enabled': bool(row['enabled']),
+        'created_at': row['created_at'],
+        'last_run': row['last_run'],
+    }
+
+class ScheduleStore:
+    """Schedules in SQLite, with a cached copy that is refreshed when another process commits"""
+
+    def __init__(self, path=None):
+        self._path = path
+        self._db = None
+        self._db_path = None
+        self._schedules = []
+        self._data_version = None
+        self._dirty = True
+        self.version = 0        # Bumped every time the cached copy is refreshed
+        self.lock = threading.RLock()
+
+    @property
+    def path(self):
+        # Resolved on each use: scripts load .env after creating their store
+        return self._path or schedules_db_path()
+
+    def _connect(self):
+        path = self.path
+        if self._db is not None and self._db_path == path:
+            return self._db
+        self.close()
+        db = sqlite3.connect(path, timeout=BUSY_TIMEOUT / 1000, isolation_level=None,
+                             check_same_thread=False)
+        try:
+            db.row_factory = sqlite3.Row
+            db.execute('PRAGMA journal_mode=WAL')
+            db.execute('PRAGMA synchronous=NORMAL')
+            db.execute('PRAGMA foreign_keys=ON')
+            db.executescript(SCHEMA)
+            self._migrate(db)
+        except Exception:
+            db.close()
+            raise
+        self._db, self._db_path = db, path
+        self._dirty = True
+        return db
+
+    def _migrate(self, db):
+        """Import the JSON schedule file the first time this database is opened"""
+        json_file = os.getenv('SENVILLE_SCHEDULES_FILE', SCHEDULE_FILE)
+        with self._transaction(db):
+            if db.execute("SELECT 1 FROM meta WHERE key = 'migrated'").fetchone():
+                return
+            schedules = []
+            if os.path.exists(json_file):
+                with open(json_file, 'r') as f:
+                    schedules = json.load(f)
+                for schedule in schedules:
+                    # Keep IDs, except duplicates left behind by racing writers
+                    schedule_id = schedule.get('id')
+                    if db.execute("SELECT 1 FROM schedules WHERE id = ?", (schedule_id,)).fetchone():
+                        schedule_id = None
+                    self._insert(db, schedule, schedule_id)
+            db.execute("INSERT INTO meta (key, value) VALUES ('migrated', ?)",
+                       (json_file if schedules else '',))
+        if schedules:
+            os.replace(json_file, json_file + '.migrated')
+            print(f"Migrated {len(schedules)} schedule(s) from {json_file} to {self.path}")
+
+    @contextlib.contextmanager
+    def _transaction(self, db):
+        """BEGIN IMMEDIATE takes the write lock up front, so reads inside can't go stale"""
+        db.execute('BEGIN IMMEDIATE')
+        try:
+            yield db
+        except BaseException:
+            db.execute('ROLLBACK')
+            raise
+        db.execute('COMMIT')
+        self._dirty = True
+
+    @staticmethod
+    def _insert(db, schedule, schedule_id=None):
+        cursor = db.execute(
+            "INSERT INTO schedules (id, name, time, days, action, enabled, created_at, last_run) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (schedule_id, schedule['name'], schedule['time'], json.dumps(schedule.get('days', [])),
+             json.dumps(schedule['action']), int(schedule.get('enabled', True)),
+             schedule.get('created_at'), schedule.get('last_run')))
+        ScheduleStore._set_days(db, cursor.lastrowid, schedule.get('days', []))
+        return cursor.lastrowid
+
+    @staticmethod
+    def _set_days(db, schedule_id, days):
+        db.execute("DELETE FROM schedule_days WHERE schedule_id = ?", (schedule_id,))
+        db.executemany("INSERT OR IGNORE INTO schedule_days (day, schedule_id) VALUES (?, ?)",
+                       [(day.lower(), schedule_id) for day in days])
+
+    def _get(self, db, schedule_id):
+        row = db.execute("SELECT * FROM schedules WHERE id = ?", (schedule_id,)).fetchone()
+        return row_to_schedule(row) if row else None
+
+    def changed(self):
+        """True if the schedules changed since the last load()"""
+        with self.lock:
+            db = self._connect()
+            return self._dirty or db.execute('PRAGMA data_version').fetchone()[0] != self._data_version
+
+    def load(self):
+        """
+        All schedules ordered by ID, re-queried only if they changed.
+
+        The list is shared: don't modify it or its schedules.
+        """
+        with self.lock:
+            if not self.changed():
+                return self._schedules
+            db = self._db
+            self._data_version = db.execute('PRAGMA data_version').fetchone()[0]
+            self._dirty = False
+            self._schedules = [row_to_schedule(row) for row in db.execute("SELECT * FROM schedules ORDER BY id")]
+            self.version += 1
+            return self._schedules
+
+    def enabled_count(self):
+        with self.lock:
+            return self._connect().execute("SELECT COUNT(*) FROM schedules WHERE enabled = 1").fetchone()[0]
+
+    def create(self, schedule):
+        """Insert a schedule and return it with its new ID"""
+        with self.lock:
+            with self._transaction(self._connect()) as db:
+                schedule_id = self._insert(db, schedule)
+                return self._get(db, schedule_id)
+
+    def update(self, schedule_id, changes):
+        """Change some fields of one schedule; returns it, or None if there is no such schedule"""
+        changes = {field: value for field, value in changes.items() if field in EDITABLE_FIELDS}
+        with self.lock:
+            with self._transaction(self._connect()) as db:
+                if changes:
+                    columns = ', '.join(f"{field} = ?" for field in changes)
+                    db.execute(f"UPDATE schedules SET {columns} WHERE id = ?",
+                               [EDITABLE_FIELDS[field](value) for field, value in changes.items()] + [schedule_id])
+                schedule = self._get(db, schedule_id)
+                if schedule and 'days' in changes:
+                    self._set_days(db, schedule_id, changes['days'])
+                return schedule
+
+    def delete(self, schedule_id):
+        """Delete one schedule; returns False if there was no such schedule"""
+        with self.lock:
+            with self._transaction(self._connect()) as db:
+                return db.execute("DELETE FROM schedules WHERE id = ?", (schedule_id,)).rowcount > 0
+
+    def close(self):
+        with self.lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+def main():
+    parser = argparse.ArgumentParser(description='Senville schedule database')
+    parser.add_argument('--json', action='store_true', help='Print all schedules as JSON')
+    args = parser.parse_args()
+
+    store = ScheduleStore()
+    try:
+        schedules = store.load()
+    except (sqlite3.Error, OSError, ValueError) as e:
+        print(f"Error opening {store.path}: {e}")
+        sys.exit(1)
+
+    if args.json:
+        print(json.dumps(schedules, indent=2))
+        return
+    print(f"{store.path}: {len(schedules)} schedule(s), {store.enabled_count()} enabled")
+
+if __name__ == '__main__':
+    main()
@@ -13,17 +13,24 @@ Usage:
 import os
 import sys
 import time
-import json
+import heapq
 import signal
 import argparse
-from datetime import datetime, time as dt_time
+import itertools
+from datetime import datetime, timedelta, time as dt_time
 from pathlib import Path
-from midea_beautiful import appliance_state
+from broker_client import connect_device
+from shared_state import pending_changes
+from schedule_store import ScheduleStore
+from run_journal import RunJournal
 
-# Schedule storage file
-SCHEDULE_FILE = os.path.join(os.path.dirname(__file__), 'schedules.json')
 PID_FILE = os.path.join(os.path.dirname(__file__), 'scheduler.pid')
 
+SCHEDULE_CHECK_INTERVAL = 5    # Seconds between checks for schedule edits (no reads unless something changed)
+SCHEDULE_MISFIRE_GRACE = 60    # Fire times missed by longer than this are skipped (seconds)
+SCHEDULE_RETRIES = 2           # Extra attempts when a schedule's device can't be reached
+SCHEDULE_RETRY_DELAY = 5       # Seconds between attempts
+
 def load_env():
     """Load environment variables from .env file"""
     env_file = '.env'
@@ -35,28 +42,6 @@ def load_env():
                     key, value = line.split('=', 1)
                     os.environ[key] = value
 
-def load_schedules():
-    """Load schedules from JSON file"""
-    if not os.path.exists(SCHEDULE_FILE):
-        return []
-
-    try:
-        with open(SCHEDULE_FILE, 'r') as f:
-            return json.load(f)
-    except Exception as e:
-        print(f"Error loading schedules: {e}")
-        return []
-
-def save_schedules(schedules):
-    """Save schedules to JSON file"""
-    try:
-        with open(SCHEDULE_FILE, 'w') as f:
-            json.dump(schedules, f, indent=2)
-        return True
-    except Exception as e:
-        print(f"Error saving schedules: {e}")
-        return False
-
 def f_to_c(fahrenheit):
     """Convert Fahrenheit to Celsius"""
     return (fahrenheit - 32) * 5 / 9
@@ -74,103 +59,274 @@ def get_device():
     if not all([ip, token, key]):
         raise ValueError("Missing credentials in .env file")
 
-    return appliance_state(address=ip, token=token, key=key)
-
-def execute_schedule(schedule):
-    """Execute a schedule action"""
-    try:
-        print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Executing schedule: {schedule['name']}")
-
-        device = get_device()
-        state = device.state
-
-        action = schedule['action']
-        changes = []
-
-        # Power
-        if 'power' in action:
-            state.running = action['power']
-            changes.append(f"power: {'on' if action['power'] else 'off'}")
-
-        # Mode
-        if 'mode' in action:
-            mode_map = {'auto': 1, 'cool': 2, 'dry': 3, 'heat': 4, 'fan': 5}
-            if action['mode'] in mode_map:
-                state.mode = mode_map[action['mode']]
-                changes.append(f"mode: {action['mode']}")
-
-        # Temperature
-        if 'temperature' in action:
-            temp = action['temperature']
-            use_f = action.get('fahrenheit', False)
-            temp_c = f_to_c(temp) if use_f else temp
-            if 16 <= temp_c <= 31:
-                state.target_temperature = float(temp_c)
-                changes.append(f"temp: {temp}°{'F' if use_f else 'C'}")
-
-        # Fan speed
-        if 'fan_speed' in action:
-            speed = action['fan_speed']
-            if speed in [20, 40, 60, 80, 102]:
-                state.fan_speed = speed
-                changes.append(f"fan: {speed}")
-
-        # Swing
-        if 'vertical_swing' in action:
-            state.vertical_swing = action['vertical_swing']
-            changes.append(f"v-swing: {'on' if action['vertical_swing'] else 'off'}")
-
-        if 'horizontal_swing' in action:
-            state.horizontal_swing = action['horizontal_swing']
-            changes.append(f"h-swing: {'on' if action['horizontal_swing'] else 'off'}")
-
-        if changes:
-            device.apply()
-            print(f"  Applied: {', '.join(changes)}")
-
-            # Update last run time
-            schedule['last_run'] = datetime.now().isoformat()
-            return True
-        else:
-            print("  No changes to apply")
-            return False
-
-    except Exception as e:
-        print(f"  Error executing schedule: {e}")
-        return False
-
-def check_schedule(schedule, now):
-    """Check if a schedule should run now"""
+    return connect_device(ip, token, key)
+
+def schedule_changes(action):
+    """Device fields a schedule action sets, plus a description of each: (desired, changes)"""
+    desired = {}
+    changes = []
+
+    # Power
+    if 'power' in action:
+        desired['running'] = action['power']
+        changes.append(f"power: {'on' if action['power'] else 'off'}")
+
+    # Mode
+    if 'mode' in action:
+        mode_map = {'auto': 1, 'cool': 2, 'dry': 3, 'heat': 4, 'fan': 5}
+        if action['mode'] in mode_map:
+            desired['mode'] = mode_map[action['mode']]
+            changes.append(f"mode: {action['mode']}")
+
+    # Temperature
+    if 'temperature' in action:
+        temp = action['temperature']
+        use_f = action.get('fahrenheit', False)
+        temp_c = f_to_c(temp) if use_f else temp
+        if 16 <= temp_c <= 31:
+            desired['target_temperature'] = float(temp_c)
+            changes.append(f"temp: {temp}°{'F' if use_f else 'C'}")
+
+    # Fan speed
+    if 'fan_speed' in action:
+        speed = action['fan_speed']
+        if speed in [20, 40, 60, 80, 102]:
+            desired['fan_speed'] = speed
+            changes.append(f"fan: {speed}")
+
+    # Swing
+    if 'vertical_swing' in action:
+        desired['vertical_swing'] = action['vertical_swing']
+        changes.append(f"v-swing: {'on' if action['vertical_swing'] else 'off'}")
+
+    if 'horizontal_swing' in action:
+        desired['horizontal_swing'] = action['horizontal_swing']
+        changes.append(f"h-swing: {'on' if action['horizontal_swing'] else 'off'}")
+
+    return desired, changes
+
+def run_record(schedule, scheduled, result, **details):
+    """A journal entry for one execution of a schedule"""
+    return {
+        'schedule_id': schedule.get('id'),
+        'name': schedule.get('name'),
+        'scheduled': scheduled.isoformat() if scheduled else None,
+        'started': datetime.now().isoformat(),
+        'action': schedule.get('action'),
+        'applied': {},
+        'result': result,
+        'latency_ms': 0,
+        'retries': 0,
+        'error': None,
+        'batch': [schedule.get('id')],
+        'overridden': {},
+        **details,
+    }
+
+def execute_schedules(due):
+    """
+    Execute schedules that fire together with one connection and one apply.
+
+    due is [(schedule, scheduled datetime)]. Their actions are merged in
+    (scheduled, id) order, so where two set the same field the later
+    schedule wins and, at the same instant, the higher ID. Returns one
+    journal record per schedule: 'applied' holds the fields it contributed
+    that were sent, 'overridden' the fields another schedule set to a
+    different value, and 'batch' the IDs applied together.
+    """
+    due = sorted(due, key=lambda item: (item[1] or datetime.min, item[0].get('id') or 0))
+    names = ', '.join(str(schedule.get('name', schedule.get('id'))) for schedule, _ in due)
+    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Executing schedule{'s' if len(due) > 1 else ''}: {names}")
+
+    records = []
+    batch = []          # (record, desired)
+    merged = {}
+    owner = {}          # field -> id of the schedule whose value is used
+    descriptions = {}   # field -> description of the value used
+    for schedule, scheduled in due:
+        record = run_record(schedule, scheduled, 'error')
+        records.append(record)
+        try:
+            desired, changes = schedule_changes(schedule['action'])
+        except Exception as e:
+            # A malformed schedule must not take the rest of the batch (or the daemon) down
+            print(f"  {record['name']}: invalid action: {e!r}")
+            record.update(result='invalid', error=f"Invalid action: {e!r}")
+            continue
+        if not changes:
+            print(f"  {record['name']}: no changes to apply")
+            record['result'] = 'invalid'
+            continue
+        batch.append((record, desired))
+        merged.update(desired)
+        owner.update((field, schedule.get('id')) for field in desired)
+        # schedule_changes() adds one description per field, in the same order
+        descriptions.update(zip(desired, changes))
+
+    if not batch:
+        return records
+    descriptions = ', '.join(descriptions.values())
+
+    start = time.monotonic()
+    pending, error, retries = {}, None, 0
+    for attempt in range(SCHEDULE_RETRIES + 1):
+        retries = attempt
+        try:
+            device = get_device()
+            pending = pending_changes(device.state, merged)
+            if pending:
+                for attr, value in pending.items():
+                    setattr(device.state, attr, value)
+                device.apply()
+                print(f"  Applied: {descriptions}")
+            else:
+                print(f"  Already set, nothing sent: {descriptions}")
+            error = None
+            break
+        except Exception as e:
+            print(f"  Error executing schedule: {e}")
+            error = str(e)
+            if attempt < SCHEDULE_RETRIES:
+                time.sleep(SCHEDULE_RETRY_DELAY)
+    latency_ms = round((time.monotonic() - start) * 1000, 1)
+
+    ids = [record['schedule_id'] for record, _ in batch]
+    for record, desired in batch:
+        record.update(latency_ms=latency_ms, retries=retries, error=error, batch=ids)
+        record['overridden'] = {f: owner[f] for f in desired
+                                if owner[f] != record['schedule_id'] and merged[f] != desired[f]}
+        if error is None:
+            record['applied'] = {f: v for f, v in pending.items()
+                                 if f in desired and owner[f] == record['schedule_id']}
+            record['result'] = 'applied' if record['applied'] else 'unchanged'
+        if record['overridden']:
+            print(f"  {record['name']}: {', '.join(record['overridden'])} overridden by "
+                  f"schedule {', '.join(str(i) for i in sorted(set(record['overridden'].values())))}")
+    return records
+
+def execute_schedule(schedule, scheduled=None):
+    """Execute one schedule action; returns its journal record"""
+    return execute_schedules([(schedule, scheduled)])[0]
+
+def next_fire_time(schedule, after):
+    """Next datetime after `after` at which a schedule fires, or None if it never will"""
     if not schedule.get('enabled', True):
-        return False
-
-    current_time = now.time()
-    current_day = now.strftime('%a').lower()
+        return None
 
     # Parse schedule time
     try:
         schedule_time = dt_time.fromisoformat(schedule['time'])
-    except:
-        print(f"Invalid time format in schedule: {schedule['time']}")
-        return False
-
-    # Check if it's the right time (within 1 minute window)
-    time_match = (
-        schedule_time.hour == current_time.hour and
-        schedule_time.minute == current_time.minute
-    )
-
-    if not time_match:
-        return False
-
-    # Check days
-    days = schedule.get('days', [])
-    if not days:
-        # If no days specified, run every day
-        return True
+    except (KeyError, TypeError, ValueError):
+        print(f"Invalid time format in schedule: {schedule.get('time')}")
+        return None
+
+    # No days means every day
+    days = [d.lower() for d in schedule.get('days', [])]
+
+    for offset in range(8):
+        candidate = datetime.combine(after.date() + timedelta(days=offset),
+                                     schedule_time.replace(second=0, microsecond=0))
+        if candidate > after and (not days or candidate.strftime('%a').lower() in days):
+            return candidate
+    return None
+
+class ScheduleEngine:
+    """
+    Keeps every schedule's next fire time in a heap.
+
+    update() recompiles only the schedules that were added, changed or
+    removed; the loop sleeps until the earliest fire time instead of
+    scanning all schedules on a fixed tick. Heap entries of changed or
+    removed schedules are left in place and skipped when they surface.
+    """
+
+    def __init__(self):
+        self._heap = []        # (timestamp, sequence, key)
+        self._entries = {}     # key -> (timestamp, schedule)
+        self._sequence = itertools.count()
+
+    @staticmethod
+    def key(schedule):
+        return schedule.get('id', schedule.get('name'))
+
+    @staticmethod
+    def definition(schedule):
+        """The fields that decide when and what a schedule runs"""
+        return {k: v for k, v in schedule.items() if k != 'last_run'}
+
+    def __len__(self):
+        return len(self._entries)
+
+    def update(self, schedules, now=None):
+        """Sync with a freshly loaded schedule list; returns the keys that changed"""
+        now = now or datetime.now()
+        current = {self.key(s): s for s in schedules}
+        changed = set()
+
+        for key in list(self._entries):
+            if key not in current:
+                del self._entries[key]
+                changed.add(key)
+
+        for key, schedule in current.items():
+            entry = self._entries.get(key)
+            if entry is not None and self.definition(entry[1]) == self.definition(schedule):
+                # Unchanged (or only last_run moved): keep its fire time
+                self._entries[key] = (entry[0], schedule)
+                continue
+            self._schedule(key, schedule, now)
+            changed.add(key)
+        return changed
+
+    def start(self, schedules, now=None):
+        """
+        First update() when the scheduler starts.
 
-    # Check if today is in the schedule
-    return current_day in [d.lower() for d in days]
+        Fire times are counted from the start of the current minute, so a
+        schedule set for the minute the scheduler starts in still runs,
+        unless its last_run shows it already did (a quick restart).
+        """
+        now = now or datetime.now()
+        minute = now.replace(second=0, microsecond=0)
+        for schedule in schedules:
+            try:
+                ran = datetime.fromisoformat(schedule['last_run']) >= minute
+            except (KeyError, TypeError, ValueError):
+                ran = False
+            self._schedule(self.key(schedule), schedule, now if ran else minute - timedelta(microseconds=1))
+
+    def _schedule(self, key, schedule, after):
+        fire = next_fire_time(schedule, after)
+        if fire is None:
+            self._entries.pop(key, None)
+            return
+        timestamp = fire.timestamp()
+        self._entries[key] = (timestamp, schedule)
+        heapq.heappush(self._heap, (timestamp, next(self._sequence), key))
+
+    def _discard_stale(self):
+        while self._heap:
+            timestamp, _, key = self._heap[0]
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == timestamp:
+                return
+            heapq.heappop(self._heap)
+
+    def next_time(self):
+        """Timestamp of the earliest pending fire time, or None"""
+        self._discard_stale()
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, now):
+        """(schedule, scheduled datetime) for every fire time at or before now; each is rescheduled"""
+        due = []
+        while self.next_time() is not None and self._heap[0][0] <= now.timestamp():
+            timestamp, _, key = heapq.heappop(self._heap)
+            schedule = self._entries[key][1]
+            scheduled = datetime.fromtimestamp(timestamp)
+            due.append((schedule, scheduled))
+            self._schedule(key, schedule, scheduled)
+        return due
 
 def run_scheduler_loop():
     """Main scheduler loop"""
@@ -178,34 +334,53 @@ def run_scheduler_loop():
     print("Senville AC Scheduler Service")
     print("=" * 60)
     print(f"Started at: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"Schedule file: {SCHEDULE_FILE}")
-    print(f"Checking schedules every 30 seconds...")
+    print(f"Schedule database: {ScheduleStore().path}")
+    print(f"Checking for schedule changes every {SCHEDULE_CHECK_INTERVAL} seconds")
     print("Press Ctrl+C to stop")
     print("=" * 60)
     print()
 
-    last_minute = -1
+    store = ScheduleStore()
+    journal = RunJournal()
+    engine = ScheduleEngine()
+    schedules = store.load()
+    engine.start(schedules)
+    print(f"Loaded {len(schedules)} schedule(s), {len(engine)} enabled")
 
     try:
         while True:
             now = datetime.now()
-            current_minute = now.minute
-
-            # Only check schedules once per minute
-            if current_minute != last_minute:
-                last_minute = current_minute
-
-                schedules = load_schedules()
-
-                for schedule in schedules:
-                    if check_schedule(schedule, now):
-                        success = execute_schedule(schedule)
-                        if success:
-                            # Save updated last_run time
-                            save_schedules(schedules)
-
-            # Sleep for 30 seconds
-            time.sleep(30)
+            ready = []
+            for schedule, scheduled in engine.pop_due(now):
+                late = (now - scheduled).total_seconds()
+                if late > SCHEDULE_MISFIRE_GRACE:
+                    # e.g. the machine was asleep; don't replay old actions
+                    print(f"Skipping {schedule.get('name')}: missed {scheduled.strftime('%H:%M')} by {late:.0f}s")
+                    journal.append(run_record(schedule, scheduled, 'missed'))
+                    continue
+                ready.append((schedule, scheduled))
+
+            # Every schedule drives the unit in .env: one connection and apply per tick
+            if ready:
+                for record in execute_schedules(ready):
+                    journal.append(record)
+                    if record['result'] in ('applied', 'unchanged'):
+                        # Update last run time
+                        store.update(record['schedule_id'], {'last_run': record['started']})
+
+            # Sleep until the next fire time, waking to look for schedule edits
+            wake = time.time() + SCHEDULE_CHECK_INTERVAL
+            next_time = engine.next_time()
+            if next_time is not None:
+                wake = min(wake, next_time)
+            time.sleep(max(0, wake - time.time()))
+
+            if store.changed():
+                schedules = store.load()
+                changed = engine.update(schedules)
+                if changed:
+                    print(f"[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] "
+                          f"Schedules changed: {', '.join(str(k) for k in sorted(changed, key=str))}")
 
     except KeyboardInterrupt:
         print("\n\nScheduler stopped by user")
@@ -317,7 +492,7 @@ def check_status():
             print(f"Scheduler: Running (PID: {pid})")
 
             # Load and display schedules
-            schedules = load_schedules()
+            schedules = ScheduleStore().load()
             enabled_count = sum(1 for s in schedules if s.get('enabled', True))
             print(f"Schedules: {len(schedules)} total, {enabled_count} enabled")
 
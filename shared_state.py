@@ -0,0 +1,380 @@
+#!/usr/bin/env python3
+"""
+Senville Shared State Snapshot
+
+The process that polls the units (api_server.py or device_broker.py)
+publishes each unit's latest decoded state into a small fixed-layout file
+that other local tools memory-map and read without touching the device.
+
+Layout (little endian):
+    header  magic "SNVS", layout version (u16), slot count (u16)
+    slots   SLOT_COUNT fixed-size records, one per unit
+
+Each slot starts with a sequence counter. Writers make it odd before
+changing the record and even again afterwards, so readers copy nothing
+and take no locks: they retry if the counter was odd or changed while
+they read. Writers from different processes serialize on flock().
+
+StateSnapshot is the immutable state type the tools pass around: status
+fields, Fahrenheit values and the API's JSON payload are computed once when
+it is created, and read_snapshot() returns one.
+
+Usage:
+    python3 shared_state.py                      # One-line status of the first unit
+    python3 shared_state.py --device bedroom --json
+    eval "$(python3 shared_state.py --shell)"    # SENVILLE_RUNNING=1 etc. for shell scripts
+
+Environment:
+    SENVILLE_STATE_FILE  Snapshot file (default: /dev/shm/senville-state, or
+                         state.snapshot next to the scripts without /dev/shm)
+"""
+
+import os
+import sys
+import json
+import math
+import mmap
+import time
+import fcntl
+import struct
+import argparse
+import threading
+
+if os.path.isdir('/dev/shm'):
+    DEFAULT_STATE_FILE = '/dev/shm/senville-state'
+else:
+    DEFAULT_STATE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'state.snapshot')
+
+MAGIC = b'SNVS'
+LAYOUT_VERSION = 1
+SLOT_COUNT = 16                 # Units one snapshot file can hold
+READ_RETRIES = 100              # Give up if a writer keeps the slot busy this long
+TEMPERATURE_STEP = 0.5          # The units store target temperatures in half degrees Celsius
+
+HEADER = struct.Struct('<4sHH')
+SEQ = struct.Struct('<Q')
+# updated, device id, ip, then the state fields in FIELDS order
+RECORD = struct.Struct('<d32s16s?Bfff?BB?????')
+SLOT_SIZE = 96
+FILE_SIZE = HEADER.size + SLOT_COUNT * SLOT_SIZE
+
+FIELDS = [
+    'running', 'mode', 'target_temperature', 'indoor_temperature', 'outdoor_temperature',
+    'fahrenheit', 'fan_speed', 'error_code', 'vertical_swing', 'horizontal_swing',
+    'eco_mode', 'turbo', 'comfort_mode',
+]
+FLOAT_FIELDS = ('target_temperature', 'indoor_temperature', 'outdoor_temperature')
+
+def state_file_path():
+    return os.getenv('SENVILLE_STATE_FILE', DEFAULT_STATE_FILE)
+
+def _slot_offset(index):
+    return HEADER.size + index * SLOT_SIZE
+
+def c_to_f(celsius):
+    """Convert Celsius to Fahrenheit"""
+    return None if celsius is None else celsius * 9 / 5 + 32
+
+def _round(value):
+    return None if value is None else round(value, 1)
+
+class StateSnapshot:
+    """
+    Immutable decoded unit state.
+
+    Holds the FIELDS values read off an appliance state object once, with
+    Fahrenheit temperatures and the API status payload (dict and JSON text)
+    computed up front. Snapshots compare equal when their state fields do;
+    diff() lists the fields that changed.
+    """
+
+    __slots__ = FIELDS + [
+        'target_temperature_f', 'indoor_temperature_f', 'outdoor_temperature_f',
+        'device_id', 'ip', 'updated', '_key', '_payload', 'json',
+    ]
+
+    def __init__(self, device_id=None, ip=None, updated=None, **fields):
+        values = tuple(fields.get(field) for field in FIELDS)
+        for field, value in zip(FIELDS, values):
+            object.__setattr__(self, field, value)
+        for field in FLOAT_FIELDS:
+            object.__setattr__(self, field + '_f', c_to_f(fields.get(field)))
+        object.__setattr__(self, 'device_id', device_id)
+        object.__setattr__(self, 'ip', ip)
+        object.__setattr__(self, 'updated', time.time() if updated is None else updated)
+        object.__setattr__(self, '_key', values)
+
+        # The API status payload; temperatures in the unit the device displays
+        display = '_f' if self.fahrenheit else ''
+        payload = {
+            'running': self.running,
+            'mode': str(self.mode),
+            'target_temperature': _round(getattr(self, 'target_temperature' + display)),
+            'indoor_temperature': _round(getattr(self, 'indoor_temperature' + display)),
+            'outdoor_temperature': _round(getattr(self, 'outdoor_temperature' + display)),
+            'fan_speed': self.fan_speed,
+            'vertical_swing': self.vertical_swing,
+            'horizontal_swing': self.horizontal_swing,
+            'fahrenheit': self.fahrenheit,
+            'eco_mode': bool(self.eco_mode),
+            'turbo_mode': bool(self.turbo),
+        }
+        object.__setattr__(self, '_payload', payload)
+        object.__setattr__(self, 'json', json.dumps(payload, sort_keys=True, separators=(',', ':')))
+
+    @classmethod
+    def from_state(cls, state, **meta):
+        """Snapshot an appliance state object (or anything with the FIELDS attributes)"""
+        if isinstance(state, cls):
+            return state
+        return cls(**meta, **{field: getattr(state, field, None) for field in FIELDS})
+
+    def __setattr__(self, name, value):
+        raise AttributeError("StateSnapshot is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("StateSnapshot is immutable")
+
+    def __eq__(self, other):
+        if not isinstance(other, StateSnapshot):
+            return NotImplemented
+        return self._key == other._key
+
+    def __hash__(self):
+        return hash(self._key)
+
+    def __repr__(self):
+        return f"StateSnapshot({', '.join(f'{f}={v!r}' for f, v in zip(FIELDS, self._key))})"
+
+    @property
+    def age(self):
+        """Seconds since the state was read from the unit"""
+        return time.time() - self.updated
+
+    @property
+    def unit(self):
+        return '°F' if self.fahrenheit else '°C'
+
+    def fields(self):
+        """The state fields as a new dict"""
+        return dict(zip(FIELDS, self._key))
+
+    def as_dict(self):
+        """The API status payload (a copy; the snapshot itself never changes)"""
+        return dict(self._payload)
+
+    def diff(self, other):
+        """{field: new value} for the fields that differ from other (all of them if other is None)"""
+        if other is None:
+            return self.fields()
+        if self._key == other._key:
+            return {}
+        return {field: value for field, value, old in zip(FIELDS, self._key, other._key) if value != old}
+
+
+def pending_changes(state, changes):
+    """
+    The subset of changes whose values differ from state (a StateSnapshot or appliance state).
+
+    A target temperature is first rounded to the unit's TEMPERATURE_STEP, so
+    e.g. 72°F (22.2°C) matches a unit already set to 22°C.
+    """
+    pending = {}
+    for field, value in changes.items():
+        if field == 'target_temperature' and value is not None:
+            value = round(value / TEMPERATURE_STEP) * TEMPERATURE_STEP
+        if getattr(state, field, None) != value:
+            pending[field] = value
+    return pending
+
+
+class StatePublisher:
+    """Writes unit states into the snapshot file (one per polling process)"""
+
+    def __init__(self, path=None):
+        self.path = path or state_file_path()
+        self._file = None
+        self._map = None
+        self._slots = {}
+        self._lock = threading.Lock()   # flock() does not exclude threads sharing the file
+
+    def _open(self):
+        fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        self._file = os.fdopen(fd, 'r+b')
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            if os.fstat(fd).st_size != FILE_SIZE or self._file.read(4) != MAGIC:
+                self._file.truncate(0)
+                self._file.truncate(FILE_SIZE)
+            self._map = mmap.mmap(fd, FILE_SIZE)
+            HEADER.pack_into(self._map, 0, MAGIC, LAYOUT_VERSION, SLOT_COUNT)
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def _find_slot(self, device_id):
+        """Slot already holding device_id, else the first free one (file lock held)"""
+        free = None
+        for index in range(SLOT_COUNT):
+            name = RECORD.unpack_from(self._map, _slot_offset(index) + SEQ.size)[1].rstrip(b'\0')
+            if name == device_id:
+                return index
+            if not name and free is None:
+                free = index
+        if free is None:
+            raise ValueError(f"No free slot in {self.path} ({SLOT_COUNT} units)")
+        return free
+
+    def publish(self, device_id, ip, state):
+        """Store a unit's current state (any object with the FIELDS attributes)"""
+        key = device_id.encode()[:32]
+
+        values = []
+        for field in FIELDS:
+            value = getattr(state, field, None)
+            if field in FLOAT_FIELDS:
+                values.append(math.nan if value is None else float(value))
+            elif field in ('mode', 'fan_speed', 'error_code'):
+                values.append(int(value or 0) & 0xFF)
+            else:
+                values.append(bool(value))
+
+        with self._lock:
+            if self._map is None:
+                self._open()
+            self._write(device_id, key, ip, getattr(state, 'updated', None) or time.time(), values)
+
+    def _write(self, device_id, key, ip, updated, values):
+        """Write one slot under the file lock (thread lock held)"""
+        fcntl.flock(self._file, fcntl.LOCK_EX)
+        try:
+            index = self._slots.get(device_id)
+            if index is None or RECORD.unpack_from(self._map, _slot_offset(index) + SEQ.size)[1].rstrip(b'\0') != key:
+                index = self._slots[device_id] = self._find_slot(key)
+            offset = _slot_offset(index)
+            seq = SEQ.unpack_from(self._map, offset)[0] + 1 | 1
+            SEQ.pack_into(self._map, offset, seq)          # Odd: write in progress
+            RECORD.pack_into(self._map, offset + SEQ.size, updated, key, ip.encode()[:16], *values)
+            SEQ.pack_into(self._map, offset, seq + 1)      # Even: record complete
+        finally:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+
+    def close(self):
+        with self._lock:
+            if self._map is not None:
+                self._map.close()
+                self._file.close()
+                self._map = None
+
+
+_reader = None
+
+def _read_map(path):
+    """Read-only mapping of the snapshot file, kept open between reads"""
+    global _reader
+    if _reader is None or _reader[0] != path:
+        with open(path, 'rb') as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(mapped) < FILE_SIZE or HEADER.unpack_from(mapped, 0) != (MAGIC, LAYOUT_VERSION, SLOT_COUNT):
+            mapped.close()
+            return None
+        _reader = (path, mapped)
+    return _reader[1]
+
+def _read_slot(mapped, index):
+    """Consistent copy of one slot's record, or None if it is empty"""
+    offset = _slot_offset(index)
+    for _ in range(READ_RETRIES):
+        seq = SEQ.unpack_from(mapped, offset)[0]
+        if seq & 1:
+            time.sleep(0.001)  # Writer mid-update
+            continue
+        record = RECORD.unpack_from(mapped, offset + SEQ.size)
+        if SEQ.unpack_from(mapped, offset)[0] == seq:
+            return record if seq else None
+    return None
+
+def read_snapshot(device=None, max_age=None, path=None):
+    """
+    Latest published state of a unit, looked up by id or IP (None means the
+    first published unit). Returns a StateSnapshot, or None when there is no
+    snapshot or it is older than max_age.
+    """
+    try:
+        mapped = _read_map(path or state_file_path())
+    except (OSError, ValueError):
+        return None
+    if mapped is None:
+        return None
+
+    for index in range(SLOT_COUNT):
+        record = _read_slot(mapped, index)
+        if record is None:
+            continue
+        updated, device_id, ip = record[0], record[1].rstrip(b'\0').decode(), record[2].rstrip(b'\0').decode()
+        if device is not None and device not in (device_id, ip):
+            continue
+
+        if max_age is not None and time.time() - updated > max_age:
+            return None
+        fields = dict(zip(FIELDS, record[3:]))
+        for field in FLOAT_FIELDS:
+            if math.isnan(fields[field]):
+                fields[field] = None
+        return StateSnapshot(device_id=device_id, ip=ip, updated=updated, **fields)
+    return None
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Print the last published AC state without querying the device'
+    )
+    parser.add_argument(
+        '--device',
+        help='Device id or IP (default: the first published unit)'
+    )
+    parser.add_argument(
+        '--max-age',
+        type=float,
+        help='Fail if the snapshot is older than this many seconds'
+    )
+    output = parser.add_mutually_exclusive_group()
+    output.add_argument(
+        '--json',
+        action='store_true',
+        help='Print the state as JSON'
+    )
+    output.add_argument(
+        '--shell',
+        action='store_true',
+        help='Print SENVILLE_<FIELD>=value lines for eval in shell scripts'
+    )
+
+    args = parser.parse_args()
+
+    state = read_snapshot(args.device, args.max_age)
+    if state is None:
+        print(f"No recent state snapshot in {state_file_path()}", file=sys.stderr)
+        sys.exit(1)
+
+    fields = state.fields()
+    fields.update(device_id=state.device_id, ip=state.ip, age=round(state.age, 1))
+    if args.json:
+        print(json.dumps(fields))
+    elif args.shell:
+        for field, value in fields.items():
+            if isinstance(value, bool):
+                value = int(value)
+            elif value is None:
+                value = ''
+            elif isinstance(value, float):
+                value = round(value, 1)
+            print(f"SENVILLE_{field.upper()}={value}")
+    else:
+        print(f"Power: {'ON' if state.running else 'OFF'} | "
+              f"Mode: {state.mode} | "
+              f"Target: {state.target_temperature:.0f}°C | "
+              f"Indoor: {state.indoor_temperature:.1f}°C | "
+              f"Fan: {state.fan_speed} | "
+              f"Age: {state.age:.0f}s")
+
+if __name__ == '__main__':
+    main()
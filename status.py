@@ -7,6 +7,7 @@ mode, fan speed, and other settings.
 
 Usage:
     python3 status.py
+    python3 status.py --cached # Last state published by the API server/broker
     python3 status.py --cloud  # Use cloud API instead of local
 
 Requires:
@@ -17,7 +18,9 @@ Requires:
 import os
 import sys
 import argparse
-from midea_beautiful import appliance_state, connect_to_cloud
+from shared_state import StateSnapshot, read_snapshot
+
+CACHED_MAX_AGE = 60  # Query the device when the shared snapshot is older (seconds)
 
 def load_env():
     """Load environment variables from .env file if it exists"""
@@ -32,6 +35,8 @@ def load_env():
 
 def get_status_local(ip=None, token=None, key=None, verbose=0, quiet=False):
     """Get device status via local network"""
+    from broker_client import connect_device
+
     # Try environment variables if not provided
     if not ip:
         ip = os.getenv('SENVILLE_IP')
@@ -50,11 +55,7 @@ def get_status_local(ip=None, token=None, key=None, verbose=0, quiet=False):
         print(f"Querying device at {ip}...")
 
     try:
-        device = appliance_state(
-            address=ip,
-            token=token,
-            key=key
-        )
+        device = connect_device(ip, token, key)
 
         print_status(device, verbose=verbose)
         return device
@@ -67,6 +68,8 @@ def get_status_local(ip=None, token=None, key=None, verbose=0, quiet=False):
 
 def get_status_cloud(account=None, password=None, device_id=None):
     """Get device status via cloud API"""
+    from midea_beautiful import appliance_state, connect_to_cloud
+
     if not account:
         account = os.getenv('MIDEA_ACCOUNT')
     if not password:
@@ -102,6 +105,17 @@ def get_status_cloud(account=None, password=None, device_id=None):
         traceback.print_exc()
         sys.exit(1)
 
+def get_status_cached(ip=None, max_age=CACHED_MAX_AGE, verbose=0, quiet=False):
+    """Print the shared state snapshot without device I/O; False if there is none recent enough"""
+    state = read_snapshot(ip or os.getenv('SENVILLE_IP'), max_age)
+    if state is None:
+        return False
+
+    if not quiet:
+        print(f"Cached state from {state.ip} ({state.age:.0f}s old)")
+    print_status(state, verbose=verbose)
+    return True
+
 def print_status(device, verbose=0):
     """
     Print formatted device status
@@ -113,18 +127,20 @@ def print_status(device, verbose=0):
     """
     # Get state object
     state = device.state if hasattr(device, 'state') else device
+    snapshot = StateSnapshot.from_state(state)
 
     if verbose == 0:
         # Concise output
-        temp_unit = '°F' if state.fahrenheit else '°C'
-        target = state.target_temperature if not state.fahrenheit else c_to_f(state.target_temperature)
-        indoor = state.indoor_temperature if not state.fahrenheit else c_to_f(state.indoor_temperature)
-
-        print(f"Power: {'ON' if state.running else 'OFF'} | " +
-              f"Mode: {get_mode_string(state.mode)} | " +
-              f"Target: {target:.0f}{temp_unit} | " +
-              f"Indoor: {indoor:.1f}{temp_unit} | " +
-              f"Fan: {state.fan_speed}")
+        if snapshot.fahrenheit:
+            target, indoor = snapshot.target_temperature_f, snapshot.indoor_temperature_f
+        else:
+            target, indoor = snapshot.target_temperature, snapshot.indoor_temperature
+
+        print(f"Power: {'ON' if snapshot.running else 'OFF'} | " +
+              f"Mode: {get_mode_string(snapshot.mode)} | " +
+              f"Target: {target:.0f}{snapshot.unit} | " +
+              f"Indoor: {indoor:.1f}{snapshot.unit} | " +
+              f"Fan: {snapshot.fan_speed}")
         return
 
     # Verbose output (level 1+)
@@ -133,40 +149,31 @@ def print_status(device, verbose=0):
     print("="*50)
 
     # Basic status
-    print(f"\nPower:           {'ON' if state.running else 'OFF'}")
+    print(f"\nPower:           {'ON' if snapshot.running else 'OFF'}")
 
     # Temperature
-    if hasattr(state, 'indoor_temperature'):
-        print(f"Indoor Temp:     {state.indoor_temperature}°C ({c_to_f(state.indoor_temperature):.1f}°F)")
-    if hasattr(state, 'outdoor_temperature'):
-        print(f"Outdoor Temp:    {state.outdoor_temperature}°C ({c_to_f(state.outdoor_temperature):.1f}°F)")
-    if hasattr(state, 'target_temperature'):
-        print(f"Target Temp:     {state.target_temperature}°C ({c_to_f(state.target_temperature):.1f}°F)")
+    if snapshot.indoor_temperature is not None:
+        print(f"Indoor Temp:     {snapshot.indoor_temperature}°C ({snapshot.indoor_temperature_f:.1f}°F)")
+    if snapshot.outdoor_temperature is not None:
+        print(f"Outdoor Temp:    {snapshot.outdoor_temperature}°C ({snapshot.outdoor_temperature_f:.1f}°F)")
+    if snapshot.target_temperature is not None:
+        print(f"Target Temp:     {snapshot.target_temperature}°C ({snapshot.target_temperature_f:.1f}°F)")
 
     # Operating mode
-    if hasattr(state, 'mode'):
-        mode_str = get_mode_string(state.mode)
-        print(f"Mode:            {mode_str}")
+    print(f"Mode:            {get_mode_string(snapshot.mode)}")
 
     # Fan speed
-    if hasattr(state, 'fan_speed'):
-        print(f"Fan Speed:       {state.fan_speed}")
+    print(f"Fan Speed:       {snapshot.fan_speed}")
 
     # Additional features
-    if hasattr(state, 'vertical_swing'):
-        print(f"Vertical Swing:  {state.vertical_swing}")
-    if hasattr(state, 'horizontal_swing'):
-        print(f"Horizontal Swing:{state.horizontal_swing}")
-    if hasattr(state, 'turbo'):
-        print(f"Turbo Mode:      {state.turbo}")
-    if hasattr(state, 'eco_mode'):
-        print(f"Eco Mode:        {state.eco_mode}")
-    if hasattr(state, 'comfort_mode'):
-        print(f"Comfort Mode:    {state.comfort_mode}")
+    print(f"Vertical Swing:  {snapshot.vertical_swing}")
+    print(f"Horizontal Swing:{snapshot.horizontal_swing}")
+    print(f"Turbo Mode:      {snapshot.turbo}")
+    print(f"Eco Mode:        {snapshot.eco_mode}")
+    print(f"Comfort Mode:    {snapshot.comfort_mode}")
 
     # Error code
-    if hasattr(state, 'error_code'):
-        print(f"Error Code:      {state.error_code}")
+    print(f"Error Code:      {snapshot.error_code}")
 
     # Extra verbose - show all attributes
     if verbose >= 2:
@@ -208,10 +215,6 @@ def get_mode_string(mode):
     }
     return modes.get(mode, f"Unknown ({mode})")
 
-def c_to_f(celsius):
-    """Convert Celsius to Fahrenheit"""
-    return (celsius * 9/5) + 32
-
 def main():
     parser = argparse.ArgumentParser(
         description='Get Senville/Midea AC status'
@@ -221,6 +224,17 @@ def main():
         action='store_true',
         help='Use cloud API instead of local network'
     )
+    parser.add_argument(
+        '--cached',
+        action='store_true',
+        help='Read the state published by the API server or broker, querying the device only if it is too old'
+    )
+    parser.add_argument(
+        '--max-age',
+        type=float,
+        default=CACHED_MAX_AGE,
+        help=f'Oldest cached state to accept in seconds (default: {CACHED_MAX_AGE})'
+    )
     parser.add_argument(
         '--ip',
         help='Device IP address (overrides env var)'
@@ -244,6 +258,9 @@ def main():
 
     if args.cloud:
         get_status_cloud()
+    elif args.cached and get_status_cached(ip=args.ip, max_age=args.max_age,
+                                           verbose=args.verbose, quiet=args.quiet):
+        return
     else:
         get_status_local(ip=args.ip, verbose=args.verbose, quiet=args.quiet)
 
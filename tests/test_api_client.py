@@ -0,0 +1,30 @@
+"""Tests for api_client.py"""
+
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api_client import percentile
+
+
+class PercentileTest(unittest.TestCase):
+    def test_nearest_rank(self):
+        values = list(range(100, 0, -1))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 51), 51)
+        self.assertEqual(percentile(values, 99), 99)
+        self.assertEqual(percentile(values, 100), 100)
+        self.assertEqual(percentile(values, 7), 7)
+        self.assertEqual(percentile(values, 0), 1)
+
+    def test_small_lists(self):
+        self.assertEqual(percentile([3.5], 99), 3.5)
+        self.assertEqual(percentile([10, 20, 30, 40], 50), 20)
+        self.assertEqual(percentile([10, 20, 30, 40], 90), 40)
+        self.assertIsNone(percentile([], 50))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,112 @@
+"""Tests for api_server.py"""
+
+import os
+import sys
+import time
+import types
+import socket
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import api_server
+
+
+class FakeDevice:
+    def __init__(self):
+        self._socket, self._peer = socket.socketpair()
+
+    def _disconnect(self):
+        pass
+
+    def _authenticate(self):
+        pass
+
+
+class BreakerProbeTest(unittest.TestCase):
+    def test_probe_failing_with_any_exception_reopens(self):
+        breaker = api_server.CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+        actor = api_server.DeviceActor(FakeDevice, breaker=breaker)
+
+        def bad_frame(device):
+            raise KeyError('bad frame')
+
+        with self.assertRaises(KeyError):
+            actor.write(bad_frame)
+        self.assertEqual(breaker.state, api_server.CircuitBreaker.OPEN)
+
+        # The half-open probe fails with a non-device error: the breaker must reopen, not stay probing
+        time.sleep(0.06)
+        with self.assertRaises(KeyError):
+            actor.write(bad_frame)
+        self.assertEqual(breaker.state, api_server.CircuitBreaker.OPEN)
+
+        time.sleep(0.06)
+        self.assertEqual(actor.write(lambda device: 'ok'), 'ok')
+        self.assertEqual(breaker.state, api_server.CircuitBreaker.CLOSED)
+
+
+class CountingDevice(FakeDevice):
+    """A connected unit that counts its queries and applies"""
+
+    def __init__(self):
+        super().__init__()
+        self.state = types.SimpleNamespace(running=True, mode=2, target_temperature=22.0, fan_speed=60,
+                                           vertical_swing=False, horizontal_swing=False, fahrenheit=True)
+        self.refreshes = 0
+        self.applies = 0
+
+    def refresh(self):
+        self.refreshes += 1
+
+    def apply(self):
+        self.applies += 1
+
+
+class KeepaliveTest(unittest.TestCase):
+    def test_keepalive_waits_for_the_poller_interval_and_polls(self):
+        device = CountingDevice()
+        poller = mock.Mock(interval=0.3)
+        actor = api_server.DeviceActor(lambda: device, keepalive=0.05)
+        actor.poller = poller
+        actor.write(lambda device: None)
+
+        time.sleep(0.2)
+        poller.poll_now.assert_not_called()
+        time.sleep(0.25)
+        poller.poll_now.assert_called()
+        self.assertEqual(device.refreshes, 0)
+
+
+class ApplyChangesTest(unittest.TestCase):
+    def setUp(self):
+        self.device = CountingDevice()
+        patcher = mock.patch.object(api_server, 'connect_device', return_value=self.device)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.context = api_server.DeviceContext({'id': 'test', 'ip': '127.0.0.1', 'token': '', 'key': ''})
+        # A fresh poll, as the background poller would have made
+        self.context.poller.write_through(api_server.StateSnapshot.from_state(self.device.state))
+
+    def test_no_op_write_makes_no_device_calls(self):
+        status, applied = self.context.apply_changes({'running': True, 'mode': 2})
+        self.assertFalse(applied)
+        self.assertTrue(status.running)
+        self.assertEqual((self.device.refreshes, self.device.applies), (0, 0))
+
+    def test_fahrenheit_target_matching_the_unit_is_a_no_op(self):
+        # 72°F is 22.2°C, which the unit stores as 22°C
+        _, applied = self.context.apply_changes({'target_temperature': api_server.f_to_c(72)})
+        self.assertFalse(applied)
+        self.assertEqual((self.device.refreshes, self.device.applies), (0, 0))
+
+    def test_change_is_applied_without_a_query(self):
+        status, applied = self.context.apply_changes({'running': False})
+        self.assertTrue(applied)
+        self.assertFalse(status.running)
+        self.assertEqual((self.device.refreshes, self.device.applies), (0, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,42 @@
+"""Tests for device_broker.py"""
+
+import os
+import sys
+import types
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import device_broker
+
+
+class FakeUnit:
+    def __init__(self):
+        self.state = types.SimpleNamespace(running=True, target_temperature=22.0)
+        self.refreshes = 0
+
+    def refresh(self):
+        self.refreshes += 1
+
+
+class GetStateTest(unittest.TestCase):
+    def setUp(self):
+        self.unit = FakeUnit()
+        self.device = device_broker.ManagedDevice({'id': 'test', 'ip': '127.0.0.1', 'token': '', 'key': ''},
+                                                  rate=20, burst=1)
+        self.device._device = self.unit
+        self.assertFalse(self.device.get_state(max_age=0)['stale'])
+
+    def test_max_age_zero_waits_for_budget_instead_of_answering_stale(self):
+        result = self.device.get_state(max_age=0)
+        self.assertFalse(result['stale'])
+        self.assertEqual(self.unit.refreshes, 2)
+
+    def test_other_reads_get_the_cache_marked_stale_when_out_of_budget(self):
+        result = self.device.get_state(max_age=1e-9)
+        self.assertTrue(result['stale'])
+        self.assertEqual(self.unit.refreshes, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+"""Tests for scheduler.py"""
+
+import io
+import os
+import sys
+import tempfile
+import types
+import unittest
+import contextlib
+from unittest import mock
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import scheduler
+from schedule_store import ScheduleStore
+
+
+class CheckStatusTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        env = {
+            'SENVILLE_SCHEDULES_FILE': os.path.join(self.tmp.name, 'schedules.json'),
+            'SENVILLE_SCHEDULES_DB': os.path.join(self.tmp.name, 'schedules.db'),
+        }
+        patcher = mock.patch.dict(os.environ, env)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pid_file = os.path.join(self.tmp.name, 'scheduler.pid')
+        patcher = mock.patch.object(scheduler, 'PID_FILE', self.pid_file)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def status(self):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            running = scheduler.check_status()
+        return running, out.getvalue()
+
+    def test_not_running(self):
+        running, out = self.status()
+        self.assertFalse(running)
+        self.assertIn('Not running', out)
+
+    def test_running_lists_schedules(self):
+        store = ScheduleStore()
+        store.create({'name': 'Morning', 'time': '07:00', 'days': ['mon'], 'action': {'power': True}})
+        store.create({'name': 'Off', 'time': '23:00', 'action': {'power': False}, 'enabled': False})
+        store.close()
+        with open(self.pid_file, 'w') as f:
+            f.write(str(os.getpid()))
+
+        running, out = self.status()
+        self.assertTrue(running, out)
+        self.assertNotIn('Error', out)
+        self.assertIn(f'Running (PID: {os.getpid()})', out)
+        self.assertIn('Schedules: 2 total, 1 enabled', out)
+        self.assertIn('Morning: 07:00 (mon)', out)
+        self.assertNotIn('Off:', out)
+
+
+class ScheduleEngineTest(unittest.TestCase):
+    def test_schedule_for_the_starting_minute_fires(self):
+        now = datetime(2026, 1, 5, 7, 0, 40)
+        engine = scheduler.ScheduleEngine()
+        engine.start([
+            {'id': 1, 'name': 'now', 'time': '07:00', 'action': {'power': True}},
+            {'id': 2, 'name': 'ran', 'time': '07:00', 'action': {'power': True},
+             'last_run': '2026-01-05T07:00:01.5'},
+            {'id': 3, 'name': 'earlier', 'time': '06:59', 'action': {'power': True}},
+        ], now)
+
+        due = engine.pop_due(now)
+        self.assertEqual([(s['id'], scheduled) for s, scheduled in due], [(1, datetime(2026, 1, 5, 7, 0))])
+        # Rescheduled for tomorrow like the others
+        self.assertEqual(engine.next_time(), datetime(2026, 1, 6, 6, 59).timestamp())
+
+
+class ExecuteSchedulesTest(unittest.TestCase):
+    def test_malformed_schedule_is_journaled_invalid_and_batch_continues(self):
+        class Device:
+            def __init__(self):
+                self.state = types.SimpleNamespace(running=False, mode=2)
+                self.applied = 0
+
+            def apply(self):
+                self.applied += 1
+
+        device = Device()
+        scheduled = datetime(2026, 1, 5, 7, 0)
+        due = [
+            ({'id': 1, 'name': 'no action'}, scheduled),
+            ({'id': 2, 'name': 'bad temp', 'action': {'temperature': 'warm'}}, scheduled),
+            ({'id': 3, 'name': 'on', 'action': {'power': True}}, scheduled),
+        ]
+        with mock.patch.object(scheduler, 'get_device', return_value=device), \
+                contextlib.redirect_stdout(io.StringIO()):
+            records = scheduler.execute_schedules(due)
+
+        results = {r['schedule_id']: r['result'] for r in records}
+        self.assertEqual(results, {1: 'invalid', 2: 'invalid', 3: 'applied'})
+        self.assertTrue(records[0]['error'])
+        self.assertEqual(records[2]['applied'], {'running': True})
+        self.assertEqual(device.applied, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
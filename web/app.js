@@ -1,14 +1,17 @@
 // Senville AC Control - Web Interface JavaScript
 
 const API_BASE = '/api';
+const TEMP_COMMIT_DELAY = 1500;  // ms after the last +/- click before the temperature is sent
 let statusRefreshInterval = null;
+let tempCommitTimer = null;
 let currentStatus = null;
+let eventSource = null;
 
 // Initialize app
 document.addEventListener('DOMContentLoaded', () => {
     setupEventListeners();
     refreshStatus();
-    startAutoRefresh();
+    startEventStream();
 });
 
 // Setup all event listeners
@@ -91,9 +94,10 @@ async function refreshStatus() {
 
 async function setPower(on) {
     try {
-        await apiCall('/power', 'POST', { on });
+        const result = await apiCall('/power', 'POST', { on });
         showToast(`AC turned ${on ? 'on' : 'off'}`, 'success');
-        setTimeout(refreshStatus, 500);
+        // The response carries the state as applied; no follow-up read needed
+        applyStatus(result.data);
     } catch (error) {
         // Error already shown by apiCall
     }
@@ -101,22 +105,24 @@ async function setPower(on) {
 
 async function setMode(mode) {
     try {
-        await apiCall('/mode', 'POST', { mode });
+        const result = await apiCall('/mode', 'POST', { mode });
         showToast(`Mode set to ${mode}`, 'success');
-        setTimeout(refreshStatus, 500);
+        applyStatus(result.data);
     } catch (error) {
         // Error already shown by apiCall
     }
 }
 
 async function setTemperature() {
+    clearTimeout(tempCommitTimer);
+    tempCommitTimer = null;
     const temp = parseInt(document.getElementById('temp-input').value);
     const fahrenheit = currentStatus ? currentStatus.fahrenheit : true;
 
     try {
-        await apiCall('/temperature', 'POST', { temperature: temp, fahrenheit });
+        const result = await apiCall('/temperature', 'POST', { temperature: temp, fahrenheit });
         showToast(`Temperature set to ${temp}°${fahrenheit ? 'F' : 'C'}`, 'success');
-        setTimeout(refreshStatus, 500);
+        applyStatus(result.data);
     } catch (error) {
         // Error already shown by apiCall
     }
@@ -124,10 +130,10 @@ async function setTemperature() {
 
 async function setFanSpeed(speed) {
     try {
-        await apiCall('/fan', 'POST', { speed });
+        const result = await apiCall('/fan', 'POST', { speed });
         const speedNames = { 20: 'Low', 40: 'Med-Low', 60: 'Medium', 80: 'Med-High', 102: 'Auto' };
         showToast(`Fan speed set to ${speedNames[speed]}`, 'success');
-        setTimeout(refreshStatus, 500);
+        applyStatus(result.data);
     } catch (error) {
         // Error already shown by apiCall
     }
@@ -139,9 +145,9 @@ async function setSwing(type, enabled) {
             ? { vertical: enabled }
             : { horizontal: enabled };
 
-        await apiCall('/swing', 'POST', data);
+        const result = await apiCall('/swing', 'POST', data);
         showToast(`${type} swing ${enabled ? 'enabled' : 'disabled'}`, 'success');
-        setTimeout(refreshStatus, 500);
+        applyStatus(result.data);
     } catch (error) {
         // Error already shown by apiCall
         // Revert toggle on error
@@ -174,8 +180,10 @@ function updateStatusDisplay(status) {
     const fanNames = { 20: 'Low', 40: 'Med-Low', 60: 'Medium', 80: 'Med-High', 102: 'Auto' };
     document.getElementById('status-fan').textContent = fanNames[status.fan_speed] || status.fan_speed;
 
-    // Update temperature input
-    document.getElementById('temp-input').value = Math.round(status.target_temperature);
+    // Update temperature input (unless +/- clicks are waiting to be sent)
+    if (tempCommitTimer === null) {
+        document.getElementById('temp-input').value = Math.round(status.target_temperature);
+    }
     document.getElementById('temp-unit').textContent = unit;
 
     // Update temperature input range based on unit
@@ -239,6 +247,9 @@ function adjustTemp(delta) {
 
     if (newValue >= min && newValue <= max) {
         input.value = newValue;
+        // Send once the clicks stop, so a run of clicks is one write
+        clearTimeout(tempCommitTimer);
+        tempCommitTimer = setTimeout(setTemperature, TEMP_COMMIT_DELAY);
     }
 }
 
@@ -254,7 +265,9 @@ function showToast(message, type = 'info') {
 
 function startAutoRefresh() {
     // Refresh status every 5 seconds
-    statusRefreshInterval = setInterval(refreshStatus, 5000);
+    if (!statusRefreshInterval) {
+        statusRefreshInterval = setInterval(refreshStatus, 5000);
+    }
 }
 
 function stopAutoRefresh() {
@@ -264,12 +277,67 @@ function stopAutoRefresh() {
     }
 }
 
-// Stop auto-refresh when page is hidden (save resources)
+// Live updates via Server-Sent Events, falling back to polling
+
+function applyStatus(status) {
+    currentStatus = status;
+    updateStatusDisplay(currentStatus);
+    updateConnectionStatus(true);
+    updateLastUpdateTime();
+}
+
+function startEventStream() {
+    if (!window.EventSource) {
+        startAutoRefresh();
+        return;
+    }
+
+    eventSource = new EventSource(`${API_BASE}/events`);
+
+    eventSource.addEventListener('open', () => {
+        // Stream is live, polling no longer needed
+        stopAutoRefresh();
+    });
+
+    eventSource.addEventListener('status', (e) => {
+        applyStatus(JSON.parse(e.data));
+    });
+
+    eventSource.addEventListener('delta', (e) => {
+        if (currentStatus) {
+            applyStatus({ ...currentStatus, ...JSON.parse(e.data) });
+        } else {
+            refreshStatus();
+        }
+    });
+
+    eventSource.addEventListener('device-error', () => {
+        updateConnectionStatus(false);
+    });
+
+    eventSource.addEventListener('error', () => {
+        // Browser retries the stream on its own; poll in the meantime
+        startAutoRefresh();
+        if (eventSource.readyState === EventSource.CLOSED) {
+            eventSource = null;
+        }
+    });
+}
+
+function stopEventStream() {
+    if (eventSource) {
+        eventSource.close();
+        eventSource = null;
+    }
+}
+
+// Stop updates when page is hidden (save resources)
 document.addEventListener('visibilitychange', () => {
     if (document.hidden) {
+        stopEventStream();
         stopAutoRefresh();
     } else {
         refreshStatus();
-        startAutoRefresh();
+        startEventStream();
     }
 });
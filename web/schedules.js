@@ -3,15 +3,55 @@
 const API_BASE = '/api';
 let currentEditingId = null;
 let schedules = [];
+let statusPollInterval = null;
 
 // Initialize
 document.addEventListener('DOMContentLoaded', () => {
     setupEventListeners();
     loadSchedulerStatus();
     loadSchedules();
-    setInterval(loadSchedulerStatus, 10000); // Update status every 10 seconds
+    startEventStream();
 });
 
+// Live updates via Server-Sent Events, falling back to polling
+
+function startStatusPolling() {
+    if (!statusPollInterval) {
+        statusPollInterval = setInterval(loadSchedulerStatus, 10000); // Update status every 10 seconds
+    }
+}
+
+function stopStatusPolling() {
+    if (statusPollInterval) {
+        clearInterval(statusPollInterval);
+        statusPollInterval = null;
+    }
+}
+
+function startEventStream() {
+    if (!window.EventSource) {
+        startStatusPolling();
+        return;
+    }
+
+    const eventSource = new EventSource(`${API_BASE}/events`);
+
+    eventSource.addEventListener('open', stopStatusPolling);
+
+    eventSource.addEventListener('scheduler', (e) => {
+        renderSchedulerStatus(JSON.parse(e.data));
+    });
+
+    eventSource.addEventListener('schedules', () => {
+        loadSchedules();
+    });
+
+    eventSource.addEventListener('error', () => {
+        // Browser retries the stream on its own; poll in the meantime
+        startStatusPolling();
+    });
+}
+
 // Setup event listeners
 function setupEventListeners() {
     // Scheduler control
@@ -69,24 +109,26 @@ async function apiCall(endpoint, method = 'GET', data = null) {
 async function loadSchedulerStatus() {
     try {
         const result = await apiCall('/scheduler/status');
-        const status = result.data;
-
-        const statusText = status.running ? 'Running' : 'Stopped';
-        const statusEl = document.getElementById('scheduler-status');
-        statusEl.textContent = statusText;
-        statusEl.style.color = status.running ? '#4CAF50' : '#f44336';
-
-        document.getElementById('active-schedules').textContent =
-            `${status.enabled_schedules} / ${status.total_schedules}`;
-
-        // Enable/disable buttons
-        document.getElementById('btn-start-scheduler').disabled = status.running;
-        document.getElementById('btn-stop-scheduler').disabled = !status.running;
+        renderSchedulerStatus(result.data);
     } catch (error) {
         document.getElementById('scheduler-status').textContent = 'Error';
     }
 }
 
+function renderSchedulerStatus(status) {
+    const statusText = status.running ? 'Running' : 'Stopped';
+    const statusEl = document.getElementById('scheduler-status');
+    statusEl.textContent = statusText;
+    statusEl.style.color = status.running ? '#4CAF50' : '#f44336';
+
+    document.getElementById('active-schedules').textContent =
+        `${status.enabled_schedules} / ${status.total_schedules}`;
+
+    // Enable/disable buttons
+    document.getElementById('btn-start-scheduler').disabled = status.running;
+    document.getElementById('btn-stop-scheduler').disabled = !status.running;
+}
+
 async function startScheduler() {
     try {
         await apiCall('/scheduler/start', 'POST');